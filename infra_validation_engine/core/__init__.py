@@ -14,7 +14,19 @@ import json
 import traceback
 from abc import ABCMeta, abstractmethod
 import logging
-from infra_validation_engine.core.exceptions import DirectoryNotFoundError, PreConditionNotSatisfiedError
+import threading
+import six
+from infra_validation_engine.core.exceptions import DirectoryNotFoundError, PreConditionNotSatisfiedError, \
+    DeadlineExceededError, HostUnreachableError
+from infra_validation_engine.core.concurrency import monotonic
+from infra_validation_engine.core.facts import get_fact_cache
+from infra_validation_engine.core.multiplexing import get_multiplexer
+from infra_validation_engine.core.probe import probe_hosts
+from infra_validation_engine.core.result_cache import get_result_cache
+from infra_validation_engine.core.events import get_event_sink
+from infra_validation_engine.core.timing import ElementTiming, TimingRollup, critical_path, round_seconds, \
+    timing_context
+from infra_validation_engine.core.bolt_transport import get_bolt_fan_out
 from collections import deque, OrderedDict
 
 
@@ -45,12 +57,23 @@ class Pool:
         return Pool.stages
 
 
+@six.add_metaclass(ABCMeta)
 class PipelineElement:
     """
     An executable and composable entity that represents the test pipeline and provides
     functions to execute and log events from the test pipeline.
+
+    If timeout (seconds) is set, the element must finish within timeout seconds of being started. The deadline is
+    propagated to the elements of its pipeline, which must also finish before the deadlines of all their parents.
+    test_timeout is the timeout of the InfraTests in the pipeline whose class does not set one, e.g. --test-timeout. It
+    is propagated with the deadline.
+
+    The report of every element that was started has its timing, see core.timing. Elements with a pipeline add the
+    timing_rollup of the tests in it, by host and test class, and their critical path.
     """
-    __metaclass__ = ABCMeta
+    timeout = None
+    # Whether the elements of the pipeline are executed concurrently
+    parallel = False
 
     def __init__(self, name, executable_type):
         self.name = name
@@ -60,14 +83,159 @@ class PipelineElement:
         self.report = OrderedDict({'name': self.name, 'result': '', 'type': self.type})
         self.logger = logging.getLogger(__name__)
         self.hard_error_pre_condition = True
+        self.dependencies = []
+        self.done = threading.Event()
+        self.done_lock = threading.Lock()
+        self.done_callbacks = []
+        self.deadline = None
+        self.parent_deadline = None
+        self.test_timeout = None
+        self.parent = None
+        self.timing = ElementTiming()
+        self.timing_rollup = None
 
     def append_to_pipeline(self, pipeline_element):
+        pipeline_element.parent = self
         self.pipeline_elements.append(pipeline_element)
 
+    @property
+    def path(self):
+        """ The names of the elements from the outermost parent, usually a stage, to this element """
+        path = [self.name]
+        parent = self.parent
+        while parent is not None:
+            path.append(parent.name)
+            parent = parent.parent
+        return path[::-1]
+
     def extend_pipeline(self, pipeline_elements):
         for pipeline_element in pipeline_elements:
             self.append_to_pipeline(pipeline_element)
 
+    def depends_on(self, *pipeline_elements):
+        """
+        Declare pipeline elements that must pass before this element is executed. If any of them fails or is skipped,
+        this element and its pipeline are skipped. Dependencies must be executed before or concurrently with this
+        element, never after it.
+        """
+        self.dependencies.extend(pipeline_elements)
+        return self
+
+    @property
+    def finished(self):
+        return self.done.is_set()
+
+    def add_done_callback(self, callback):
+        """ Call callback(pipeline_element) once this element has finished, right away if it already has """
+        with self.done_lock:
+            if not self.done.is_set():
+                self.done_callbacks.append(callback)
+                return
+        callback(self)
+
+    def mark_finished(self):
+        self.stop_timing()
+        with self.done_lock:
+            finished_before = self.done.is_set()
+            self.done.set()
+            callbacks, self.done_callbacks = self.done_callbacks, []
+        if not finished_before and get_event_sink() is not None:
+            get_event_sink().element_finished(self)
+        for callback in callbacks:
+            callback(self)
+
+    def check_dependencies(self):
+        """
+        Wait for the dependencies of this element to finish. If any of them did not pass, this element is skipped.
+        :return: True if the element should be executed
+        """
+        for dependency in self.dependencies:
+            dependency.done.wait()
+        failed_dependencies = [dependency for dependency in self.dependencies if dependency.exit_code in (1, 2)]
+        if len(failed_dependencies) == 0:
+            return True
+        reason = "Prerequisite {prerequisites} did not pass".format(prerequisites=', '.join(
+            [dependency.describe() for dependency in failed_dependencies]))
+        self.logger.warning("Skipping {element}. {reason}".format(element=self.describe(), reason=reason))
+        self.skip(reason)
+        return False
+
+    def start_deadline(self):
+        """
+        Compute the deadline of this element once it is started
+        :return: False if the deadline of a parent already passed, in which case the element is timed out
+        """
+        deadlines = [self.parent_deadline]
+        timeout = self.get_timeout()
+        if timeout is not None:
+            deadlines.append(monotonic() + timeout)
+        deadlines = [deadline for deadline in deadlines if deadline is not None]
+        self.deadline = min(deadlines) if deadlines else None
+        if self.deadline is not None and self.remaining_time() <= 0:
+            self.expire("The deadline for {element} passed before it could be started".format(element=self.describe()))
+            return False
+        return True
+
+    def get_timeout(self):
+        return self.timeout
+
+    @property
+    def host_key(self):
+        """
+        The host whose slots the element takes while it executes, see concurrency.Scheduler, or None. Executors often
+        have the fqdn of the config master, but must not hold a slot of the host while they wait for their own tests
+        """
+        return None
+
+    def remaining_time(self):
+        if self.deadline is None:
+            return None
+        return max(0, self.deadline - monotonic())
+
+    def get_hosts(self):
+        """ Return the testinfra hosts of the InfraTests in the pipeline of this element """
+        hosts = []
+        for element in self.pipeline_elements:
+            hosts.extend(host for host in element.get_hosts() if host not in hosts)
+        return hosts
+
+    def prepare_pipeline(self):
+        """ Called once the pre condition of this element is satisfied, before its pipeline is executed """
+        self.propagate_deadline()
+
+    def propagate_deadline(self):
+        for element in self.pipeline_elements:
+            element.parent_deadline = self.deadline
+            if element.test_timeout is None:
+                element.test_timeout = self.test_timeout
+
+    def expire(self, reason):
+        """ Mark this element and all unfinished elements in its pipeline as timed out """
+        self.logger.error("Timeout: {reason}".format(reason=reason))
+        self.exit_code = 1
+        self.report['result'] = 'timeout'
+        self.report['error'] = reason
+        for element in self.pipeline_elements:
+            if not element.finished:
+                element.expire(reason)
+                element.mark_finished()
+
+    def skip(self, reason):
+        """ Mark this element and all elements in its pipeline as skipped """
+        self.exit_code = 2  # skipped
+        self.report['result'] = 'skipped'
+        self.report['skip_reason'] = reason
+        self.skip_pipeline(reason)
+
+    def skip_pipeline(self, reason):
+        for element in self.pipeline_elements:
+            if not element.finished:
+                element.skip(reason)
+                element.mark_finished()
+
+    def describe(self):
+        return "{type} {name}".format(type=self.type, name=self.name)
+
     def pre_condition(self):
         """
         Override if certain checks need to be performed before executing the pipeline.
@@ -98,8 +266,8 @@ class PipelineElement:
                                     format(name=self.name,type=self.type))
                 self.exit_code = 4  # pre_condition failed
                 return_status = True
-            self.logger.info("Exception info: {error}".format(error=err.message), exc_info=True)
-            self.report["error"] = err.message
+            self.logger.info("Exception info: {error}".format(error=str(err)), exc_info=True)
+            self.report["error"] = str(err)
             self.report["trace"] = traceback.format_exc()
             self.report["exit_code"] = self.exit_code
 
@@ -110,9 +278,30 @@ class PipelineElement:
             element.execute()
 
     def execute(self):
+        self.timing.start()
+        try:
+            with timing_context(self):
+                if self.check_dependencies() and self.start_deadline():
+                    self.execute_element()
+        finally:
+            self.mark_finished()
+
+    def stop_timing(self):
+        if self.timing.stop():
+            self.report['timing'] = self.timing.to_dict()
+
+    def collect_timing(self, rollup):
+        """ Add the timings of the tests in the pipeline of this element to the TimingRollup rollup """
+        if self.timing_rollup is not None:
+            rollup.merge(self.timing_rollup)
+
+    def execute_element(self):
         if not self.pre_condition_handler():
             self.logger.error("Pre condition failed for {type}: {name}".format(name=self.name, type=self.type))
+            self.skip_pipeline("The pre condition check for {element} was not satisfied".format(
+                element=self.describe()))
             return
+        self.prepare_pipeline()
         self.logger.info("Executing Pipeline for {type} {name}".format(name=self.name, type=self.type))
         pipeline_elements_csv = ', '.join([element.name for element in self.pipeline_elements])
         self.logger.info("{type} {name} has the following pipeline elements registered: {pipeline_elements}".format(
@@ -125,15 +314,28 @@ class PipelineElement:
 
     def post_process(self):
         """ Generate Report and update Exit Code """
-        pipeline_reports = [element.report for element in self.pipeline_elements]
-        self.report['total_elements'] = len(pipeline_reports)
-        self.report['element_reports'] = pipeline_reports
+        self.stop_timing()
+        self.timing_rollup = TimingRollup()
+        for element in self.pipeline_elements:
+            element.collect_timing(self.timing_rollup)
+        self.report['timing_rollup'] = self.timing_rollup.to_dict()
+        self.report['timing_rollup']['critical_path'] = [
+            OrderedDict([('name', test.name), ('fqdn', test.fqdn),
+                         ('queue_wait', round_seconds(test.timing.queue_wait)),
+                         ('duration', round_seconds(test.timing.duration))]) for test in critical_path(self)]
+        self.report['total_elements'] = len(self.pipeline_elements)
+        if get_event_sink() is None:
+            # With an event sink, the reports of the pipeline were streamed as they finished and are not nested
+            self.report['element_reports'] = [element.report for element in self.pipeline_elements]
         exit_codes = set([test.exit_code for test in self.pipeline_elements])
         if self.exit_code == 4:
             self.report["result"] = "pre condition failed! "
         if 1 in exit_codes:
             self.exit_code = 1
             self.report["result"] += "some or all tests fail"  # switch to codes someday
+        elif 2 in exit_codes:
+            self.exit_code = 2
+            self.report["result"] += "some tests skipped"
         elif 3 in exit_codes:
             self.exit_code = 3
             self.report["result"] += "warnings present"
@@ -141,12 +343,19 @@ class PipelineElement:
             self.report["result"] += "all tests passed"
 
 
+@six.add_metaclass(ABCMeta)
 class InfraTest(PipelineElement):
     """
     A special PipelineElement that runs the test on the InfraStructure
     Exit_Code : 1,4,8::pass,pass+warn,error #someday
     """
-    __metaclass__ = ABCMeta
+    # Commands the test requests on its host with fact(). They are announced to the fact cache so that the remote probe
+    # can collect them in advance.
+    expected_facts = ()
+    # Seconds a pass of the test is reused by later runs, see core.result_cache. None if the test is always executed
+    cache_ttl = None
+    # Report fields that describe the run rather than the result, they are not cached
+    UNCACHED_REPORT_FIELDS = ('executor_thread', 'fact_cache_hits', 'cached', 'timing')
 
     def __init__(self, name, description, host, fqdn):
         PipelineElement.__init__(self, name, "InfraTest")
@@ -160,7 +369,11 @@ class InfraTest(PipelineElement):
         self.message = None
         self.warn = False
         self.report['description'] = self.description
+        self.report['fqdn'] = self.fqdn
         self.exit_code = 0
+        if host is not None:
+            for command in self.expected_facts:
+                get_fact_cache().expect(host, command)
 
     @abstractmethod
     def run(self):
@@ -173,38 +386,155 @@ class InfraTest(PipelineElement):
     def resolution(self):
         return ""
 
-    def execute(self):
-        log_str = "{test} on {fqdn}:".format(fqdn=self.fqdn, test=self.name)
-        self.logger.info("{log_str} running".format(log_str=log_str))
+    def describe(self):
+        return "{test} on {fqdn}".format(test=self.name, fqdn=self.fqdn)
+
+    def get_timeout(self):
+        # The timeout of the test class takes precedence over the one of the run
+        return self.timeout if self.timeout is not None else self.test_timeout
+
+    @property
+    def host_key(self):
+        return self.fqdn
+
+    def get_hosts(self):
+        return [self.host] if self.host is not None else []
+
+    def collect_timing(self, rollup):
+        if self.timing.duration is not None:
+            rollup.add_test(self)
+
+    def execute_element(self):
+        if get_event_sink() is not None:
+            get_event_sink().test_started(self)
+        if self.load_cached_result():
+            return
+        self.logger.info("{log_str} running".format(log_str=self.log_str))
         try:
-            self.logger.info("{log_str} passed!".format(log_str=log_str))
-            if self.run():  # test_passed
-                # handle warnings
-                if self.warn:
-                    self.exit_code = 3
-                    self.logger.warning("{log_str} {message}".format(log_str=log_str, message=self.message))
-                self.report['result'] = 'pass'
-            else:  # test failed
-                try:
-                    self.exit_code = 1
-                    self.fail()
-                except Exception as ex:
-                    self.logger.error("{test} failed on {fqdn}! {details}".format(test=self.name,
-                                                                                  fqdn=self.fqdn, details=ex.message))
-                    self.logger.info("{log_str} {error} occurred!!".format(log_str=log_str, error=type(ex)),
-                                     exc_info=True)
-                    self.report['result'] = "fail"
-                    self.report["error"] = ex.message
-                    self.report["trace"] = traceback.format_exc()
+            self.process_result(self.run_before_deadline())
+        except DeadlineExceededError as ex:
+            self.expire(str(ex))
         except Exception as ex:
-            self.exit_code = 1
-            self.logger.error("{log_str} Could not run {test}!".format(log_str=log_str, test=self.name))
-            self.logger.info(
-                "{log_str} {error} occurred for {test}".format(log_str=log_str, test=self.name, error=type(ex)),
-                exc_info=True)
-            self.report["result"] = "exec_fail"
-            self.report["error"] = ex.message
-            self.report["trace"] = traceback.format_exc()
+            self.process_execution_error(ex)
+        self.process_message()
+        self.store_result()
+
+    def cache_parameters(self):
+        """
+        Return the parameters that tell the checks of the test class apart in the result cache. The descriptions of
+        the tests name what they check, e.g. the path or the package. Override if that is not the case.
+        """
+        return [self.name, self.description]
+
+    def cache_key(self):
+        return type(self).__name__, json.dumps(self.cache_parameters()), self.fqdn
+
+    def load_cached_result(self):
+        """
+        Complete the test with the pass stored by an earlier run if it is fresh enough, see core.result_cache
+        :return: True if the cached result was used
+        """
+        result_cache = get_result_cache()
+        if result_cache is None or self.cache_ttl is None:
+            return False
+        cached = result_cache.get(self.cache_key(), self.cache_ttl)
+        if cached is None:
+            return False
+        report, age = cached
+        self.report.update(report)
+        self.report['cached'] = OrderedDict([('age', round(age, 3))])
+        self.exit_code = 0
+        self.logger.info("{log_str} passed {age:.0f} seconds ago, reusing the cached result".format(
+            log_str=self.log_str, age=age))
+        return True
+
+    def store_result(self):
+        """ Cache the report of a test that passed without warnings, forget the cached result of any other outcome """
+        result_cache = get_result_cache()
+        if result_cache is None or self.cache_ttl is None:
+            return
+        if self.exit_code == 0 and self.report['result'] == 'pass':
+            result_cache.put(self.cache_key(), OrderedDict(
+                (field, value) for field, value in self.report.items() if field not in self.UNCACHED_REPORT_FIELDS))
+        else:
+            result_cache.remove(self.cache_key())
+
+    def run_before_deadline(self):
+        """
+        Call run() and return its result. The deadline is enforced on the executing thread: the commands the test
+        executes on a ManagedHost are killed once the deadline passes, see transport.ManagedHost.run, and
+        DeadlineExceededError is raised if run() returns after the deadline.
+        """
+        result = self.run()
+        if self.deadline is not None and self.remaining_time() <= 0:
+            raise DeadlineExceededError("{test} on {fqdn} did not finish within its deadline".format(
+                test=self.name, fqdn=self.fqdn))
+        return result
+
+    def fact(self, command, *args, **kwargs):
+        """
+        Execute an idempotent, read only command through the fact cache of the run, see host.run(). The command is
+        executed at most once per host and run, irrespective of the number of tests asking for it.
+        :param host: The testinfra host to execute the command on. Default is self.host
+        """
+        host = kwargs.get('host', self.host)
+        result, hit = get_fact_cache().run(host, command, *args)
+        if hit:
+            self.report['fact_cache_hits'] = self.report.get('fact_cache_hits', 0) + 1
+        return result
+
+    def fact_output(self, command, *args, **kwargs):
+        """ Counterpart of host.check_output() for self.fact() """
+        result = self.fact(command, *args, **kwargs)
+        if result.rc != 0:
+            raise AssertionError("Unexpected exit code {rc} for {result}".format(rc=result.rc, result=result))
+        return result.stdout.rstrip("\r\n")
+
+    @property
+    def log_str(self):
+        return "{test} on {fqdn}:".format(fqdn=self.fqdn, test=self.name)
+
+    def process_result(self, test_passed):
+        """ Update the report and exit code with the outcome of run() """
+        log_str = self.log_str
+        if test_passed:
+            self.logger.info("{log_str} passed!".format(log_str=log_str))
+            # handle warnings
+            if self.warn:
+                self.exit_code = 3
+                self.logger.warning("{log_str} {message}".format(log_str=log_str, message=self.message))
+            self.report['result'] = 'pass'
+        else:  # test failed
+            try:
+                self.exit_code = 1
+                self.fail()
+            except Exception as ex:
+                self.logger.error("{test} failed on {fqdn}! {details}".format(test=self.name,
+                                                                              fqdn=self.fqdn, details=str(ex)))
+                self.logger.info("{log_str} {error} occurred!!".format(log_str=log_str, error=type(ex)),
+                                 exc_info=True)
+                self.report['result'] = "fail"
+                self.report["error"] = str(ex)
+                self.report["trace"] = traceback.format_exc()
+
+    def process_execution_error(self, ex):
+        """ Update the report and exit code if run() raised an exception. Must be called from the except block """
+        log_str = self.log_str
+        self.exit_code = 1
+        self.report["result"] = "exec_fail"
+        self.report["error"] = str(ex)
+        if isinstance(ex, HostUnreachableError):
+            # The cause is shared by all tests of the host and was logged when the host became unreachable
+            self.logger.error("{log_str} Could not run {test}! {error}".format(log_str=log_str, test=self.name,
+                                                                              error=ex))
+            return
+        self.logger.error("{log_str} Could not run {test}!".format(log_str=log_str, test=self.name))
+        self.logger.info(
+            "{log_str} {error} occurred for {test}".format(log_str=log_str, test=self.name, error=type(ex)),
+            exc_info=True)
+        self.report["trace"] = traceback.format_exc()
+
+    def process_message(self):
         if self.message is not None:
             self.logger.info(self.message)
             self.report['message'] = self.message
@@ -212,17 +542,29 @@ class InfraTest(PipelineElement):
         # self.report['exit_code'] = self.exit_code
 
 
+@six.add_metaclass(ABCMeta)
 class Stage(PipelineElement):
     """
     A special pipeline element that groups other pipeline elements into a stage.
     """
 
-    __metaclass__ = ABCMeta
+    # Collect the snapshots and facts of every host with a single probe script before executing the pipeline, see
+    # core.probe. At most probe_fan_out hosts are probed at a time.
+    remote_probe = False
+    probe_fan_out = 10
+    # Execute only the elements that did not pass in a previous run, see core.rerun.RerunSelection
+    rerun_selection = None
+    # ConnectionStatus of every host connected to before the stages, see core.transport.warm_up. Reported by the first
+    # stage that is created
+    warm_up_statuses = None
 
     def __init__(self, name):
         PipelineElement.__init__(self, name, "Stage")
         self.name = name
         self.hard_error_pre_condition = True
+        if Stage.warm_up_statuses is not None:
+            self.report['warm_up'] = [status.to_dict() for status in Stage.warm_up_statuses.values()]
+            Stage.warm_up_statuses = None
 
     @abstractmethod
     def create_pipeline(self):
@@ -230,14 +572,34 @@ class Stage(PipelineElement):
 
     def pre_condition_handler(self):
         return_status = super(Stage, self).pre_condition_handler()
-        if not return_status:
+        # With an event sink, the report is streamed as stage_summary once the stage finished
+        if not return_status and get_event_sink() is None:
             self.logger.api(json.dumps(self.report, indent=4))
         return return_status
 
+    def prepare_pipeline(self):
+        super(Stage, self).prepare_pipeline()
+        if self.rerun_selection is not None:
+            # The pipeline of some stages is only created by their pre condition
+            self.report['rerun'] = self.rerun_selection.select(self)
+        bolt_fan_out = get_bolt_fan_out()
+        if bolt_fan_out is not None:
+            self.report['bolt_fan_out'] = bolt_fan_out.run(self.get_hosts())
+        if self.remote_probe:
+            reports = probe_hosts(self.get_hosts(), self.probe_fan_out)
+            self.report['remote_probe'] = OrderedDict((host.backend.get_pytest_id(), report)
+                                                      for host, report in reports.items())
+
     def post_process(self):
         """ Generate report and update exit code"""
         super(Stage, self).post_process()
-        self.logger.api(json.dumps(self.report, indent=4))
+        self.report['fact_cache'] = get_fact_cache().stats()
+        if get_result_cache() is not None:
+            self.report['result_cache'] = get_result_cache().stats()
+        if get_multiplexer() is not None:
+            self.report['ssh_multiplexing'] = get_multiplexer().stats()
+        if get_event_sink() is None:
+            self.logger.api(json.dumps(self.report, indent=4))
 
 
 class StageType(ABCMeta):
@@ -0,0 +1,295 @@
+# coding: utf-8
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+asyncio based execution engine for the test pipeline. Requires Python 3.7 or newer.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import shlex
+import signal
+import threading
+from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+from infra_validation_engine.core import InfraTest
+from infra_validation_engine.core.commands import CommandOutput
+from infra_validation_engine.core.concurrency import monotonic
+from infra_validation_engine.core.events import get_event_sink
+from infra_validation_engine.core.executors import ParallelExecutor
+from infra_validation_engine.core.multiplexing import get_multiplexer
+from infra_validation_engine.core.timing import record_remote_command, timing_context
+
+logger = logging.getLogger(__name__)
+
+# The AsyncInfraTest of the current task. The tests share the thread of the event loop, so the thread local context of
+# core.timing cannot tell them apart
+current_test = contextvars.ContextVar('current_test', default=None)
+
+
+class AsyncHost:
+    """
+    Executes commands on a host through asyncio subprocesses: /bin/sh for the local host and the OpenSSH client for
+    remote hosts. A command in flight does not hold a thread.
+    """
+    _hosts = {}
+
+    def __init__(self, hostname=None, user=None, port=None, ssh_identity_file=None, ssh_config=None, timeout=10,
+                 circuit_breaker=None):
+        self.hostname = hostname
+        self.user = user
+        self.port = port
+        self.ssh_identity_file = ssh_identity_file
+        self.ssh_config = ssh_config
+        self.timeout = timeout
+        self.circuit_breaker = circuit_breaker
+
+    @classmethod
+    def for_host(cls, host):
+        """ Return the AsyncHost that connects to the same machine as the testinfra host """
+        backend = host.backend
+        key = id(backend)
+        if key not in cls._hosts:
+            if backend.NAME == "local":
+                cls._hosts[key] = cls()
+            elif backend.NAME in ("ssh", "safe-ssh"):
+                # Share the circuit breaker of a ManagedHost with the testinfra host
+                cls._hosts[key] = cls(backend.host.name, backend.host.user, backend.host.port,
+                                      backend.ssh_identity_file, backend.ssh_config, backend.timeout,
+                                      getattr(host, 'circuit_breaker', None))
+            else:
+                raise NotImplementedError("The asyncio engine does not support the {backend} testinfra backend".format(
+                    backend=backend.NAME))
+        return cls._hosts[key]
+
+    @property
+    def is_local(self):
+        return self.hostname is None
+
+    @staticmethod
+    def get_command(command, *args):
+        """ Quote args and substitute them in command, see testinfra.host.Host.run """
+        if args:
+            return command % tuple(shlex.quote(str(arg)) for arg in args)
+        return command
+
+    def get_argv(self, command):
+        if self.is_local:
+            return ["/bin/sh", "-c", command]
+        argv = ["ssh", "-o", "ConnectTimeout={timeout}".format(timeout=self.timeout)]
+        if self.ssh_config:
+            argv.extend(["-F", self.ssh_config])
+        if self.user:
+            argv.extend(["-o", "User={user}".format(user=self.user)])
+        if self.port:
+            argv.extend(["-o", "Port={port}".format(port=self.port)])
+        if self.ssh_identity_file:
+            argv.extend(["-i", self.ssh_identity_file])
+        argv.extend([self.hostname, command])
+        return argv
+
+    async def run(self, command, *args):
+        command = self.get_command(command, *args)
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.before_call()
+        multiplexer = get_multiplexer()
+        if multiplexer is not None and not self.is_local:
+            multiplexer.record_command(self.hostname)
+        start = monotonic()
+        try:
+            process = await asyncio.create_subprocess_exec(*self.get_argv(command),
+                                                           stdin=asyncio.subprocess.DEVNULL,
+                                                           stdout=asyncio.subprocess.PIPE,
+                                                           stderr=asyncio.subprocess.PIPE,
+                                                           start_new_session=True)
+            try:
+                stdout, stderr = await process.communicate()
+            except asyncio.CancelledError:
+                # e.g. the deadline of the test passed. The children of the shell hold its output open, so the whole
+                # process group is killed. The process is reaped, otherwise its transport outlives the event loop
+                os.killpg(process.pid, signal.SIGKILL)
+                await process.wait()
+                raise
+            result = CommandOutput(command, process.returncode,
+                                   stdout.decode("utf-8", "replace"), stderr.decode("utf-8", "replace"))
+            if not self.is_local and result.rc == 255:
+                # ssh exits with 255 if the connection could not be established, same as testinfra's ssh backend
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.record_failure(result.stderr.strip())
+                raise RuntimeError(result)
+        finally:
+            record_remote_command(monotonic() - start, current_test.get())
+            if self.circuit_breaker is not None:
+                # A probe of a half open circuit that was cancelled or raised must not keep the host locked out
+                self.circuit_breaker.release_probe()
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record_success()
+        return result
+
+    async def check_output(self, command, *args):
+        result = await self.run(command, *args)
+        if result.rc != 0:
+            raise AssertionError("Unexpected exit code {rc} for {result}".format(rc=result.rc, result=result))
+        return result.stdout.rstrip("\r\n")
+
+
+class AsyncInfraTest(InfraTest):
+    """
+    An InfraTest whose run() is a coroutine. Commands should be executed through self.async_host so that they do not
+    block the event loop.
+    """
+
+    @property
+    def async_host(self):
+        return AsyncHost.for_host(self.host)
+
+    @abstractmethod
+    async def run(self):
+        pass
+
+    async def execute_async(self):
+        """ Coroutine counterpart of execute() """
+        self.timing.start()
+        token = current_test.set(self)
+        try:
+            if self.check_dependencies() and self.start_deadline():
+                await self.execute_element_async()
+        finally:
+            current_test.reset(token)
+            self.mark_finished()
+
+    async def execute_element_async(self):
+        if get_event_sink() is not None:
+            get_event_sink().test_started(self)
+        if self.load_cached_result():
+            return
+        self.logger.info("{log_str} running".format(log_str=self.log_str))
+        try:
+            # run() is cancelled if it does not finish before the deadline
+            self.process_result(await asyncio.wait_for(self.run(), self.remaining_time()))
+        except asyncio.TimeoutError:
+            self.expire("{test} on {fqdn} did not finish within its deadline".format(test=self.name, fqdn=self.fqdn))
+        except Exception as ex:
+            self.process_execution_error(ex)
+        self.process_message()
+        self.store_result()
+
+    def execute_element(self):
+        """ Adapter for the thread based executors: runs the test on an event loop of its own """
+        asyncio.run(self.execute_element_async())
+
+
+class AsyncExecutor:
+    """
+    Executes a pipeline on a single asyncio event loop, as an alternative to the thread based Scheduler.
+
+    The pipeline elements of a ParallelExecutor are executed concurrently, those of other pipeline elements serially.
+    AsyncInfraTests run on the event loop, at most max_concurrency at a time. All other InfraTests call testinfra, which
+    blocks, so they are executed through an adapter on a pool of at most num_threads threads. Irrespective of the kind
+    of test, at most max_per_host InfraTests are in flight per host.
+    """
+
+    def __init__(self, num_threads=10, max_concurrency=1024, max_per_host=None):
+        self.num_threads = num_threads
+        self.max_concurrency = max_concurrency
+        self.max_per_host = max_per_host
+        self.semaphore = None
+        self.host_semaphores = {}
+        self.thread_pool = None
+
+    def execute(self, pipeline_element):
+        """ Execute pipeline_element and block until it finishes """
+        asyncio.run(self.execute_root(pipeline_element))
+
+    async def execute_root(self, pipeline_element):
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.host_semaphores = {}
+        with ThreadPoolExecutor(max_workers=self.num_threads) as thread_pool:
+            self.thread_pool = thread_pool
+            await self.execute_element(pipeline_element)
+
+    async def execute_element(self, pipeline_element):
+        try:
+            await self.wait_for_dependencies(pipeline_element)
+            pipeline_element.timing.submit()
+            if isinstance(pipeline_element, InfraTest):
+                # The host slot is acquired first so that tests waiting for a busy host do not hold a global slot
+                async with self.get_host_semaphore(pipeline_element.host_key):
+                    await self.execute_test(pipeline_element)
+            else:
+                await self.execute_pipeline(pipeline_element)
+        except Exception:
+            logger.error("Error during asynchronous execution of {element}".format(element=pipeline_element.name))
+            logger.debug("Exception:", exc_info=True)
+
+    @staticmethod
+    async def wait_for_dependencies(pipeline_element):
+        """ Wait on the event loop, rather than in a thread, until the dependencies of pipeline_element finished """
+        loop = asyncio.get_running_loop()
+        for dependency in pipeline_element.dependencies:
+            if dependency.finished:
+                continue
+            finished = loop.create_future()
+            dependency.add_done_callback(
+                lambda _, future=finished: loop.call_soon_threadsafe(
+                    lambda: future.done() or future.set_result(None)))
+            await finished
+
+    async def execute_test(self, infra_test):
+        if isinstance(infra_test, AsyncInfraTest):
+            async with self.semaphore:
+                infra_test.report["executor_thread"] = threading.current_thread().name
+                await infra_test.execute_async()
+        else:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.thread_pool, self.execute_in_thread, infra_test)
+
+    def get_host_semaphore(self, host_key):
+        if host_key not in self.host_semaphores:
+            self.host_semaphores[host_key] = asyncio.Semaphore(self.max_per_host if self.max_per_host else
+                                                           self.max_concurrency)
+        return self.host_semaphores[host_key]
+
+    @staticmethod
+    def execute_in_thread(pipeline_element):
+        pipeline_element.report["executor_thread"] = threading.current_thread().name
+        pipeline_element.execute()
+
+    async def execute_pipeline(self, pipeline_element):
+        """ Coroutine counterpart of PipelineElement.execute """
+        pipeline_element.timing.start()
+        try:
+            if pipeline_element.check_dependencies() and pipeline_element.start_deadline():
+                await self.execute_pipeline_elements(pipeline_element)
+        finally:
+            pipeline_element.mark_finished()
+
+    async def execute_pipeline_elements(self, pipeline_element):
+        if not pipeline_element.pre_condition_handler():
+            logger.error("Pre condition failed for {type}: {name}".format(name=pipeline_element.name,
+                                                                          type=pipeline_element.type))
+            pipeline_element.skip_pipeline("The pre condition check for {element} was not satisfied".format(
+                element=pipeline_element.describe()))
+            return
+        # Other pipelines proceed on the event loop while this one awaits, only the synchronous part is attributed
+        with timing_context(pipeline_element):
+            pipeline_element.prepare_pipeline()
+        logger.info("Executing Pipeline for {type} {name}".format(name=pipeline_element.name,
+                                                                  type=pipeline_element.type))
+        if isinstance(pipeline_element, ParallelExecutor):
+            await asyncio.gather(*[self.execute_element(element) for element in pipeline_element.pipeline_elements])
+        else:
+            for element in pipeline_element.pipeline_elements:
+                await self.execute_element(element)
+        pipeline_element.post_process()
@@ -0,0 +1,142 @@
+# coding: utf-8
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Fan-out of the checks that are the same on many hosts through Bolt on the config master
+"""
+import json
+import logging
+import re
+from collections import OrderedDict
+from threading import Lock
+
+from infra_validation_engine.core.commands import CommandOutput
+from infra_validation_engine.core.concurrency import monotonic
+from infra_validation_engine.core.exceptions import CommandExecutionError
+from infra_validation_engine.core.probe import PendingChecks
+
+logger = logging.getLogger(__name__)
+
+
+class BoltFanOut:
+    """
+    Collects the PendingChecks of the Lightweight Component hosts from the config master: every command that is pending
+    on several hosts is executed on all of them with a single `bolt command run --format json`. The result of each
+    target is loaded into the snapshots and the fact cache of its host, so the tests of the host resolve without
+    executing commands of their own.
+
+    :param host: testinfra host of the config master, where Bolt is installed and configured
+    :param targets: OrderedDict of testinfra hosts by the Bolt target names, i.e. the FQDNs, of the hosts
+    """
+    # bolt exits with 2 if the command failed on some targets, the output still has the results of every target
+    EXIT_CODES = (0, 2)
+    ITEMS_PATTERN = re.compile(r'"items"\s*:\s*\[')
+
+    def __init__(self, host, targets):
+        self.host = host
+        self.targets = targets
+        self.lock = Lock()
+
+    def run(self, hosts=None):
+        """
+        Fan out the pending checks of the targets whose host is in hosts, or of all targets. Checks that could not be
+        collected, e.g. since Bolt could not connect to the target, are collected by the tests later.
+        :return: A report with the number of bolt invocations, of the results loaded and the unreachable targets
+        """
+        targets = OrderedDict((name, host) for name, host in self.targets.items() if hosts is None or host in hosts)
+        report = OrderedDict([('invocations', 0), ('results', 0), ('unreachable', []), ('duration', None),
+                              ('errors', [])])
+        start = monotonic()
+        # Only one fan-out at a time
+        with self.lock:
+            checks = OrderedDict((name, PendingChecks(host)) for name, host in targets.items())
+            for command, names in self.group_by_command(checks).items():
+                report['invocations'] += 1
+                try:
+                    for name, result in self.execute(command, names):
+                        if result is None:
+                            if name not in report['unreachable']:
+                                report['unreachable'].append(name)
+                            continue
+                        checks[name].load(command, result)
+                        report['results'] += 1
+                except Exception as ex:
+                    report['errors'].append(str(ex))
+                    logger.warning("Bolt fan-out of {command} failed, the tests will query the hosts themselves: "
+                                   "{error}".format(command=command, error=ex))
+                    logger.debug("Exception:", exc_info=True)
+        report['duration'] = monotonic() - start
+        return report
+
+    @staticmethod
+    def group_by_command(checks):
+        """ :return: An OrderedDict of the names of the targets by each command that is pending on more than one """
+        commands = OrderedDict()
+        for name, pending_checks in checks.items():
+            for command in pending_checks.commands:
+                commands.setdefault(command, []).append(name)
+        return OrderedDict((command, names) for command, names in commands.items() if len(names) > 1)
+
+    def execute(self, command, names):
+        """ :return: A generator of (target name, CommandOutput) tuples. The output is None if Bolt could not connect """
+        cmd = self.host.run("bolt command run %s --targets %s --format json", command, ",".join(names))
+        if cmd.rc not in self.EXIT_CODES:
+            raise CommandExecutionError("bolt exited with code {rc}: {stderr}".format(rc=cmd.rc, stderr=cmd.stderr))
+        for item in self.parse_items(cmd.stdout):
+            name = item.get('target', item.get('node'))
+            if name not in names:
+                continue
+            value = item.get('value') or {}
+            if 'exit_code' not in value:
+                logger.debug("Bolt could not execute {command} on {target}: {error}".format(
+                    command=command, target=name, error=value.get('_error')))
+                yield name, None
+                continue
+            yield name, CommandOutput(command, value['exit_code'], value.get('stdout', ''), value.get('stderr', ''))
+
+    @classmethod
+    def parse_items(cls, out):
+        """
+        Parse the items of bolt's JSON output one by one, as bolt prints them once each target finished. The items of
+        the targets that finished are returned even if the output was cut short.
+        """
+        match = cls.ITEMS_PATTERN.search(out)
+        if match is None:
+            raise CommandExecutionError("Unexpected bolt output: {out}".format(out=out[:200]))
+        decoder = json.JSONDecoder()
+        position = match.end()
+        while True:
+            while position < len(out) and out[position] in ", \t\r\n":
+                position += 1
+            if position >= len(out) or out[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(out, position)
+            except ValueError:
+                logger.debug("bolt output was cut short at {position}".format(position=position))
+                return
+            yield item
+
+
+_bolt_fan_out = None
+
+
+def configure_bolt_fan_out(host, targets):
+    """ Fan out the checks of the targets through Bolt on host, see BoltFanOut """
+    global _bolt_fan_out
+    _bolt_fan_out = BoltFanOut(host, targets)
+    return _bolt_fan_out
+
+
+def get_bolt_fan_out():
+    """ Return the Bolt fan-out of the run or None if checks are not fanned out """
+    return _bolt_fan_out
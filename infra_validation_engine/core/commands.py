@@ -0,0 +1,38 @@
+# coding: utf-8
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Outcome of the commands that are not executed through a testinfra backend, e.g. by the remote probe or the asyncio engine
+"""
+
+
+class CommandOutput:
+    """ Outcome of a command. Exposes the same attributes as testinfra's CommandResult """
+
+    def __init__(self, command, rc, stdout, stderr):
+        self.command = command
+        self.rc = rc
+        self.exit_status = rc
+        self.stdout = stdout
+        self.stderr = stderr
+
+    @property
+    def succeeded(self):
+        return self.rc == 0
+
+    @property
+    def failed(self):
+        return self.rc != 0
+
+    def __repr__(self):
+        return "CommandOutput(command={command!r}, rc={rc}, stdout={stdout!r}, stderr={stderr!r})".format(
+            command=self.command, rc=self.rc, stdout=self.stdout, stderr=self.stderr)
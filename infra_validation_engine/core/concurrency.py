@@ -11,74 +11,294 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import sys
+import time
 import logging
+from collections import deque, OrderedDict
+from threading import Thread, Condition, Lock, current_thread
 
 
 IS_PY2 = sys.version_info < (3, 0)
 
-if IS_PY2:
-    from Queue import Queue
-else:
-    from queue import Queue
-
-from threading import Thread
+# Deadlines and durations must not move with the wall clock. Python 2 does not provide a monotonic clock.
+monotonic = getattr(time, 'monotonic', time.time)
 
 logger = logging.getLogger(__name__)
 
 
+class Task:
+    """ A pipeline element submitted to the Scheduler on behalf of a TaskGroup """
+    PENDING = 0
+    RUNNING = 1
+    DONE = 2
+
+    def __init__(self, pipeline_element, task_group):
+        self.pipeline_element = pipeline_element
+        self.task_group = task_group
+        self.state = Task.PENDING
+        # Tasks are balanced and throttled per host, elements that are not bound to a host share the None lane which is
+        # not throttled
+        self.host_key = pipeline_element.host_key
+        self.pending_dependencies = 0
+
+    def run(self, thread_name):
+        pipeline_element = self.pipeline_element
+        pipeline_element.report["executor_thread"] = thread_name
+        try:
+            pipeline_element.execute()
+        except Exception as e:
+            # An exception happened in this thread
+            err_msg = "Error during parallel execution of {element}".format(element=pipeline_element.name)
+            logger.error("{worker}: {err_msg}".format(worker=thread_name, err_msg=err_msg))
+            logger.debug("{worker}: {error} occurred when executing {element}".format(worker=thread_name,
+                                                                                      error=type(e),
+                                                                                      element=pipeline_element.name,
+                                                                                      ), exc_info=True)
+        finally:
+            logger.debug("{worker}: Dequeue {element}. Test exit code was: {code}".format(
+                worker=thread_name,
+                element=pipeline_element.name,
+                code=pipeline_element.exit_code))
+
+
+class TaskGroup:
+    """
+    The pipeline elements of one executor. At most max_in_flight of them are handed to the Scheduler at a time, the
+    rest are kept in the backlog until an element of the group finishes.
+    """
+
+    def __init__(self, pipeline_elements, max_in_flight=None, progress_callback=None):
+        self.backlog = deque([Task(pipeline_element, self) for pipeline_element in pipeline_elements])
+        self.total = len(self.backlog)
+        self.max_in_flight = max_in_flight if max_in_flight else self.total
+        self.progress_callback = progress_callback
+        self.queued = []
+        self.in_flight = 0
+        self.finished = 0
+        self.completed = 0
+
+    def is_done(self):
+        return self.completed >= self.total
+
+    def report_progress(self, task, completed):
+        if self.progress_callback is None:
+            return
+        try:
+            self.progress_callback(task.pipeline_element, completed, self.total)
+        except Exception:
+            logger.debug("Progress callback failed for {element}".format(element=task.pipeline_element.name),
+                         exc_info=True)
+
+
 class Worker(Thread):
-    """ Thread executing tasks from a given tasks queue """
+    """ Thread executing tasks handed out by the Scheduler """
 
-    def __init__(self, tasks):
+    def __init__(self, scheduler):
         Thread.__init__(self)
-        self.tasks = tasks
+        self.scheduler = scheduler
         self.daemon = True
         self.start()
 
     def run(self):
         logger.debug("{worker}: Started \n".format(worker=self.name))
         while True:
-            pipeline_element = self.tasks.get()
-            # infra_test = self.tasks.get()
-            pipeline_element.report["executor_thread"] = self.name
-            try:
-                pipeline_element.execute()
-            except Exception as e:
-                # An exception happened in this thread
-                err_msg = "Error during parallel execution of {element}".format(element=pipeline_element.name)
-                logger.error("{worker}: {err_msg}".format(worker=self.name, err_msg=err_msg))
-                logger.debug("{worker}: {error} occurred when executing {element}".format(worker=self.name,
-                                                                                          error=type(e),
-                                                                                          element=pipeline_element.name,
-                                                                                          ), exc_info=True)
-            finally:
-                # Mark this task as done, whether an exception happened or not
-                logger.debug("{worker}: Dequeue {element}. Test exit code was: {code}".format(
-                    worker=self.name,
-                    element=pipeline_element.name,
-                    code=pipeline_element.exit_code))
-                self.tasks.task_done()
-
-
-class ThreadPool:
-    """ Pool of threads consuming tasks from a queue """
-
-    def __init__(self, num_threads):
-        self.infra_tests_q = Queue(num_threads)
+            task = self.scheduler.next_task()
+            self.scheduler.execute(task, self.name, worker=True)
+
+
+class Scheduler:
+    """
+    Engine wide pool of worker threads shared by every executor in the pipeline.
+
+    Worker threads are created lazily, only when there is more ready work than available workers, and never more than
+    max_workers of them. A thread that waits for a TaskGroup, e.g. the worker running a nested ParallelExecutor, executes
+    the pending tasks of that group itself instead of blocking. Every group can therefore make progress on its own and
+    nested executors cannot deadlock, irrespective of the nesting depth and the size of the pool.
+
+    Ready tasks are kept in one lane per host, identified by the fqdn of the InfraTest. Workers pick the lanes in round
+    robin order so that a host with many checks does not starve the others, and at most max_per_host tasks of a host are
+    in flight at a time so that sshd (MaxSessions/MaxStartups) does not throttle or drop the connections.
+
+    Tasks whose dependencies have not finished yet are held back and only queued once the last of them finishes, so
+    that they do not occupy a worker while waiting.
+    """
+
+    def __init__(self, max_workers, max_per_host=None):
+        self.max_workers = max(1, max_workers)
+        self.max_per_host = max_per_host
+        self.condition = Condition()
+        self.lanes = OrderedDict()
+        self.host_in_flight = {}
         self.workers = []
-        for _ in range(num_threads):
-            self.workers.append(Worker(self.infra_tests_q))
+        self.ready = 0
+        self.available_workers = 0
+
+    def run(self, task_group):
+        """ Execute all the tasks of task_group and return once the last of them has finished """
+        with self.condition:
+            self._hold_back_dependents(task_group)
+            self._feed(task_group)
+            while not task_group.is_done():
+                task = self._claim_from(task_group)
+                if task is None:
+                    self.condition.wait()
+                    continue
+                self.condition.release()
+                try:
+                    self.execute(task, current_thread().name)
+                finally:
+                    self.condition.acquire()
+
+    def next_task(self):
+        """ Block until a task can be claimed by a worker """
+        with self.condition:
+            while True:
+                task = self._claim_next()
+                if task is not None:
+                    self.available_workers -= 1
+                    return task
+                self.condition.wait()
+
+    def execute(self, task, thread_name, worker=False):
+        task.run(thread_name)
+        task_group = task.task_group
+        with self.condition:
+            task.state = Task.DONE
+            self.host_in_flight[task.host_key] -= 1
+            task_group.in_flight -= 1
+            task_group.finished += 1
+            finished = task_group.finished
+            if worker:
+                self.available_workers += 1
+            self._feed(task_group)
+        # The group is only marked as completed after the progress callback, so that the callback of the last
+        # element has returned by the time the executor waiting for the group returns.
+        task_group.report_progress(task, finished)
+        with self.condition:
+            task_group.completed += 1
+            self.condition.notify_all()
+
+    def _feed(self, task_group):
+        """ Hand tasks from the backlog of task_group to the workers. Requires self.condition """
+        while task_group.backlog and task_group.in_flight < task_group.max_in_flight:
+            task = task_group.backlog.popleft()
+            task_group.in_flight += 1
+            task_group.queued.append(task)
+            task.pipeline_element.timing.submit()
+            self.lanes.setdefault(task.host_key, deque()).append(task)
+            self.ready += 1
+            logger.debug("Queueing {task}".format(task=task.pipeline_element.name))
+        while self.ready > self.available_workers and len(self.workers) < self.max_workers:
+            self.available_workers += 1
+            self.workers.append(Worker(self))
+        self.condition.notify_all()
+
+    def _hold_back_dependents(self, task_group):
+        """ Remove the tasks with unfinished dependencies from the backlog of task_group. Requires self.condition """
+        for task in list(task_group.backlog):
+            dependencies = [dependency for dependency in task.pipeline_element.dependencies if not dependency.finished]
+            if not dependencies:
+                continue
+            task_group.backlog.remove(task)
+            task.pending_dependencies = len(dependencies)
+            for dependency in dependencies:
+                dependency.add_done_callback(lambda _, task=task: self._dependency_finished(task))
+
+    def _dependency_finished(self, task):
+        with self.condition:
+            task.pending_dependencies -= 1
+            if task.pending_dependencies == 0:
+                task.task_group.backlog.append(task)
+                self._feed(task.task_group)
+
+    def _claim_next(self):
+        return self._claim(self.lanes)
+
+    def _claim_from(self, task_group):
+        hosts = set(task.host_key for task in task_group.queued if task.state == Task.PENDING)
+        return self._claim([host_key for host_key in self.lanes if host_key in hosts], task_group)
+
+    def _claim(self, host_keys, task_group=None):
+        """ Claim the next task of the first host in host_keys that has capacity, in round robin order of the lanes """
+        for host_key in list(host_keys):
+            lane = self.lanes[host_key]
+            while lane and lane[0].state != Task.PENDING:
+                # claimed by a thread waiting for the task group
+                lane.popleft()
+            if not lane:
+                del self.lanes[host_key]
+                continue
+            if not self._has_capacity(host_key):
+                continue
+            if task_group is None:
+                task = lane[0]
+            else:
+                task = next(task for task in lane if task.state == Task.PENDING and task.task_group is task_group)
+            lane.remove(task)
+            # Move the lane to the back of the round robin
+            del self.lanes[host_key]
+            if lane:
+                self.lanes[host_key] = lane
+            self._mark_running(task)
+            return task
+        return None
+
+    def _has_capacity(self, host_key):
+        if host_key is None or self.max_per_host is None:
+            return True
+        return self.host_in_flight.get(host_key, 0) < self.max_per_host
+
+    def _mark_running(self, task):
+        task.state = Task.RUNNING
+        task.task_group.queued.remove(task)
+        self.host_in_flight[task.host_key] = self.host_in_flight.get(task.host_key, 0) + 1
+        self.ready -= 1
+
+
+def fan_out(function, items, max_workers, name="FanOut"):
+    """
+    Call function for each of items on at most max_workers short lived threads and return once all calls returned.
+    Meant for one off phases outside of the test pipeline, e.g. connecting to all hosts.
+    """
+    pending = deque(items)
+
+    def work():
+        while True:
+            try:
+                item = pending.popleft()
+            except IndexError:
+                return
+            try:
+                function(item)
+            except Exception:
+                logger.error("{name}: Error when processing {item}".format(name=name, item=item), exc_info=True)
+
+    threads = [Thread(target=work, name="{name}-{i}".format(name=name, i=i))
+               for i in range(min(max_workers, len(pending)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
 
-    def add_worker(self):
-        self.workers.append(Worker(self.infra_tests_q))
+_scheduler = None
+_scheduler_lock = Lock()
 
-    def add_task(self, infra_test):
-        """ Add a task to the queue """
-        logger.debug("Queueing {task}".format(task=infra_test.name))
-        self.infra_tests_q.put(infra_test)
 
-    def wait_completion(self):
-        """ Wait for completion of all the tasks in the queue """
-        self.infra_tests_q.join()
+def configure_scheduler(max_workers, max_per_host=None):
+    """
+    Replace the engine wide scheduler with one that runs at most max_workers worker threads and at most max_per_host
+    tasks per host at a time
+    """
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = Scheduler(max_workers, max_per_host)
+    return _scheduler
 
 
+def get_scheduler(max_workers=10):
+    """ Return the engine wide scheduler. It is created with max_workers threads if it was not configured yet """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler(max_workers)
+        return _scheduler
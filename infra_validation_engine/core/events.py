@@ -0,0 +1,81 @@
+# coding: utf-8
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Streaming output of the progress of a run as newline delimited JSON events in API mode
+"""
+import json
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class EventSink:
+    """
+    Emits one compact JSON document per line through the API log level as soon as something happens, instead of the
+    nested report of a stage once the stage finished:
+
+    - test_start and test_finish with the report of the test, once for every InfraTest
+    - executor_summary and stage_summary with the report of the executor or stage. The reports of its pipeline are
+      not nested in it, so that the memory held by the reports does not grow with the pipeline
+
+    Every event has the path of names from the stage to the element, see PipelineElement.path.
+    """
+    SEPARATORS = (',', ':')
+
+    def __init__(self, emit=None):
+        self.emit = emit if emit is not None else logger.api
+
+    def test_started(self, infra_test):
+        self.send('test_start', infra_test, [('fqdn', infra_test.fqdn), ('description', infra_test.description)])
+
+    def element_finished(self, pipeline_element):
+        if pipeline_element.type == "InfraTest":
+            self.send('test_finish', pipeline_element, [('fqdn', pipeline_element.fqdn),
+                                                        ('exit_code', pipeline_element.exit_code),
+                                                        ('report', pipeline_element.report)])
+            return
+        event = 'stage_summary' if pipeline_element.type == "Stage" else 'executor_summary'
+        results = OrderedDict()
+        for element in pipeline_element.pipeline_elements:
+            result = element.report.get('result')
+            results[result] = results.get(result, 0) + 1
+        # Executors and stages do not nest the reports of their pipeline while events are streamed
+        self.send(event, pipeline_element, [('exit_code', pipeline_element.exit_code), ('results', results),
+                                            ('report', pipeline_element.report)])
+
+    def send(self, event, pipeline_element, fields):
+        document = OrderedDict([('event', event), ('time', time.time()), ('path', pipeline_element.path)])
+        document.update(fields)
+        self.emit(json.dumps(document, separators=self.SEPARATORS, default=str))
+
+
+_event_sink = None
+
+
+def configure_event_sink(emit=None):
+    """ Stream events through emit(line), by default the API log level, see EventSink """
+    global _event_sink
+    _event_sink = EventSink(emit)
+    return _event_sink
+
+
+def disable_event_sink():
+    global _event_sink
+    _event_sink = None
+
+
+def get_event_sink():
+    """ Return the event sink of the run or None if reports are output once a stage finished """
+    return _event_sink
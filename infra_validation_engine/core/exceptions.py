@@ -64,3 +64,13 @@ class CommandExecutionError(Exception):
 
 class PreConditionNotSatisfiedError(Exception):
     """ Raised if a pre condition for an Executor fails"""
+
+
+class DeadlineExceededError(Exception):
+    """ Raised if a pipeline element does not finish before its deadline """
+    pass
+
+
+class HostUnreachableError(Exception):
+    """ Raised instead of executing a command on a host that was found to be unreachable """
+    pass
@@ -1,6 +1,5 @@
-import time
 from infra_validation_engine.core import PipelineElement
-from infra_validation_engine.core.concurrency import ThreadPool
+from infra_validation_engine.core.concurrency import TaskGroup, get_scheduler
 
 
 class SerialExecutor(PipelineElement):
@@ -14,33 +13,32 @@ class SerialExecutor(PipelineElement):
 
 class ParallelExecutor(PipelineElement):
     """
-    A parallelized implementation for running a PipelineElement
+    A parallelized implementation for running a PipelineElement.
+    The pipeline elements are executed by the engine wide Scheduler, with at most num_threads of them in flight at a
+    time. The executor returns as soon as the last of its pipeline elements has been executed. Progress of the execution
+    can be followed through progress_callback(pipeline_element, completed, total), which is invoked after every element.
     """
 
-    def __init__(self, name, num_threads=2, status_notification_interval=2):
+    parallel = True
+
+    def __init__(self, name, num_threads=2, progress_callback=None):
         PipelineElement.__init__(self, name, "ParallelExecutor")
-        self.pool = ThreadPool(num_threads)
         self.num_threads = num_threads
-        self.status_notification_interval = status_notification_interval
+        self.progress_callback = progress_callback if progress_callback is not None else self.log_progress
         self.report["strategy"] = "parallel"
 
     def pre_condition(self):
         pass
 
     def run(self):
-        """ Add n threads if the pipeline consists for n parallel executors to avoid a deadlock """
-        total_elements = len(self.pipeline_elements)
-        parallel_elements = [x for x in self.pipeline_elements if isinstance(x, ParallelExecutor)]
-        num_parallel_elements = len(parallel_elements)
-        num_threads = self.num_threads if num_parallel_elements > self.num_threads else num_parallel_elements
-
-        for pipeline_element in self.pipeline_elements:
-            self.pool.add_task(pipeline_element)
-
-        """ Monitor Execution of tests"""
-        while self.pool.infra_tests_q.qsize() > 0:
-            self.logger.debug("{executor} queue status: {completed}/{total}".format(
-                executor=self.name, total=total_elements,
-                completed=(total_elements - self.pool.infra_tests_q.qsize())))
-            time.sleep(self.status_notification_interval)
-        self.pool.wait_completion()
+        """
+        Nested parallel executors do not need threads of their own to avoid a deadlock: the thread executing this
+        executor works on its pending elements while it waits for the rest of them.
+        """
+        task_group = TaskGroup(self.pipeline_elements, self.num_threads, self.progress_callback)
+        get_scheduler().run(task_group)
+
+    def log_progress(self, pipeline_element, completed, total):
+        self.logger.debug("{executor} queue status: {completed}/{total}. Finished {element}".format(
+            executor=self.name, completed=completed, total=total, element=pipeline_element.name))
+
@@ -0,0 +1,126 @@
+# coding: utf-8
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Run scoped cache for the results of read only commands, see InfraTest.fact()
+"""
+import logging
+import sys
+from collections import OrderedDict
+from threading import Event, Lock
+
+import six
+
+from infra_validation_engine.core.timing import shared_command_context
+
+logger = logging.getLogger(__name__)
+
+
+class Fact:
+    """ The result of a command, available once the thread executing the command resolved it """
+
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.exc_info = None
+
+    def resolve(self, function):
+        try:
+            self.result = function()
+        except Exception:
+            self.exc_info = sys.exc_info()
+        finally:
+            self.done.set()
+
+    def get(self):
+        self.done.wait()
+        if self.exc_info is not None:
+            six.reraise(*self.exc_info)
+        return self.result
+
+
+class FactCache:
+    """
+    Results of idempotent, read only commands keyed by host and command. Concurrent requests for the same command share
+    a single execution: the first one executes the command while the others wait for its result. Failed executions are
+    not cached, the next request executes the command again.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.facts = {}
+        self.expected = {}
+        self.hits = 0
+        self.misses = 0
+
+    def expect(self, host, command):
+        """ Announce that command will be requested for host, so that the remote probe can collect it in advance """
+        with self.lock:
+            self.expected.setdefault(host, set()).add(command)
+
+    def get_pending(self, host):
+        """ Return the commands expected for host that were not executed yet """
+        with self.lock:
+            return sorted(command for command in self.expected.get(host, ()) if (host, command, ()) not in self.facts)
+
+    def run(self, host, command, *args):
+        """
+        Return the result of host.run(command, *args), executing the command only if it was not executed on host before
+        :return: A (result, hit) tuple. hit is True if the result was not obtained by executing the command
+        """
+        key = (host, command, args)
+        with self.lock:
+            fact = self.facts.get(key)
+            hit = fact is not None
+            if hit:
+                self.hits += 1
+            else:
+                fact = self.facts[key] = Fact()
+                self.misses += 1
+        if not hit:
+            fact.resolve(lambda: self.execute(host, command, *args))
+            if fact.exc_info is not None:
+                with self.lock:
+                    del self.facts[key]
+        return fact.get(), hit
+
+    @staticmethod
+    def execute(host, command, *args):
+        # The result is shared by the tests of the host, the deadline of the test that needs it first does not apply
+        with shared_command_context():
+            return host.run(command, *args)
+
+    def seed(self, host, result, command, *args):
+        """ Cache the result of a command that was obtained without executing the command on its own """
+        fact = Fact()
+        fact.resolve(lambda: result)
+        with self.lock:
+            self.facts.setdefault((host, command, args), fact)
+
+    def stats(self):
+        with self.lock:
+            return OrderedDict([('hits', self.hits), ('misses', self.misses), ('entries', len(self.facts))])
+
+    def clear(self):
+        with self.lock:
+            self.facts = {}
+            self.expected = {}
+            self.hits = 0
+            self.misses = 0
+
+
+_fact_cache = FactCache()
+
+
+def get_fact_cache():
+    """ Return the fact cache of the run """
+    return _fact_cache
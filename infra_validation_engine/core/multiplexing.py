@@ -0,0 +1,131 @@
+# coding: utf-8
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Persistent, multiplexed ssh connections to the hosts under test
+"""
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from collections import OrderedDict
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionMultiplexer:
+    """
+    Manages the OpenSSH ControlMaster sockets of the run. The first command executed on a host opens a master connection,
+    all further commands to the host are multiplexed over it instead of performing their own ssh handshake. Masters
+    stay open for control_persist seconds after their last command.
+
+    By default the sockets are created in a temporary directory that is removed, together with the masters, when the
+    run finishes. If control_dir is given, the sockets are kept there and masters that are still open are reused by the
+    next run: they outlive the run and are closed by ssh once they were idle for control_persist seconds.
+
+    control_persist must be at least 1, OpenSSH keeps masters open indefinitely with ControlPersist 0.
+    """
+    SSH_CONFIG_TEMPLATE = "\n".join([
+        "Host *",
+        "    ControlMaster auto",
+        "    ControlPath {control_dir}/%C",
+        "    ControlPersist {control_persist}",
+        # The settings above take precedence as the first value obtained for an option is used
+        "Include {user_config}",
+        "Include /etc/ssh/ssh_config",
+        ""
+    ])
+    SSH_CONFIG_FILE = "ssh_config"
+
+    def __init__(self, control_dir=None, control_persist=60):
+        if control_persist < 1:
+            raise ValueError("control_persist must be at least 1 second, got {value}".format(value=control_persist))
+        self.persistent = control_dir is not None
+        self.control_dir = os.path.abspath(os.path.expanduser(control_dir)) if self.persistent else None
+        self.control_persist = control_persist
+        self.lock = Lock()
+        self.commands = 0
+        self.hosts = set()
+        self.initial_sockets = set()
+        self.started = False
+
+    @property
+    def ssh_config(self):
+        """ Path of the ssh client configuration that enables multiplexing. Pass it to the ssh backends as ssh_config """
+        return os.path.join(self.control_dir, self.SSH_CONFIG_FILE)
+
+    def start(self):
+        if self.persistent:
+            if not os.path.isdir(self.control_dir):
+                os.makedirs(self.control_dir, 0o700)
+        else:
+            self.control_dir = tempfile.mkdtemp(prefix="simple-ive-ssh-")
+        with open(self.ssh_config, 'w') as ssh_config:
+            ssh_config.write(self.SSH_CONFIG_TEMPLATE.format(control_dir=self.control_dir,
+                                                             control_persist=self.control_persist,
+                                                             user_config=os.path.expanduser("~/.ssh/config")))
+        self.initial_sockets = self.get_sockets()
+        self.started = True
+        logger.debug("Multiplexing ssh connections through {dir}".format(dir=self.control_dir))
+
+    def get_sockets(self):
+        return set(entry for entry in os.listdir(self.control_dir) if entry != self.SSH_CONFIG_FILE)
+
+    def record_command(self, hostname):
+        """ Count a command executed over ssh on hostname """
+        with self.lock:
+            self.commands += 1
+            self.hosts.add(hostname)
+
+    def stats(self):
+        """
+        :return: The number of commands executed over ssh, the number of ssh handshakes performed to open masters and the
+        number of handshakes that multiplexing saved
+        """
+        with self.lock:
+            commands = self.commands
+        handshakes = len(self.get_sockets() - self.initial_sockets) if self.started else commands
+        return OrderedDict([('ssh_commands', commands),
+                            ('ssh_handshakes', min(handshakes, commands)),
+                            ('ssh_handshakes_saved', max(0, commands - handshakes))])
+
+    def stop(self):
+        """ Close the masters and remove the sockets, unless they should persist across runs """
+        if not self.started or self.persistent:
+            return
+        self.started = False
+        for hostname in self.hosts:
+            try:
+                with open(os.devnull, 'w') as devnull:
+                    subprocess.call(["ssh", "-F", self.ssh_config, "-O", "exit", hostname],
+                                    stdout=devnull, stderr=devnull)
+            except OSError:
+                logger.debug("Could not close the ssh master for {host}".format(host=hostname), exc_info=True)
+        shutil.rmtree(self.control_dir, ignore_errors=True)
+
+
+_multiplexer = None
+
+
+def configure_multiplexer(control_dir=None, control_persist=60):
+    """ Create and start the multiplexer of the run """
+    global _multiplexer
+    _multiplexer = ConnectionMultiplexer(control_dir, control_persist)
+    _multiplexer.start()
+    return _multiplexer
+
+
+def get_multiplexer():
+    """ Return the multiplexer of the run or None if ssh connections are not multiplexed """
+    return _multiplexer
@@ -0,0 +1,188 @@
+# coding: utf-8
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Remote probe mode: the queries of all the snapshots and facts a host's tests need are compiled into one shell script,
+which is executed on the host with a single command
+"""
+import base64
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+
+from six.moves import shlex_quote
+
+from infra_validation_engine.core.commands import CommandOutput
+from infra_validation_engine.core.concurrency import fan_out, monotonic
+from infra_validation_engine.core.exceptions import CommandExecutionError
+from infra_validation_engine.core.facts import get_fact_cache
+from infra_validation_engine.core.snapshots import HostSnapshot
+from infra_validation_engine.core.timing import current_pipeline_element, timing_context
+
+logger = logging.getLogger(__name__)
+
+
+class PendingChecks(object):
+    """
+    The pending queries of all the snapshots of a host, see HostSnapshot.pending_query(), and the facts its tests
+    announced, see FactCache.expect(), as shell commands. A snapshot is locked while its query is obtained and while
+    the result is loaded into it, not while the commands are executed: the checks are collected before the tests of
+    the stage are started.
+    """
+
+    def __init__(self, host):
+        self.host = host
+        self.targets = []
+        for snapshot in sorted(HostSnapshot.all_for_host(host), key=lambda snapshot: type(snapshot).__name__):
+            snapshot.lock.acquire()
+            try:
+                query = snapshot.pending_query()
+            finally:
+                snapshot.lock.release()
+            if query is not None:
+                self.targets.append((snapshot, format_command(*query)))
+        self.targets.extend((None, command) for command in get_fact_cache().get_pending(host))
+
+    @property
+    def commands(self):
+        return [command for _, command in self.targets]
+
+    def load(self, command, result):
+        """ Load the result of command into the snapshot or the fact cache that requested it """
+        for snapshot, target_command in self.targets:
+            if target_command != command:
+                continue
+            if snapshot is None:
+                get_fact_cache().seed(self.host, result, command)
+                continue
+            snapshot.lock.acquire()
+            try:
+                snapshot.load(result)
+            except Exception:
+                logger.debug("Could not load the output of {command} into {snapshot}".format(
+                    command=command, snapshot=type(snapshot).__name__), exc_info=True)
+            finally:
+                snapshot.lock.release()
+
+
+class RemoteProbe:
+    """
+    Collects the PendingChecks of a host with a single probe script. The output of every command is returned as JSON,
+    base64 encoded, and loaded into the snapshots and the fact cache. The tests then resolve from those without
+    executing commands of their own.
+
+    The script is stored on the host under the hash of its contents. Subsequent runs with the same checks execute the
+    stored script instead of uploading it again.
+    """
+    REMOTE_DIR = "$HOME/.cache/simple_infra_validation_engine"
+    # Exit code of the command executing the stored script if it was not uploaded yet
+    NOT_UPLOADED = 100
+
+    def __init__(self, host):
+        self.host = host
+        self.report = OrderedDict([('commands', 0), ('uploaded', False), ('duration', None), ('error', None)])
+
+    def run(self):
+        """ Execute the probe. Snapshots and facts that could not be collected are collected by the tests later """
+        start = monotonic()
+        try:
+            checks = PendingChecks(self.host)
+            commands = checks.commands
+            self.report['commands'] = len(commands)
+            if commands:
+                for command, result in zip(commands, self.execute(commands)):
+                    checks.load(command, result)
+        except Exception as ex:
+            self.report['error'] = str(ex)
+            logger.warning("Remote probe failed, the tests will query the host themselves: {error}".format(error=ex))
+            logger.debug("Exception:", exc_info=True)
+        finally:
+            self.report['duration'] = monotonic() - start
+        return self.report
+
+    def execute(self, commands):
+        script = self.compile(commands)
+        script_path = "{dir}/probe-{hash}.sh".format(dir=self.REMOTE_DIR,
+                                                     hash=hashlib.sha256(script.encode('utf-8')).hexdigest())
+        cmd = self.host.run('if [ -f "{path}" ]; then sh "{path}"; else exit {rc}; fi'.format(
+            path=script_path, rc=self.NOT_UPLOADED))
+        if cmd.rc == self.NOT_UPLOADED:
+            self.report['uploaded'] = True
+            encoded_script = base64.b64encode(script.encode('utf-8')).decode('ascii')
+            cmd = self.host.run('mkdir -p "{dir}" && printf %s \'{script}\' | base64 -d > "{path}.$$" && '
+                                'mv "{path}.$$" "{path}" && sh "{path}"'.format(dir=self.REMOTE_DIR,
+                                                                               script=encoded_script,
+                                                                               path=script_path))
+        if cmd.rc != 0:
+            raise CommandExecutionError("Probe exited with code {rc}: {stderr}".format(rc=cmd.rc, stderr=cmd.stderr))
+        return self.parse(commands, cmd.stdout)
+
+    @staticmethod
+    def compile(commands):
+        """ :return: A POSIX shell script that executes the commands and prints their outcome as JSON """
+        lines = [
+            "#!/bin/sh",
+            "# Generated by simple_infra_validation_engine",
+            'o=$(mktemp) && e=$(mktemp) || exit 1',
+            "printf '{\"results\": ['",
+        ]
+        for i, command in enumerate(commands):
+            lines.extend([
+                '( {command} ) > "$o" 2> "$e"; r=$?'.format(command=command),
+                'printf \'%s{{"rc": %d, "stdout": "%s", "stderr": "%s"}}\' "{separator}" "$r" '
+                '"$(base64 < "$o" | tr -d \'\\n\')" "$(base64 < "$e" | tr -d \'\\n\')"'.format(
+                    separator="," if i > 0 else ""),
+            ])
+        lines.extend([
+            "printf ']}\\n'",
+            'rm -f "$o" "$e"',
+            "",
+        ])
+        return "\n".join(lines)
+
+    @staticmethod
+    def parse(commands, out):
+        results = json.loads(out)['results']
+        if len(results) != len(commands):
+            raise CommandExecutionError("Expected the output of {expected} commands, got {count}".format(
+                expected=len(commands), count=len(results)))
+        return [CommandOutput(command, result['rc'], decode(result['stdout']), decode(result['stderr']))
+                for command, result in zip(commands, results)]
+
+
+def decode(value):
+    return base64.b64decode(value).decode('utf-8', 'replace')
+
+
+def format_command(command, args):
+    """ Quote args and substitute them in command, see testinfra.host.Host.run """
+    if args:
+        return command % tuple(shlex_quote(str(arg)) for arg in args)
+    return command
+
+
+def probe_hosts(hosts, max_workers=10):
+    """
+    Execute the remote probe on all hosts concurrently, at most max_workers at a time
+    :return: An OrderedDict of probe reports by host
+    """
+    probes = [RemoteProbe(host) for host in hosts]
+    # The probes are bound by the deadline of the stage that executes them, and their commands are attributed to it
+    pipeline_element = current_pipeline_element()
+
+    def run(probe):
+        with timing_context(pipeline_element):
+            probe.run()
+
+    fan_out(run, probes, max_workers, "Probe")
+    return OrderedDict((probe.host, probe.report) for probe in probes)
@@ -0,0 +1,136 @@
+# coding: utf-8
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Selection of the pipeline elements that did not pass in the report of a previous run, see validate --rerun-failed
+"""
+import json
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class RerunSelection:
+    """
+    The elements of the stage reports of a previous API mode run that did not pass. select() prunes the pipeline of a
+    stage of the current run down to these elements and the executors enclosing them, whose pre conditions are checked
+    again. Elements are identified by the names of the elements on the path from their stage to them and, since tests of
+    the same name run on several hosts, tests by their fqdn as well. Reports of tests without an fqdn select the tests
+    of that name on every host.
+
+    Elements that were skipped are selected as well, since their prerequisite or the pre condition of their executor
+    failed. If an executor did not pass as a whole, e.g. since its pre condition failed, its entire pipeline is
+    selected.
+    """
+    FAILED_RESULTS = ('fail', 'exec_fail', 'timeout', 'skipped')
+    FINISH_EVENTS = ('test_finish', 'executor_summary', 'stage_summary')
+
+    def __init__(self, stage_reports, events=()):
+        # (path, fqdn) of the elements whose entire pipeline is selected, by stage name. The fqdn of executors is None
+        self.failed = OrderedDict()
+        for report in stage_reports:
+            self.failed[report['name']] = failed = set()
+            self.collect(report, (), failed)
+        for event in events:
+            path = tuple(event['path'])
+            failed = self.failed.setdefault(path[0], set())
+            if event['report'].get('result') in self.FAILED_RESULTS:
+                failed.add((path, event.get('fqdn')))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load the stage reports in the API mode output of a previous run, which may contain the reports of several
+        stages. If a stage was reported more than once, its last report is used. Output streamed as events, see
+        core.events, is read from the finish and summary events. Raises IOError or ValueError
+        """
+        with open(path, 'r') as report_file:
+            content = report_file.read()
+        decoder = json.JSONDecoder()
+        stage_reports = OrderedDict()
+        events = []
+        position = content.find('{')
+        while position != -1:
+            try:
+                report, end = decoder.raw_decode(content, position)
+            except ValueError:
+                # Not a JSON document, e.g. a log line that was captured with the report
+                position = content.find('{', position + 1)
+                continue
+            if isinstance(report, dict) and report.get('type') == "Stage" and 'name' in report:
+                stage_reports.pop(report['name'], None)
+                stage_reports[report['name']] = report
+            elif isinstance(report, dict) and report.get('event') in cls.FINISH_EVENTS:
+                events.append(report)
+            position = content.find('{', end)
+        if len(stage_reports) == 0 and len(events) == 0:
+            raise ValueError("{path} does not contain the report of any stage".format(path=path))
+        return cls(stage_reports.values(), events)
+
+    def collect(self, report, path, failed):
+        path = path + (report.get('name'),)
+        if report.get('result') in self.FAILED_RESULTS:
+            failed.add((path, report.get('fqdn')))
+            return
+        for element_report in report.get('element_reports') or []:
+            self.collect(element_report, path, failed)
+
+    @property
+    def stages(self):
+        """ Return the CLI names of the stages with elements to rerun """
+        return [name.lower() for name, failed in self.failed.items() if len(failed) > 0]
+
+    def select(self, stage):
+        """
+        Remove the elements that passed in the previous run from the pipeline of stage. Dependencies on removed elements
+        are dropped, as these elements passed.
+        :return: A report with the number of elements that did not pass before and the number of tests selected
+        """
+        failed = self.failed.get(stage.name, set())
+        selected = []
+        if ((stage.name,), None) in failed:
+            self.add_subtree(stage, selected)
+        else:
+            stage.pipeline_elements = [element for element in stage.pipeline_elements
+                                       if self.prune(element, (stage.name,), failed, selected)]
+        for element in selected:
+            element.dependencies = [dependency for dependency in element.dependencies if dependency in selected]
+        report = OrderedDict([('failed_before', len(failed)),
+                              ('selected_tests', len([element for element in selected
+                                                      if element.type == "InfraTest"]))])
+        logger.info("Rerunning {tests} tests of {stage} that did not pass before".format(
+            tests=report['selected_tests'], stage=stage.name))
+        return report
+
+    def prune(self, element, path, failed, selected):
+        """ :return: True if element has to be rerun, after removing the elements in its pipeline that do not """
+        path = path + (element.name,)
+        if self.has_failed(element, path, failed):
+            self.add_subtree(element, selected)
+            return True
+        element.pipeline_elements = [child for child in element.pipeline_elements
+                                     if self.prune(child, path, failed, selected)]
+        if len(element.pipeline_elements) == 0:
+            return False
+        selected.append(element)
+        return True
+
+    @staticmethod
+    def has_failed(element, path, failed):
+        fqdn = element.fqdn if element.type == "InfraTest" else None
+        return (path, fqdn) in failed or (path, None) in failed
+
+    def add_subtree(self, element, selected):
+        selected.append(element)
+        for child in element.pipeline_elements:
+            self.add_subtree(child, selected)
@@ -0,0 +1,134 @@
+# coding: utf-8
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Cross-run cache for the results of tests that passed, see InfraTest.cache_ttl
+"""
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """
+    The reports of the tests that passed, stored in an SQLite database and keyed by test class, parameters and host.
+    A stored pass is reused by later runs as long as it is younger than both max_age and the cache_ttl of the test
+    class. Tests that fail remove their entry, so they are executed again by the next run.
+
+    :param path: The SQLite database file, created if it does not exist
+    :param max_age: Seconds after which a stored pass is executed again, irrespective of the cache_ttl of its test
+    :param clock: Returns the current time in seconds since the epoch. The entries outlive the run, so the monotonic
+    clock cannot be used
+    """
+    SCHEMA = ("CREATE TABLE IF NOT EXISTS results (test TEXT NOT NULL, parameters TEXT NOT NULL, host TEXT NOT NULL, "
+              "stored_at REAL NOT NULL, report TEXT NOT NULL, PRIMARY KEY (test, parameters, host))")
+
+    def __init__(self, path, max_age, clock=time.time):
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.max_age = max_age
+        self.clock = clock
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.errors = 0
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        # The tests of a run share the connection, access to it is serialized by self.lock
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(self.SCHEMA)
+
+    def get(self, key, ttl):
+        """
+        :param key: (test, parameters, host) tuple of strings
+        :param ttl: Seconds the cached result of the test class is valid for
+        :return: A (report, age) tuple of the stored pass or None if there is none younger than ttl and max_age
+        """
+        max_age = min(ttl, self.max_age)
+        with self.lock:
+            try:
+                row = self.connection.execute(
+                    "SELECT stored_at, report FROM results WHERE test = ? AND parameters = ? AND host = ?",
+                    key).fetchone()
+            except sqlite3.Error as ex:
+                return self.error("read", key, ex)
+            age = self.clock() - row[0] if row is not None else None
+            if age is None or age > max_age or age < 0:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[1], object_pairs_hook=OrderedDict), age
+
+    def put(self, key, report):
+        """ Store the report of a test that passed """
+        with self.lock:
+            try:
+                with self.connection:
+                    self.connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                                            tuple(key) + (self.clock(), json.dumps(report)))
+                self.stored += 1
+            except (sqlite3.Error, TypeError, ValueError) as ex:
+                self.error("write", key, ex)
+
+    def remove(self, key):
+        """ Remove the entry of a test that did not pass """
+        with self.lock:
+            try:
+                with self.connection:
+                    self.connection.execute("DELETE FROM results WHERE test = ? AND parameters = ? AND host = ?", key)
+            except sqlite3.Error as ex:
+                self.error("remove", key, ex)
+
+    def error(self, action, key, ex):
+        """ A broken cache must not break the run, the test is executed as if it was not cached """
+        self.errors += 1
+        logger.warning("Could not {action} the cached result of {test} on {host}: {error}".format(
+            action=action, test=key[0], host=key[2], error=ex))
+        logger.debug("Exception:", exc_info=True)
+        return None
+
+    def stats(self):
+        with self.lock:
+            return OrderedDict([('hits', self.hits), ('misses', self.misses), ('stored', self.stored),
+                                ('errors', self.errors)])
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+_result_cache = None
+
+
+def configure_result_cache(path, max_age, clock=time.time):
+    """
+    Reuse the passes stored in the database at path that are younger than max_age seconds, see ResultCache. If path is
+    None, results are not cached.
+    """
+    global _result_cache
+    if _result_cache is not None:
+        _result_cache.close()
+    _result_cache = ResultCache(path, max_age, clock) if path is not None else None
+    return _result_cache
+
+
+def get_result_cache():
+    """ Return the result cache of the run or None if results are not cached """
+    return _result_cache
@@ -0,0 +1,371 @@
+# coding: utf-8
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Snapshots of the state of a host, collected with a single remote command and shared by all the tests of the host
+"""
+import fnmatch
+import json
+import logging
+from abc import ABCMeta, abstractmethod
+from threading import Lock
+
+import six
+
+from infra_validation_engine.core.exceptions import CommandExecutionError
+from infra_validation_engine.core.timing import shared_command_context
+
+logger = logging.getLogger(__name__)
+
+
+@six.add_metaclass(ABCMeta)
+class HostSnapshot(object):
+    """
+    Facts about a host that many tests need, e.g. the state of files or packages. The facts are collected lazily, by the
+    first test that needs them, and under a lock: tests that need the snapshot while it is being collected wait for
+    that command instead of executing their own.
+
+    The command is obtained from pending_query() and its result is parsed by load(). Both require self.lock, which
+    allows the remote probe to collect many snapshots with a single command.
+
+    There is one snapshot of each kind per host for the whole run, see for_host().
+    """
+    _snapshots = {}
+    _snapshots_lock = Lock()
+
+    def __init__(self, host):
+        self.host = host
+        self.lock = Lock()
+        self.collected = False
+
+    @classmethod
+    def for_host(cls, host):
+        """ Return the snapshot of this kind for the testinfra host """
+        with HostSnapshot._snapshots_lock:
+            key = (cls, host)
+            if key not in HostSnapshot._snapshots:
+                HostSnapshot._snapshots[key] = cls(host)
+            return HostSnapshot._snapshots[key]
+
+    @classmethod
+    def all_for_host(cls, host):
+        """ Return the snapshots of all kinds that were created for the testinfra host """
+        with HostSnapshot._snapshots_lock:
+            return [snapshot for (_, snapshot_host), snapshot in HostSnapshot._snapshots.items()
+                    if snapshot_host is host]
+
+    def ensure_collected(self):
+        """ Collect the snapshot unless it was collected already """
+        with self.lock:
+            if not self.collected:
+                self.collect()
+
+    def collect(self):
+        """ Collect the facts of the snapshot from the host. Requires self.lock """
+        command, args = self.pending_query()
+        # The snapshot is shared by the tests of the host, the deadline of the test that needs it first does not apply
+        with shared_command_context():
+            cmd = self.host.run(command, *args)
+        self.load(cmd)
+
+    def pending_query(self):
+        """
+        :return: A (command, args) tuple for host.run() that collects the facts that are not known yet, or None
+        if all of them are known. Requires self.lock
+        """
+        return None if self.collected else self.get_query()
+
+    def load(self, cmd):
+        """ Update the snapshot with the result of the command returned by pending_query(). Requires self.lock """
+        self.parse(cmd)
+        self.collected = True
+
+    @abstractmethod
+    def get_query(self):
+        """ :return: A (command, args) tuple that collects the facts of the snapshot """
+        pass
+
+    @abstractmethod
+    def parse(self, cmd):
+        """ Update the facts of the snapshot from the result of the command returned by get_query() """
+        pass
+
+    @staticmethod
+    def check_exit_code(cmd, exit_codes=(0,)):
+        if cmd.rc not in exit_codes:
+            raise CommandExecutionError("Command {cmd} exited with code {rc}.\n stderr: {stderr}".format(
+                cmd=cmd.command, rc=cmd.rc, stderr=cmd.stderr))
+
+
+class BatchSnapshot(HostSnapshot):
+    """
+    Facts about items of a host, e.g. paths or systemd units, that are queried with one command for many items. Tests
+    register the items they check when they are created with add(). The first lookup queries all the registered items
+    that are not known yet with a single command.
+    """
+
+    def __init__(self, host):
+        HostSnapshot.__init__(self, host)
+        self.requested = set()
+        self.queried = []
+        self.facts = {}
+
+    def add(self, *items):
+        with self.lock:
+            self.requested.update(item for item in items if item not in self.facts)
+
+    def get(self, item):
+        with self.lock:
+            if item not in self.facts:
+                self.requested.add(item)
+                self.collect()
+            return self.facts[item]
+
+    def pending_query(self):
+        if not self.requested:
+            return None
+        self.queried = sorted(self.requested)
+        logger.debug("Querying {count} items with a single command for {snapshot}".format(
+            count=len(self.queried), snapshot=type(self).__name__))
+        return self.get_query(self.queried)
+
+    def load(self, cmd):
+        self.facts.update(self.parse(self.queried, cmd))
+        self.requested.difference_update(self.queried)
+
+    @abstractmethod
+    def get_query(self, items):
+        """ :return: A (command, args) tuple that queries the facts about the items """
+        pass
+
+    @abstractmethod
+    def parse(self, items, cmd):
+        """ :return: A dict with the facts about each of the items """
+        pass
+
+
+class PathSnapshot(BatchSnapshot):
+    """ Types of the paths checked on a host, see get() """
+    DIRECTORY = 'directory'
+
+    def exists(self, path):
+        return self.get(path) is not None
+
+    def is_directory(self, path):
+        return self.get(path) == PathSnapshot.DIRECTORY
+
+    def get(self, path):
+        """
+        :return: The file type reported by stat, e.g. 'regular file' or 'directory', for path or None if it does
+        not exist. Symbolic links are followed, like test -e does.
+        """
+        return BatchSnapshot.get(self, path)
+
+    def get_query(self, paths):
+        return "stat -L -c %s -- " + " ".join(["%s"] * len(paths)), ["%F:%n"] + paths
+
+    def parse(self, paths, cmd):
+        # stat only reports the paths that exist. The type never contains a colon, so the output can be split on the
+        # first one even if the path contains colons. It exits with 1 if some of the paths do not exist.
+        self.check_exit_code(cmd, exit_codes=(0, 1))
+        types = dict((path, None) for path in paths)
+        for line in cmd.stdout.splitlines():
+            file_type, _, path = line.partition(':')
+            if path in types:
+                types[path] = file_type
+        return types
+
+
+class PackageSnapshot(HostSnapshot):
+    """ Inventory of the packages installed on a host, indexed by package name, taken with a single rpm/dpkg query """
+    # Lines are tagged with the package manager since the last field is the release for rpm and the status for dpkg
+    RPM_QUERY_FORMAT = "rpm\\t%{NAME}\\t%{VERSION}\\t%{RELEASE}\\n"
+    DPKG_QUERY_FORMAT = "dpkg\\t${binary:Package}\\t${Version}\\t${db:Status-Abbrev}\\n"
+
+    def __init__(self, host):
+        HostSnapshot.__init__(self, host)
+        self.packages = {}
+
+    def get(self, name):
+        """
+        :return: A (version, release) tuple for the package or None if it is not installed. The release is None on
+        Debian based hosts
+        """
+        self.ensure_collected()
+        return self.packages.get(name)
+
+    def is_installed(self, name):
+        return self.get(name) is not None
+
+    def get_query(self):
+        # The package manager is chosen by the OS family in /etc/os-release, e.g. Debian hosts may have rpm installed.
+        # Otherwise dpkg is preferred, like testinfra does
+        return ("case \" $(. /etc/os-release 2> /dev/null; echo $ID $ID_LIKE) \" in "
+                "*' debian '*|*' ubuntu '*) dpkg-query -W -f %s ;; "
+                "*' rhel '*|*' centos '*|*' fedora '*|*' suse '*) rpm -qa --queryformat %s ;; "
+                "*) if command -v dpkg-query > /dev/null 2>&1; then dpkg-query -W -f %s; "
+                "else rpm -qa --queryformat %s; fi ;; esac",
+                [self.DPKG_QUERY_FORMAT, self.RPM_QUERY_FORMAT, self.DPKG_QUERY_FORMAT, self.RPM_QUERY_FORMAT])
+
+    def parse(self, cmd):
+        self.check_exit_code(cmd)
+        packages = {}
+        for line in cmd.stdout.splitlines():
+            fields = line.split('\t')
+            if len(fields) != 4:
+                continue
+            package_manager, name, version, release = fields
+            if package_manager == 'dpkg':
+                # The status is the desired action, e.g. i(nstall) or h(old), the current state and an error flag
+                if release[1:2] != 'i' or release[2:].strip():
+                    # not installed, e.g. removed with its configuration files left behind, or broken
+                    continue
+                name, release = name.split(':')[0], None
+            packages[name] = (version, release)
+        logger.debug("Found {count} installed packages".format(count=len(packages)))
+        self.packages = packages
+
+
+class SystemdSnapshot(BatchSnapshot):
+    """ State of the systemd units checked on a host, see get() """
+    PROPERTIES = "LoadState,ActiveState,UnitFileState"
+
+    def get(self, unit):
+        """
+        :return: A dict with the LoadState, ActiveState and UnitFileState of the unit. The LoadState of units that do
+        not exist is not-found.
+        """
+        return BatchSnapshot.get(self, unit)
+
+    def get_query(self, units):
+        return "systemctl show -p %s " + " ".join(["%s"] * len(units)), [self.PROPERTIES] + units
+
+    def parse(self, units, cmd):
+        if cmd.rc != 0:
+            raise CommandExecutionError("Could not query the state of the systemd units {units}: {stderr}".format(
+                units=", ".join(units), stderr=cmd.stderr))
+        # systemctl prints the properties of the units in the order of the arguments, separated by an empty line
+        blocks = cmd.stdout.strip().split('\n\n')
+        if len(blocks) != len(units):
+            raise CommandExecutionError("Expected the state of {expected} units, got {count}: {out}".format(
+                expected=len(units), count=len(blocks), out=cmd.stdout))
+        states = {}
+        for unit, block in zip(units, blocks):
+            states[unit] = dict(line.strip().split('=', 1) for line in block.splitlines() if '=' in line)
+        return states
+
+
+class DockerSnapshot(HostSnapshot):
+    """
+    Containers, images and networks of the docker daemon of a host, taken with one bulk listing of each. The listings
+    are independent: if one of them fails, e.g. docker network ls on an older daemon, only the lookups in it raise.
+    """
+    SEPARATOR = "--"
+    SECTIONS = ('containers', 'images', 'networks')
+    LISTINGS = ("docker ps -a --no-trunc", "docker image ls --no-trunc", "docker network ls --no-trunc")
+
+    def __init__(self, host):
+        HostSnapshot.__init__(self, host)
+        self.containers = []
+        self.container_names = {}
+        self.images = []
+        self.networks = {}
+        self.errors = {}
+
+    def get_container(self, container):
+        """
+        :return: The docker ps entry of the container with the given name, ID or unique ID prefix, like docker inspect
+        resolves them, or None if there is none
+        """
+        self.ensure_collected()
+        self.check_section('containers')
+        if container in self.container_names:
+            return self.container_names[container]
+        matches = [entry for entry in self.containers if entry['ID'].startswith(container)]
+        return matches[0] if len(matches) == 1 else None
+
+    def is_running(self, container):
+        entry = self.get_container(container)
+        if entry is None:
+            return False
+        # State is not available from older docker versions, whose Status starts with Up for running containers
+        if 'State' in entry:
+            return entry['State'] == 'running'
+        return entry.get('Status', '').startswith('Up')
+
+    def get_images(self, reference):
+        """
+        :return: The IDs of the images matching the reference, e.g. maany/*, like docker image ls -f reference does
+        """
+        self.ensure_collected()
+        self.check_section('images')
+        ids = []
+        for image in self.images:
+            names = [image.get('Repository', ''), "{repo}:{tag}".format(repo=image.get('Repository', ''),
+                                                                       tag=image.get('Tag', ''))]
+            if any(fnmatch.fnmatchcase(name, reference) for name in names) and image['ID'] not in ids:
+                ids.append(image['ID'])
+        return ids
+
+    def get_network(self, name):
+        """ :return: The docker network ls entry of the network with the given name, or None if there is none """
+        self.ensure_collected()
+        self.check_section('networks')
+        return self.networks.get(name)
+
+    def check_section(self, section):
+        if section in self.errors:
+            raise CommandExecutionError("Could not list the docker {section}: {error}".format(
+                section=section, error=self.errors[section]))
+
+    def get_query(self):
+        # Every listing is followed by the separator and its exit code
+        listings = " ".join(listing + " --format %s; echo %s $?;" for listing in self.LISTINGS)
+        args = []
+        for _ in self.LISTINGS:
+            args.extend(["{{json .}}", self.SEPARATOR])
+        return listings, args
+
+    def parse(self, cmd):
+        sections = []
+        entries = []
+        for line in cmd.stdout.splitlines():
+            separator, _, rc = line.partition(' ')
+            if separator == self.SEPARATOR and rc.strip().isdigit():
+                sections.append((int(rc), entries))
+                entries = []
+            elif line.startswith('{'):
+                # Lines that are not JSON, e.g. warnings of the docker client, are skipped
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    logger.debug("Skipping unexpected docker output: {line}".format(line=line))
+        if len(sections) != len(self.SECTIONS):
+            raise CommandExecutionError("Could not list the docker containers, images and networks: {stderr}".format(
+                stderr=cmd.stderr))
+        results = {}
+        self.errors = {}
+        for section, (rc, entries) in zip(self.SECTIONS, sections):
+            if rc != 0:
+                self.errors[section] = "exited with code {rc}. stderr: {stderr}".format(rc=rc,
+                                                                                       stderr=cmd.stderr.strip())
+            results[section] = entries
+        self.containers = results['containers']
+        self.container_names = {}
+        for container in self.containers:
+            self.container_names[container['ID']] = container
+            for name in container.get('Names', '').split(','):
+                self.container_names[name] = container
+        self.images = results['images']
+        self.networks = dict((network['Name'], network) for network in results['networks'])
+        logger.debug("Found {containers} containers, {images} images and {networks} networks".format(
+            containers=len(self.containers), images=len(self.images), networks=len(self.networks)))
@@ -1,4 +1,6 @@
+import six
 from infra_validation_engine.core import InfraTest, InfraTestType
+from infra_validation_engine.core.snapshots import PathSnapshot, PackageSnapshot, SystemdSnapshot
 from infra_validation_engine.core.exceptions import DirectoryNotFoundError, PackageNotFoundError, CommandExecutionError, \
     ServiceNotRunningError, ServiceNotFoundError, FileNotFoundError, PreConditionNotSatisfiedError, NetworkError
 
@@ -7,6 +9,7 @@ class FileIsPresentTest(InfraTest):
     """
     A wrapper test for checking if a file is present on a host
     """
+    cache_ttl = 6 * 60 * 60
 
     def __init__(self, name, filepath, host, fqdn):
         InfraTest.__init__(self,
@@ -15,9 +18,11 @@ class FileIsPresentTest(InfraTest):
                            host,
                            fqdn)
         self.filepath = filepath
+        if host is not None:
+            PathSnapshot.for_host(host).add(filepath)
 
     def run(self):
-        return self.host.file(self.filepath).exists
+        return PathSnapshot.for_host(self.host).exists(self.filepath)
 
     def fail(self):
         err_msg = "File {file} was not found on {fqdn}".format(file=self.filepath, fqdn=self.fqdn)
@@ -28,6 +33,7 @@ class DirectoryIsPresentTest(InfraTest):
     """
     A wrapper test for checking if a directory is present on a host
     """
+    cache_ttl = 6 * 60 * 60
 
     def __init__(self, name, directory, host, fqdn):
         InfraTest.__init__(self,
@@ -36,9 +42,11 @@ class DirectoryIsPresentTest(InfraTest):
                            host,
                            fqdn)
         self.dir = directory
+        if host is not None:
+            PathSnapshot.for_host(host).add(directory)
 
     def run(self):
-        return self.host.file(self.dir).is_directory
+        return PathSnapshot.for_host(self.host).is_directory(self.dir)
 
     def fail(self):
         err_msg = "Directory {dir} was not found on {fqdn}".format(dir=self.dir, fqdn=self.fqdn)
@@ -49,6 +57,7 @@ class PackageIsInstalledTest(InfraTest):
     """
     A wrapper test to check if a package is installed on a host
     """
+    cache_ttl = 24 * 60 * 60
 
     def __init__(self, name, package, host, fqdn):
         InfraTest.__init__(self,
@@ -59,22 +68,17 @@ class PackageIsInstalledTest(InfraTest):
         self.pkg = package
 
     def run(self):
-        pkg_found = self.host.package(self.pkg).is_installed
-        if not pkg_found:
+        pkg = PackageSnapshot.for_host(self.host).get(self.pkg)
+        if pkg is None:
             return False
-        try:
-            ver = self.host.package(self.pkg).version
-            rel = self.host.package(self.pkg).version
-            self.message = "Found {pkg} on {fqdn} with version: {ver} and release: {rel}".format(pkg=self.pkg,
-                                                                                                 fqdn=self.fqdn,
-                                                                                                 ver=ver,
-                                                                                                 rel=rel)
-        except Exception as error:
-            self.warn = True
-            self.message = "Could not find version and release information for {pkg} on {fqdn} due to the following " \
-                           "error {error}".format(pkg=self.pkg, fqdn=self.fqdn, error=error.message)
-        finally:
-            return True
+        ver, rel = pkg
+        self.report['version'] = ver
+        self.report['release'] = rel
+        self.message = "Found {pkg} on {fqdn} with version: {ver} and release: {rel}".format(pkg=self.pkg,
+                                                                                             fqdn=self.fqdn,
+                                                                                             ver=ver,
+                                                                                             rel=rel)
+        return True
 
     def fail(self):
         err_msg = "Package {pkg} is not installed on {fqdn}".format(pkg=self.pkg, fqdn=self.fqdn)
@@ -83,10 +87,12 @@ class PackageIsInstalledTest(InfraTest):
 
 class SystemdServiceIsActiveTest(InfraTest):
     """
-    A wrapper test to check if systemctl is-active $service returns active and enabled.
+    A wrapper test to check if a systemd service is active and enabled.
     If service is not active, it is considered a failure
     If service is not enabled, it is raised as a warning
     """
+    # UnitFileStates for which systemctl is-enabled succeeds
+    ENABLED_STATES = ('enabled', 'enabled-runtime', 'static', 'indirect', 'generated', 'alias', 'transient')
 
     def __init__(self, name, service, host, fqdn, check_enabled=False):
         if check_enabled:
@@ -101,33 +107,26 @@ class SystemdServiceIsActiveTest(InfraTest):
                            fqdn)
         self.check_enabled = check_enabled
         self.svc = service
+        if host is not None:
+            SystemdSnapshot.for_host(host).add(service)
 
     def run(self):
-        active_cmd_str = "systemctl is-active {svc}".format(svc=self.svc)
-        active_cmd = self.host.run(active_cmd_str)
-        active_out = active_cmd.stdout.strip()
-        is_active = False
-
-        if active_out == "active":
-            is_active = True
-        elif active_out == "unknown":
+        state = SystemdSnapshot.for_host(self.host).get(self.svc)
+        active_state = state.get('ActiveState')
+
+        if state.get('LoadState') == "not-found":
             self.rc = 1
             self.err = "Service {svc} was not found on {fqdn}. ".format(svc=self.svc, fqdn=self.fqdn)
             return False
-        elif active_out == "inactive":
+        elif active_state != "active":
             self.rc = 2
-            self.err = "Service {svc} is not active on {fqdn}. ".format(svc=self.svc, fqdn=self.fqdn)
+            self.err = "Service {svc} is not active on {fqdn}, its state is {state}. ".format(svc=self.svc,
+                                                                                             fqdn=self.fqdn,
+                                                                                             state=active_state)
             return False
-        if self.check_enabled:
-            enabled_cmd_str = "systemctl is-enabled {svc}".format(svc=self.svc)
-
-            enabled_cmd = self.host.run(enabled_cmd_str)
-            if not enabled_cmd.succeeded:
-                self.warn = True
-                self.message = "Service {svc} is not enabled on {fqdn}. Is it running? {is_active}".format(
-                    svc=self.svc,
-                    fqdn=self.fqdn,
-                    is_active=is_active)
+        if self.check_enabled and state.get('UnitFileState') not in self.ENABLED_STATES:
+            self.warn = True
+            self.message = "Service {svc} is active but not enabled on {fqdn}.".format(svc=self.svc, fqdn=self.fqdn)
         return True
 
     def fail(self):
@@ -162,9 +161,9 @@ class CommandExecutionTest(InfraTest):
         raise CommandExecutionError(err_msg)
 
 
+@six.add_metaclass(InfraTestType)
 class PingTest(InfraTest):
     """ Checks if a destination host can be pinged from a source host"""
-    __metaclass__ = InfraTestType
 
     def __init__(self, name, destination, description, host, fqdn):
         InfraTest.__init__(self, name, description, host, fqdn)
@@ -185,9 +184,59 @@ class PingTest(InfraTest):
         raise NetworkError(err_msg)
 
 
+@six.add_metaclass(InfraTestType)
+class MeshConnectivityTest(InfraTest):
+    """
+    Checks if a source host can resolve and reach each of the destinations. All destinations are checked concurrently
+    with a single command on the source host, see connectivity for the outcome.
+    """
+    OK = 'ok'
+    UNRESOLVED = 'unresolved'
+    UNREACHABLE = 'unreachable'
+    # seconds the source host waits for the reply of each destination
+    reply_timeout = 1
+    reachability_command = "ping -c 1 -W {timeout}"
+
+    def __init__(self, name, destinations, description, host, fqdn):
+        InfraTest.__init__(self, name, description, host, fqdn)
+        self.destinations = destinations
+        self.connectivity = {}
+
+    def run(self):
+        reachability_command = self.reachability_command.format(timeout=self.reply_timeout)
+        program = reachability_command.split()[0]
+        check = ('if ! getent hosts "$d" > /dev/null 2>&1; then echo "$d {unresolved}"; '
+                 'elif {reach} "$d" > /dev/null 2>&1; then echo "$d {ok}"; '
+                 'else echo "$d {unreachable}"; fi').format(reach=reachability_command, ok=self.OK,
+                                                           unresolved=self.UNRESOLVED, unreachable=self.UNREACHABLE)
+        cmd_str = "command -v {program} > /dev/null || exit 127; for d in {destinations}; do ({check}) & done; " \
+                  "wait".format(program=program, destinations=' '.join(['%s'] * len(self.destinations)), check=check)
+        cmd = self.host.run(cmd_str, *self.destinations)
+        if cmd.rc == 127:
+            raise CommandExecutionError("Command '{program}' was not found on {fqdn}".format(program=program,
+                                                                                             fqdn=self.fqdn))
+        self.connectivity = dict(line.rsplit(' ', 1) for line in cmd.stdout.splitlines() if ' ' in line)
+        for destination in self.destinations:
+            self.connectivity.setdefault(destination, self.UNREACHABLE)
+        failures = dict((destination, state) for destination, state in self.connectivity.items() if state != self.OK)
+        self.report['destinations'] = len(self.destinations)
+        self.report['failures'] = failures
+        return not failures
+
+    def fail(self):
+        unresolved = sorted(dest for dest, state in self.connectivity.items() if state == self.UNRESOLVED)
+        unreachable = sorted(dest for dest, state in self.connectivity.items() if state == self.UNREACHABLE)
+        err_msg = "From {fqdn}, the following hosts cannot be resolved: {unresolved}; cannot be reached: " \
+                  "{unreachable}".format(fqdn=self.fqdn, unresolved=', '.join(unresolved) or 'none',
+                                         unreachable=', '.join(unreachable) or 'none')
+        raise NetworkError(err_msg)
+
+
+@six.add_metaclass(InfraTestType)
 class SSHTest(InfraTest):
     """ Check if a node can be connected via passwordless ssh from the host """
-    __metaclass__ = InfraTestType
+    # seconds the ssh client on the host may take to log in to the destination
+    connect_timeout = 1
 
     def __init__(self, name, destination, description, host, fqdn, key):
         InfraTest.__init__(self, name, description, host, fqdn)
@@ -195,7 +244,8 @@ class SSHTest(InfraTest):
         self.key = key
 
     def run(self):
-        cmd_str = "timeout 1 ssh -i {key} root@{dest}".format(key=self.key, dest=self.destination)
+        cmd_str = "timeout {timeout} ssh -i {key} root@{dest}".format(timeout=self.connect_timeout, key=self.key,
+                                                                      dest=self.destination)
         cmd = self.host.run(cmd_str)
         self.rc = cmd.rc
         self.out = cmd.stdout
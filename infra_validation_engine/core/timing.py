@@ -0,0 +1,201 @@
+# coding: utf-8
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Timing of the pipeline elements and of the remote commands they execute, see PipelineElement.timing
+"""
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from infra_validation_engine.core.concurrency import monotonic
+
+# The pipeline element executing in the current thread, remote commands are attributed to it
+_context = threading.local()
+
+
+class ElementTiming:
+    """
+    Monotonic timestamps of a pipeline element: when it was handed to the workers, when a worker started and finished
+    it, and the number and total latency of the remote commands executed on its behalf.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.submitted = None
+        self.started = None
+        self.ended = None
+        self.remote_commands = 0
+        self.remote_latency = 0.0
+
+    def submit(self):
+        self.submitted = monotonic()
+
+    def start(self):
+        self.started = monotonic()
+
+    def stop(self):
+        """ :return: False if the element was never started or was stopped before """
+        if self.started is None or self.ended is not None:
+            return False
+        self.ended = monotonic()
+        return True
+
+    def record_command(self, latency):
+        with self.lock:
+            self.remote_commands += 1
+            self.remote_latency += latency
+
+    @property
+    def duration(self):
+        return self.ended - self.started if self.ended is not None else None
+
+    @property
+    def queue_wait(self):
+        """ Seconds between submission and start. Elements of serial pipelines are started right away """
+        if self.submitted is None or self.started is None:
+            return 0.0
+        return max(0.0, self.started - self.submitted)
+
+    def to_dict(self):
+        return OrderedDict([('start', round_seconds(self.started)), ('end', round_seconds(self.ended)),
+                            ('duration', round_seconds(self.duration)), ('queue_wait', round_seconds(self.queue_wait)),
+                            ('remote_commands', self.remote_commands),
+                            ('remote_latency', round_seconds(self.remote_latency))])
+
+
+class TimingRollup:
+    """ Totals of the timings of the tests in the pipeline of an element, overall, by host and by test class """
+    FIELDS = ('tests', 'duration', 'queue_wait', 'remote_commands', 'remote_latency')
+
+    def __init__(self):
+        self.totals = self.new_totals()
+        self.by_host = OrderedDict()
+        self.by_test_class = OrderedDict()
+
+    @classmethod
+    def new_totals(cls):
+        return OrderedDict((field, 0) for field in cls.FIELDS)
+
+    def add_test(self, infra_test):
+        timing = infra_test.timing
+        values = (1, timing.duration or 0.0, timing.queue_wait, timing.remote_commands, timing.remote_latency)
+        for totals in (self.totals, self.by_host.setdefault(infra_test.fqdn, self.new_totals()),
+                       self.by_test_class.setdefault(type(infra_test).__name__, self.new_totals())):
+            for field, value in zip(self.FIELDS, values):
+                totals[field] += value
+
+    def merge(self, other):
+        self.add_totals(self.totals, other.totals)
+        for totals, other_totals in ((self.by_host, other.by_host), (self.by_test_class, other.by_test_class)):
+            for key, values in other_totals.items():
+                self.add_totals(totals.setdefault(key, self.new_totals()), values)
+
+    @staticmethod
+    def add_totals(totals, values):
+        for field, value in values.items():
+            totals[field] += value
+
+    def to_dict(self):
+        def rounded(totals):
+            return OrderedDict((field, round_seconds(value) if isinstance(value, float) else value)
+                               for field, value in totals.items())
+
+        def by_duration(totals):
+            # The hosts and test classes that take longest come first
+            return OrderedDict((key, rounded(values)) for key, values in
+                               sorted(totals.items(), key=lambda item: item[1]['duration'], reverse=True))
+
+        report = rounded(self.totals)
+        report['by_host'] = by_duration(self.by_host)
+        report['by_test_class'] = by_duration(self.by_test_class)
+        return report
+
+
+def critical_path(pipeline_element):
+    """
+    Return the tests on the critical path of pipeline_element, i.e. the chain of tests that determined when it
+    finished. The pipeline of a serial element is on the path in its entirety. Of a parallel pipeline, only the element
+    that finished last is, preceded by the prerequisites it waited for.
+    """
+    if pipeline_element.type == "InfraTest":
+        return [pipeline_element] if pipeline_element.timing.duration is not None else []
+    finished = [element for element in pipeline_element.pipeline_elements if element.timing.duration is not None]
+    if len(finished) == 0:
+        return []
+    if not pipeline_element.parallel:
+        path = []
+        for element in finished:
+            path.extend(critical_path(element))
+        return path
+    last = max(finished, key=lambda element: element.timing.ended)
+    return prerequisite_path(last, finished) + critical_path(last)
+
+
+def prerequisite_path(pipeline_element, siblings):
+    prerequisites = [dependency for dependency in pipeline_element.dependencies if dependency in siblings]
+    if len(prerequisites) == 0:
+        return []
+    latest = max(prerequisites, key=lambda element: element.timing.ended)
+    return prerequisite_path(latest, siblings) + critical_path(latest)
+
+
+@contextmanager
+def timing_context(pipeline_element):
+    """ Attribute the remote commands executed by the current thread to pipeline_element """
+    previous = getattr(_context, 'pipeline_element', None)
+    _context.pipeline_element = pipeline_element
+    try:
+        yield
+    finally:
+        _context.pipeline_element = previous
+
+
+def current_pipeline_element():
+    """ Return the pipeline element executing in the current thread or None """
+    return getattr(_context, 'pipeline_element', None)
+
+
+@contextmanager
+def shared_command_context():
+    """
+    The remote commands executed by the current thread collect facts for all the tests of a host, e.g. the query of a
+    snapshot. They are attributed to the current pipeline element, but bound by the deadline of its stage rather than
+    by its own, see deadline_element()
+    """
+    previous = getattr(_context, 'shared', False)
+    _context.shared = True
+    try:
+        yield
+    finally:
+        _context.shared = previous
+
+
+def deadline_element():
+    """ Return the pipeline element whose deadline bounds the remote commands of the current thread or None """
+    pipeline_element = current_pipeline_element()
+    if pipeline_element is not None and getattr(_context, 'shared', False):
+        while pipeline_element.parent is not None:
+            pipeline_element = pipeline_element.parent
+    return pipeline_element
+
+
+def record_remote_command(latency, pipeline_element=None):
+    """ Record a remote command of pipeline_element, by default of the element executing in the current thread """
+    if pipeline_element is None:
+        pipeline_element = current_pipeline_element()
+    if pipeline_element is not None:
+        pipeline_element.timing.record_command(latency)
+
+
+def round_seconds(value):
+    return round(value, 6) if value is not None else None
@@ -0,0 +1,222 @@
+# coding: utf-8
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Transport level handling of the connections to the hosts under test
+"""
+import logging
+from collections import OrderedDict
+from threading import Lock
+
+from testinfra.host import Host
+
+from infra_validation_engine.core import monotonic
+from infra_validation_engine.core.concurrency import fan_out
+from infra_validation_engine.core.exceptions import HostUnreachableError, DeadlineExceededError
+from infra_validation_engine.core.multiplexing import get_multiplexer
+from infra_validation_engine.core.timing import deadline_element, record_remote_command, round_seconds
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Tracks the connection failures of a host. After failure_threshold consecutive connection failures the circuit opens:
+    the host is considered unreachable and calls fail right away with the cause of the last failure. Once reset_timeout
+    seconds passed, the circuit is half open and a single call is let through to probe the host. The circuit closes
+    again if the probe succeeds and opens for another reset_timeout seconds if it fails.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half open'
+
+    def __init__(self, name, failure_threshold=3, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = Lock()
+        self.state = CircuitBreaker.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.cause = None
+        self.probing = False
+
+    def before_call(self):
+        """ Raise HostUnreachableError unless a call may be attempted """
+        with self.lock:
+            if self.state == CircuitBreaker.CLOSED:
+                return
+            if self.state == CircuitBreaker.OPEN and monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = CircuitBreaker.HALF_OPEN
+            if self.state == CircuitBreaker.HALF_OPEN and not self.probing:
+                logger.info("Probing if {host} is reachable again".format(host=self.name))
+                self.probing = True
+                return
+            raise HostUnreachableError("{host} is unreachable: {cause}".format(host=self.name, cause=self.cause))
+
+    def trip(self, cause):
+        """ Open the circuit right away, e.g. if the host could not be connected to during the warm up """
+        with self.lock:
+            self.failures = max(self.failures, self.failure_threshold)
+            self.cause = cause
+            self.state = CircuitBreaker.OPEN
+            self.opened_at = monotonic()
+            self.probing = False
+
+    def record_success(self):
+        with self.lock:
+            if self.state != CircuitBreaker.CLOSED:
+                logger.info("{host} is reachable again".format(host=self.name))
+            self.state = CircuitBreaker.CLOSED
+            self.failures = 0
+            self.probing = False
+
+    def record_failure(self, cause):
+        with self.lock:
+            self.failures += 1
+            self.cause = cause
+            if self.state == CircuitBreaker.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state == CircuitBreaker.CLOSED:
+                    logger.error("{host} is unreachable after {failures} connection failures: {cause}".format(
+                        host=self.name, failures=self.failures, cause=cause))
+                self.state = CircuitBreaker.OPEN
+                self.opened_at = monotonic()
+                self.probing = False
+
+    def release_probe(self):
+        """ End a probe that neither succeeded nor failed to connect, e.g. since the call raised, so that the next call
+        probes the host again """
+        with self.lock:
+            self.probing = False
+
+    @property
+    def is_open(self):
+        return self.state != CircuitBreaker.CLOSED
+
+
+class ManagedHost(Host):
+    """
+    testinfra Host whose commands go through a CircuitBreaker and are counted by the ConnectionMultiplexer. Their
+    latency is recorded in the timing of the pipeline element executing them. testinfra modules, e.g. host.file() or
+    host.package(), execute their commands through Host.run, so they are covered as well.
+
+    Commands executed on behalf of a pipeline element with a deadline are run through timeout(1) on the host, so that a
+    command that hangs is killed once the deadline passes instead of holding the worker thread. Elements only have a
+    deadline if a timeout was set, see PipelineElement. Commands shared by the tests of a host are bound by the deadline
+    of the stage, see timing.shared_command_context().
+
+    failure_threshold and reset_timeout configure the circuit breakers of all hosts.
+    """
+    # testinfra caches the hosts per class. The cache of Host is shared by subclasses that do not define their own.
+    _host_cache = {}
+    _hosts_cache = {}
+    failure_threshold = 3
+    reset_timeout = 30
+    # Exit codes of timeout(1) if it terminated or, after DEADLINE_GRACE seconds, killed the command
+    TIMEOUT_EXIT_CODES = (124, 137)
+    DEADLINE_GRACE = 1
+
+    def __init__(self, backend):
+        Host.__init__(self, backend)
+        self.circuit_breaker = CircuitBreaker(backend.get_pytest_id(), self.failure_threshold, self.reset_timeout)
+
+    def run(self, command, *args, **kwargs):
+        pipeline_element = deadline_element()
+        remaining_time = pipeline_element.remaining_time() if pipeline_element is not None else None
+        if remaining_time is not None:
+            if remaining_time <= 0:
+                raise DeadlineExceededError("{element} did not finish within its deadline".format(
+                    element=pipeline_element.describe()))
+            command, args = "timeout -k {grace} {seconds:.3f} sh -c %s".format(
+                grace=self.DEADLINE_GRACE, seconds=remaining_time), (self.backend.quote(command, *args),)
+        self.circuit_breaker.before_call()
+        multiplexer = get_multiplexer()
+        if multiplexer is not None and self.backend.NAME in ("ssh", "safe-ssh"):
+            multiplexer.record_command(self.backend.host.name)
+        start = monotonic()
+        try:
+            result = Host.run(self, command, *args, **kwargs)
+        except RuntimeError as ex:
+            # testinfra's ssh backends raise RuntimeError if ssh exits with 255, i.e. could not connect
+            self.circuit_breaker.record_failure(connection_error(ex))
+            raise
+        finally:
+            record_remote_command(monotonic() - start)
+            # A probe of a half open circuit that raised anything else must not keep the host locked out
+            self.circuit_breaker.release_probe()
+        self.circuit_breaker.record_success()
+        if remaining_time is not None and result.rc in self.TIMEOUT_EXIT_CODES and \
+                pipeline_element.remaining_time() <= 0:
+            raise DeadlineExceededError("{element} did not finish within its deadline".format(
+                element=pipeline_element.describe()))
+        return result
+
+
+class ConnectionStatus:
+    """ Outcome of connecting to a host during the warm up """
+
+    def __init__(self, host):
+        self.host = host
+        self.connected = False
+        self.latency = None
+        self.error = None
+
+    def to_dict(self):
+        return OrderedDict([('host', self.host.circuit_breaker.name), ('connected', self.connected),
+                            ('latency', round_seconds(self.latency)), ('error', self.error)])
+
+
+def warm_up(hosts, max_connections=10):
+    """
+    Connect to all hosts concurrently, at most max_connections at a time, before the stages are executed. The connect
+    latency is recorded and the circuit breaker of every host that cannot be connected to is opened, so that the tests
+    of the host fail right away.
+    :param hosts: ManagedHosts
+    :return: An OrderedDict of ConnectionStatus by host, in the order of hosts
+    """
+    statuses = OrderedDict((host, ConnectionStatus(host)) for host in hosts)
+
+    def connect(status):
+        start = monotonic()
+        try:
+            status.host.run("true")
+            status.connected = True
+        except HostUnreachableError as ex:
+            status.error = str(ex)
+        except RuntimeError as ex:
+            status.error = connection_error(ex)
+            status.host.circuit_breaker.trip(status.error)
+        status.latency = monotonic() - start
+
+    fan_out(connect, statuses.values(), max_connections, "WarmUp")
+    for status in statuses.values():
+        if status.connected:
+            logger.info("Connected to {host} in {latency:.3f}s".format(host=status.host.circuit_breaker.name,
+                                                                     latency=status.latency))
+        else:
+            logger.error("Could not connect to {host}, its tests will fail: {error}".format(
+                host=status.host.circuit_breaker.name, error=status.error))
+    return statuses
+
+
+def connection_error(error):
+    """ Short description of a connection failure raised by a testinfra backend """
+    result = error.args[0] if error.args else None
+    stderr = getattr(result, 'stderr', None)
+    if stderr:
+        return stderr.strip()
+    return str(error)
+
+
+def get_host(hostspec, **kwargs):
+    """ Counterpart of testinfra.get_host that returns a ManagedHost """
+    return ManagedHost.get_host(hostspec, **kwargs)
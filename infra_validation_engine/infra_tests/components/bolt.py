@@ -11,6 +11,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import re
+import six
 from infra_validation_engine.core import InfraTestType, InfraTest
 from infra_validation_engine.core.standard_tests import PackageIsInstalledTest, DirectoryIsPresentTest, \
     FileIsPresentTest
@@ -25,11 +26,11 @@ class BoltConstants(Constants):
     BOLT_CONFIG_FILE = "{BOLT_CONFIG_DIRECTORY}/bolt.yaml".format(BOLT_CONFIG_DIRECTORY=BOLT_CONFIG_DIRECTORY)
 
 
+@six.add_metaclass(InfraTestType)
 class BoltInstallationTest(PackageIsInstalledTest):
     """
     Check if Bolt is installed
     """
-    __metaclass__ = InfraTestType
 
     def __init__(self, host, fqdn):
         PackageIsInstalledTest.__init__(self,
@@ -39,11 +40,11 @@ class BoltInstallationTest(PackageIsInstalledTest):
                                         fqdn)
 
 
+@six.add_metaclass(InfraTestType)
 class BoltConfigurationDirectoryTest(DirectoryIsPresentTest):
     """
     Checks if Bolt config dir is present
     """
-    __metaclass__ = InfraTestType
 
     def __init__(self, host, fqdn):
         DirectoryIsPresentTest.__init__(self,
@@ -53,11 +54,11 @@ class BoltConfigurationDirectoryTest(DirectoryIsPresentTest):
                                         fqdn)
 
 
+@six.add_metaclass(InfraTestType)
 class BoltConfigurationFileTest(FileIsPresentTest):
     """
     Check if Bolt Config File is present
     """
-    __metaclass__ = InfraTestType
 
     def __init__(self, host, fqdn):
         FileIsPresentTest.__init__(self,
@@ -67,11 +68,11 @@ class BoltConfigurationFileTest(FileIsPresentTest):
                                    fqdn)
 
 
+@six.add_metaclass(InfraTestType)
 class BoltNetworkConfigurationTest(InfraTest):
     """
     Check if Bolt can connect to all LCs. Bolt is parallel by design, so leverage that
     """
-    __metaclass__ = InfraTestType
 
     def __init__(self, host, fqdn, lc_hosts_rep):
         self.lc_hosts_rep = lc_hosts_rep
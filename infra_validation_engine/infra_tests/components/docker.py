@@ -11,10 +11,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import six
 from infra_validation_engine.core import InfraTest, InfraTestType
+from infra_validation_engine.core.snapshots import DockerSnapshot
 from infra_validation_engine.utils.constants import Constants
-from infra_validation_engine.core.exceptions import PackageNotFoundError, ServiceNotRunningError, \
-    CommandExecutionError
+from infra_validation_engine.core.exceptions import PackageNotFoundError, ServiceNotRunningError
 
 
 class DockerConstants(Constants):
@@ -36,9 +37,9 @@ class DockerContainerNotRunningError(Exception):
     pass
 
 
+@six.add_metaclass(InfraTestType)
 class DockerInstallationTest(InfraTest):
     """Test if Docker is installed on the nodes"""
-    __metaclass__ = InfraTestType
 
     def __init__(self, host, fqdn):
         InfraTest.__init__(self,
@@ -59,11 +60,12 @@ class DockerInstallationTest(InfraTest):
         raise PackageNotFoundError(err_msg)
 
 
+@six.add_metaclass(InfraTestType)
 class DockerServiceTest(InfraTest):
     """
     Test if docker is running on a node
     """
-    __metaclass__ = InfraTestType
+    expected_facts = ("docker ps -a",)
 
     def __init__(self, host, fqdn):
         InfraTest.__init__(self,
@@ -73,7 +75,7 @@ class DockerServiceTest(InfraTest):
                            fqdn)
 
     def run(self):
-        cmd = self.host.run("docker ps -a")
+        cmd = self.fact("docker ps -a")
         return cmd.rc == 0
 
     def fail(self):
@@ -94,24 +96,17 @@ class DockerImageTest(InfraTest):
                            host,
                            fqdn)
         self.image = image
+        if host is not None:
+            DockerSnapshot.for_host(host)
 
     def run(self):
-        cmd_str = 'docker image ls -q -f "reference={image}"'.format(image=self.image)
-        cmd = self.host.run(cmd_str)
-        print cmd.rc, cmd.stdout == ""
-        if cmd.stdout == "":
+        self.out = DockerSnapshot.for_host(self.host).get_images(self.image)
+        if not self.out:
             return False
 
-        self.out = cmd.stdout.split("\n")
-        print self.out
-
-        # stdout containers one extra line
-        is_single_image = len(self.out) == 2
-
-        if is_single_image:
-            self.out = self.out
+        if len(self.out) == 1:
             self.message = "The Image ID for {image} on {fqdn} is {id}".format(image=self.image, fqdn=self.fqdn,
-                                                                               id=self.out)
+                                                                               id=self.out[0])
         else:
             self.message = "Multiple docker images found for {image}".format(image=self.image)
             self.warn = True
@@ -133,32 +128,23 @@ class DockerContainerStatusTest(InfraTest):
                            host,
                            fqdn)
         self.container = container
-        self.cmd_str = ""
+        if host is not None:
+            DockerSnapshot.for_host(host)
 
     def run(self):
-        cmd_str = "docker inspect -f '{{.State.Running}}' " + "{container}".format(container=self.container)
-        cmd = self.host.run(cmd_str)
-        self.rc = cmd.rc
-        self.err = cmd.stderr
-        self.out = cmd.stdout
-        test_status = False
-        if self.out.strip() == "true":
-            test_status = True
-        return test_status
+        snapshot = DockerSnapshot.for_host(self.host)
+        self.found = snapshot.get_container(self.container) is not None
+        return snapshot.is_running(self.container)
 
     def fail(self):
-        if self.rc == 1:
+        if not self.found:
             err_msg = "Container {container} could not be found on {fqdn}".format(container=self.container,
                                                                                   fqdn=self.fqdn)
             raise DockerContainerNotFoundError(err_msg)
-        elif self.rc == 127:
-            err_msg = "Command {cmd_str} could not be executed on {fqdn}".format(cmd_str=self.cmd_str, fqdn=self.fqdn)
-            raise CommandExecutionError(err_msg)
-        elif self.rc == 0:
-            err_msg = "Docker container {container} is present but is not running on {fqdn}".format(
-                container=self.container,
-                fqdn=self.fqdn)
-            raise DockerContainerNotRunningError(err_msg)
+        err_msg = "Docker container {container} is present but is not running on {fqdn}".format(
+            container=self.container,
+            fqdn=self.fqdn)
+        raise DockerContainerNotRunningError(err_msg)
 
 # class DockerContainerSanityTest(InfraTest):
 #     """
@@ -11,14 +11,20 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import logging
 import re
 
+import six
+
 from infra_validation_engine.core import InfraTest, InfraTestType
 from infra_validation_engine.utils.constants import Constants
 from infra_validation_engine.core.standard_tests import (PackageIsInstalledTest, SystemdServiceIsActiveTest,
                                                          DirectoryIsPresentTest, FileIsPresentTest,
                                                          CommandExecutionTest)
-from infra_validation_engine.core.exceptions import FileContentsMismatchError
+from infra_validation_engine.core.exceptions import FileContentsMismatchError, CommandExecutionError
+from infra_validation_engine.core.snapshots import HostSnapshot
+
+logger = logging.getLogger(__name__)
 
 
 class PuppetConstants(Constants):
@@ -40,41 +46,91 @@ class PuppetCertificateError(Exception):
     pass
 
 
+class PuppetCASnapshot(HostSnapshot):
+    """
+    Inventory of the certificates of the Puppet CA on the config master, listed with a single call of
+    puppetserver ca list, or puppet cert list where the puppetserver CA CLI is not available
+    """
+    SIGNED = 'signed'
+    REQUESTED = 'requested'
+    REVOKED = 'revoked'
+    # puppet cert list marks signed certificates with + and revoked ones with -
+    CERT_LIST_PATTERN = re.compile(r'^([+-])?\s*"([^"]+)"\s+\(\w+\)\s+(\S+)')
+    # puppetserver ca list groups the certificates under a header per state
+    CA_LIST_PATTERN = re.compile(r'^\s+(\S+)\s+\(\w+\)\s+(\S+)')
+    CA_LIST_HEADERS = {"Requested Certificates:": REQUESTED, "Signed Certificates:": SIGNED,
+                       "Revoked Certificates:": REVOKED}
+
+    def __init__(self, host):
+        HostSnapshot.__init__(self, host)
+        self.certificates = {}
+
+    def get(self, node):
+        """ :return: A (state, fingerprint) tuple for the certificate of the node or None if the CA does not know it """
+        self.ensure_collected()
+        return self.certificates.get(node)
+
+    def get_query(self):
+        return "puppetserver ca list --all 2> /dev/null || puppet cert list --all", []
+
+    def parse(self, cmd):
+        if cmd.rc != 0:
+            raise CommandExecutionError("Could not list the certificates of the Puppet CA: {stderr}".format(
+                stderr=cmd.stderr))
+        certificates = {}
+        state = None
+        for line in cmd.stdout.splitlines():
+            if line.strip() in self.CA_LIST_HEADERS:
+                state = self.CA_LIST_HEADERS[line.strip()]
+                continue
+            match = self.CERT_LIST_PATTERN.match(line)
+            if match is not None:
+                marker, node, fingerprint = match.groups()
+                certificates[node] = ({'+': self.SIGNED, '-': self.REVOKED}.get(marker, self.REQUESTED), fingerprint)
+                continue
+            match = self.CA_LIST_PATTERN.match(line)
+            if match is not None and state is not None:
+                node, fingerprint = match.groups()
+                certificates[node] = (state, fingerprint)
+        logger.debug("Found {count} certificates in the Puppet CA".format(count=len(certificates)))
+        self.certificates = certificates
+
+
+@six.add_metaclass(InfraTestType)
 class PuppetAgentInstallationTest(PackageIsInstalledTest):
     """Puppet agent package is installed Test"""
-    __metaclass__ = InfraTestType
 
     def __init__(self, host, fqdn):
         PackageIsInstalledTest.__init__(self, "Puppet Agent Installation Test", PuppetConstants.PUPPET_AGENT_PKG_NAME, host, fqdn)
 
 
+@six.add_metaclass(InfraTestType)
 class PuppetServiceTest(SystemdServiceIsActiveTest):
     """Puppet agent package is active Test"""
-    __metaclass__ = InfraTestType
 
     def __init__(self, host, fqdn):
         SystemdServiceIsActiveTest.__init__(self, "Puppet Agent Service Test", PuppetConstants.PUPPET_AGENT_SVC_NAME, host, fqdn)
 
 
+@six.add_metaclass(InfraTestType)
 class PuppetServerInstallationTest(PackageIsInstalledTest):
     """Puppet server package is installed Test"""
-    __metaclass__ = InfraTestType
 
     def __init__(self, host, fqdn):
         PackageIsInstalledTest.__init__(self, "Puppet Server Installation Test", PuppetConstants.PUPPET_SERVER_PKG_NAME, host, fqdn)
 
 
+@six.add_metaclass(InfraTestType)
 class PuppetServerServiceTest(SystemdServiceIsActiveTest):
     """Puppet server package is active Test"""
-    __metaclass__ = InfraTestType
 
     def __init__(self, host, fqdn):
         SystemdServiceIsActiveTest.__init__(self, "Puppet Server Service Test", PuppetConstants.PUPPET_SERVER_SVC_NAME, host, fqdn)
 
 
+@six.add_metaclass(InfraTestType)
 class PuppetConfTest(InfraTest):
     """Puppet agent (puppet.conf) is updated Test"""
-    __metaclass__ = InfraTestType
 
     def __init__(self, cm_host, host, fqdn):
         InfraTest.__init__(self,
@@ -87,17 +143,18 @@ class PuppetConfTest(InfraTest):
         self.cm_host = cm_host
 
     def run(self):
-        return self.host.file(PuppetConstants.PUPPET_AGENT).contains(self.cm_host.check_output("hostname"))
+        return self.host.file(PuppetConstants.PUPPET_AGENT).contains(self.fact_output("hostname", host=self.cm_host))
 
     def fail(self):
         err_msg = "File {file} does not contain CM fqdn.".format(file=PuppetConstants.PUPPET_AGENT)
 
-        return FileContentsMismatchError(err_msg)
+        raise FileContentsMismatchError(err_msg)
 
 
+@six.add_metaclass(InfraTestType)
 class PuppetModuleTest(InfraTest):
     """Puppet module is installed Test"""
-    __metaclass__ = InfraTestType
+    expected_facts = ("puppet module list",)
 
     def __init__(self, host, fqdn):
         InfraTest.__init__(self,
@@ -106,8 +163,9 @@ class PuppetModuleTest(InfraTest):
                            host, fqdn)
 
     def run(self):
-        cmd = self.host.run("puppet module list | grep {module}".format(module=PuppetConstants.PUPPET_MODULE_NAME))
-        module_version = re.search(r'\((.*?)\)', cmd.stdout)
+        cmd = self.fact("puppet module list")
+        module_lines = [line for line in cmd.stdout.splitlines() if PuppetConstants.PUPPET_MODULE_NAME in line]
+        module_version = re.search(r'\((.*?)\)', module_lines[0]) if module_lines else None
         if module_version:
             self.message = "Puppet module version: {version}".format(version=module_version.group(1))
             return True
@@ -116,29 +174,29 @@ class PuppetModuleTest(InfraTest):
 
     def fail(self):
         err_msg = "Puppet module {module} not found on {fqdn}".format(module=PuppetConstants.PUPPET_MODULE_NAME, fqdn=self.fqdn)
-        return PuppetModuleNotInstalledError(err_msg)
+        raise PuppetModuleNotInstalledError(err_msg)
 
 
+@six.add_metaclass(InfraTestType)
 class SimplePuppetEnvTest(FileIsPresentTest):
     """Puppet SIMPLE dir is present Test"""
-    __metaclass__ = InfraTestType
 
     def __init__(self, host, fqdn):
         site_manifest = "{module_dir}/site.pp".format(module_dir=PuppetConstants.SIMPLE_PUPPET_ENV_DIR)
         FileIsPresentTest.__init__(self, "SIMPLE Puppet Env Test", site_manifest, host, fqdn)
 
 
+@six.add_metaclass(InfraTestType)
 class PuppetFileServerConfTest(FileIsPresentTest):
     """File Server config file is present Test"""
-    __metaclass__ = InfraTestType
 
     def __init__(self, host, fqdn):
         FileIsPresentTest.__init__(self, "Puppet File Server Config File Test", PuppetConstants.FILESERVER_CONFIG_FILE, host, fqdn)
 
 
+@six.add_metaclass(InfraTestType)
 class PuppetFirewallPortTest(CommandExecutionTest):
     """ Check if port 8140 is open """
-    __metaclass__ = InfraTestType
 
     def __init__(self, host, fqdn):
         CommandExecutionTest.__init__(self, "Puppet Server Firewall Test",
@@ -148,11 +206,11 @@ class PuppetFirewallPortTest(CommandExecutionTest):
                                       fqdn)
 
 
+@six.add_metaclass(InfraTestType)
 class PuppetCertTest(InfraTest):
     """
     Check if certificates have been signed and are present
     """
-    __metaclass__ = InfraTestType
 
     def __init__(self, node, host, fqdn):
         InfraTest.__init__(self,
@@ -162,24 +220,24 @@ class PuppetCertTest(InfraTest):
                            host,
                            fqdn)
         self.node = node
+        if host is not None:
+            PuppetCASnapshot.for_host(host)
 
     def run(self):
-        cmd_str = "puppet cert list {node}".format(node=self.node)
-        cmd = self.host.run(cmd_str)
-        self.rc = cmd.rc
-        self.out = cmd.stdout
-        self.err = cmd.stderr
-        if cmd.rc == 0:
-            cert_elements = self.out.split(' ')
-            cert = cert_elements[-1]
-            if cert_elements[0] == '+':
-                self.message = "{node} has a valid puppet cert: {cert} ".format(node=self.node, cert=cert)
-            else:
-                self.warn = True
-                self.message = "Puppet certificate of {node} has not been signed. Please sign the following " \
-                               "certificate: {cert}".format(node=self.node, cert=cert)
-        return cmd.rc == 0
+        self.certificate = PuppetCASnapshot.for_host(self.host).get(self.node)
+        if self.certificate is None:
+            return False
+        state, cert = self.certificate
+        if state == PuppetCASnapshot.SIGNED:
+            self.message = "{node} has a valid puppet cert: {cert} ".format(node=self.node, cert=cert)
+        elif state == PuppetCASnapshot.REQUESTED:
+            self.warn = True
+            self.message = "Puppet certificate of {node} has not been signed. Please sign the following " \
+                           "certificate: {cert}".format(node=self.node, cert=cert)
+        return state != PuppetCASnapshot.REVOKED
 
     def fail(self):
+        if self.certificate is not None:
+            raise PuppetCertificateError("The puppet certificate of {node} has been revoked".format(node=self.node))
         err_msg = "Could not find puppet certificate for {node}".format(node=self.node)
         raise PuppetCertificateError(err_msg)
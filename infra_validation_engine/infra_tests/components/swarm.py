@@ -9,11 +9,13 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import json
 
+import six
 from infra_validation_engine.core import InfraTestType, InfraTest
+from infra_validation_engine.core.snapshots import DockerSnapshot
 from infra_validation_engine.core.standard_tests import FileIsPresentTest
 from infra_validation_engine.utils.constants import Constants
-import re
 
 
 class SwarmConstants(Constants):
@@ -36,21 +38,21 @@ class SwarmClusterError(Exception):
     """ Raised if status of cluster cannot be determined"""
 
 
+@six.add_metaclass(InfraTestType)
 class SwarmDNSFileTest(FileIsPresentTest):
     """
     Test if DNS file was generated
     """
-    __metaclass__ = InfraTestType
 
     def __init__(self, host, fqdn):
         FileIsPresentTest.__init__(self, "DNS File Presence Test", SwarmConstants.DNS_FILE, host, fqdn)
 
 
+@six.add_metaclass(InfraTestType)
 class SwarmStatusFileTest(FileIsPresentTest):
     """
     Test if SwarmStatus file was generated
     """
-    __metaclass__ = InfraTestType
 
     def __init__(self, host, fqdn):
         FileIsPresentTest.__init__(self, "Swarm Status File Presence Test", SwarmConstants.SWARM_STATUS_FILE, host,
@@ -69,12 +71,11 @@ class SwarmOverlayNetworkTest(InfraTest):
                            host,
                            fqdn)
         self.network = network
+        if host is not None:
+            DockerSnapshot.for_host(host)
 
     def run(self):
-        cmd_str = "docker network ls -q -f 'name={network}' | wc -l".format(network=self.network)
-        cmd = self.host.run(cmd_str)
-        out = int(cmd.stdout)
-        return out == 1
+        return DockerSnapshot.for_host(self.host).get_network(self.network) is not None
 
     def fail(self):
         err_msg = "Docker overlay network named {network} was absent on {fqdn}".format(
@@ -82,31 +83,61 @@ class SwarmOverlayNetworkTest(InfraTest):
         raise SwarmOverlayNetworkError(err_msg)
 
 
+@six.add_metaclass(InfraTestType)
 class SwarmIngressNetworkTest(SwarmOverlayNetworkTest):
     """
     Test if ingress network is created
     """
-    __metaclass__ = InfraTestType
 
     def __init__(self, host, fqdn):
         SwarmOverlayNetworkTest.__init__(self, SwarmConstants.SWARM_INGRESS_NETWORK_NAME, host, fqdn)
 
 
+@six.add_metaclass(InfraTestType)
 class SwarmSimpleOverlayNetworkTest(SwarmOverlayNetworkTest):
     """
     Test is simple overlay network is present
     """
-    __metaclass__ = InfraTestType
 
     def __init__(self, host, fqdn):
         SwarmOverlayNetworkTest.__init__(self, SwarmConstants.SWARM_NETWORK, host, fqdn)
 
 
+def normalize_hostname(hostname):
+    """ Hostnames are case insensitive and may be given with the trailing dot of the root zone """
+    return hostname.strip().rstrip('.').lower()
+
+
+class SwarmNodeIndex:
+    """
+    Index of the expected nodes of a swarm by normalized FQDN and by short hostname, as docker may report either.
+    Short hostnames that are shared by several expected nodes are ambiguous and only match by FQDN.
+    """
+
+    def __init__(self, fqdns):
+        self.fqdns = dict((normalize_hostname(fqdn), fqdn) for fqdn in fqdns)
+        short_names = {}
+        for normalized in self.fqdns:
+            short_names.setdefault(normalized.split('.')[0], []).append(normalized)
+        self.short_names = dict((short, names[0]) for short, names in short_names.items() if len(names) == 1)
+
+    def match(self, hostname):
+        """ :return: The expected FQDN that hostname refers to, or None if it is not expected """
+        normalized = normalize_hostname(hostname)
+        if normalized not in self.fqdns:
+            normalized = self.short_names.get(normalized.split('.')[0])
+        return self.fqdns.get(normalized)
+
+
+@six.add_metaclass(InfraTestType)
 class SwarmMembershipTest(InfraTest):
     """
-    Test if a node is part of swarm
+    Test if the swarm consists of exactly the expected nodes, that all of them are ready and if they are available for
+    tasks. Nodes that are drained or paused and managers that are unreachable are reported as warnings.
     """
-    __metaclass__ = InfraTestType
+    READY = "ready"
+    ACTIVE = "active"
+    UNREACHABLE = "unreachable"
 
     def __init__(self, host, fqdn, nodes):
         InfraTest.__init__(self,
@@ -115,38 +146,66 @@ class SwarmMembershipTest(InfraTest):
                            host,
                            fqdn)
         self.expected_nodes = set(nodes)
+        self.missing_nodes = []
+        self.unexpected_nodes = []
+        self.down_nodes = []
 
     def run(self):
-        cmd_str = "docker node ls"
-        cmd = self.host.run(cmd_str)
+        cmd = self.host.run("docker node ls --format %s", "{{json .}}")
         self.rc = cmd.rc
-        actual_nodes = set()
-        missing_nodes = []
-        if self.rc == 0:
-            for node_info in cmd.stdout.split('\n')[1:]:
-                node_info = str(node_info).split()
-                if not len(node_info) > 0:
-                    continue
-                if '*' in node_info:
-                    actual_nodes.add(node_info[2])
-                else:
-                    actual_nodes.add(node_info[1])
-            for node in actual_nodes:
-                found = False
-                for ref in self.expected_nodes:
-                    if node in ref or ref in node:
-                        found = True
-                if not found:
-                    missing_nodes.append(node)
-            self.err = missing_nodes
-            return len(missing_nodes) == 0
-        return False
+        if self.rc != 0:
+            return False
+        index = SwarmNodeIndex(self.expected_nodes)
+        joined = set()
+        unavailable = []
+        managers = {}
+        for line in cmd.stdout.splitlines():
+            # Lines that are not JSON, e.g. warnings of the docker client, are skipped
+            if not line.startswith('{'):
+                continue
+            try:
+                node = json.loads(line)
+            except ValueError:
+                self.logger.debug("{log_str} skipping unexpected output: {line}".format(log_str=self.log_str,
+                                                                                       line=line))
+                continue
+            hostname = node.get('Hostname', '')
+            fqdn = index.match(hostname)
+            if fqdn is None:
+                self.unexpected_nodes.append(hostname)
+                continue
+            joined.add(fqdn)
+            if node.get('Status', '').lower() != self.READY:
+                self.down_nodes.append(fqdn)
+            if node.get('Availability', '').lower() != self.ACTIVE:
+                unavailable.append("{fqdn} ({availability})".format(fqdn=fqdn, availability=node.get('Availability')))
+            if node.get('ManagerStatus'):
+                managers[fqdn] = node['ManagerStatus']
+        self.missing_nodes = sorted(self.expected_nodes - joined)
+        unreachable_managers = sorted(fqdn for fqdn, status in managers.items() if status.lower() == self.UNREACHABLE)
+        self.report['nodes'] = len(joined) + len(self.unexpected_nodes)
+        self.report['managers'] = managers
+        self.report['missing_nodes'] = self.missing_nodes
+        self.report['unexpected_nodes'] = self.unexpected_nodes
+        self.report['down_nodes'] = self.down_nodes
+        if unavailable or unreachable_managers:
+            self.warn = True
+            self.message = "Swarm nodes not available for tasks: {unavailable}. Unreachable managers: {managers}".format(
+                unavailable=', '.join(unavailable) or 'none', managers=', '.join(unreachable_managers) or 'none')
+        return not (self.missing_nodes or self.unexpected_nodes or self.down_nodes)
 
     def fail(self):
         if self.rc == 0:
-            err_msg = "The following nodes have not joined the Swarm Cluster: {missing}".format(
-                missing=', '.join(self.err))
-            raise SwarmMissingNodeError(err_msg)
+            problems = []
+            if self.missing_nodes:
+                problems.append("The following nodes have not joined the Swarm Cluster: {missing}".format(
+                    missing=', '.join(self.missing_nodes)))
+            if self.unexpected_nodes:
+                problems.append("The following nodes are part of the Swarm Cluster but not of the site: {nodes}".format(
+                    nodes=', '.join(self.unexpected_nodes)))
+            if self.down_nodes:
+                problems.append("The following nodes are not ready: {nodes}".format(nodes=', '.join(self.down_nodes)))
+            raise SwarmMissingNodeError(". ".join(problems))
         else:
             err_msg = "Failed to determine status of swarm cluster. 'docker node ls' on {fqdn} exited with {code}".format(
                 fqdn=self.fqdn, code=self.rc
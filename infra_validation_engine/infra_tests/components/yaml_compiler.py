@@ -11,6 +11,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import six
 from infra_validation_engine.core import InfraTest, InfraTestType
 from infra_validation_engine.utils.constants import Constants
 from infra_validation_engine.core.exceptions import ComponentNotInstalledError
@@ -22,11 +23,11 @@ class YamlCompilerConstants(Constants):
     )
 
 
+@six.add_metaclass(InfraTestType)
 class YamlCompilerInstallationTest(InfraTest):
     """
     Check if the YAML compiler is installed from GitHub
     """
-    __metaclass__ = InfraTestType
 
     def __init__(self, host, fqdn):
         InfraTest.__init__(self, "Yaml Compiler Installation Test",
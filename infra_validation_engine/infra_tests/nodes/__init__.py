@@ -34,6 +34,10 @@ class AugmentedSiteLevelConfigFileTest(FileIsPresentTest):
 
 
 class SELinuxTest(InfraTest):
+    expected_facts = ("sestatus",)
+    # Changing the SELinux mode requires a reboot
+    cache_ttl = 24 * 60 * 60
+
     def __init__(self, name, se_status, description, host, fqdn):
         InfraTest.__init__(self, name, description, host, fqdn)
         self.se_status = se_status
@@ -41,13 +45,17 @@ class SELinuxTest(InfraTest):
         self.host_se_status = "undetermined"
 
     def run(self):
-        cmd = self.host.run(self.cmd_str)
+        cmd = self.fact(self.cmd_str)
         self.out = cmd.stdout
         self.err = cmd.stderr
         self.rc = cmd.rc
         self.host_se_status = self.out.split(':')[1].strip()
         return self.host_se_status == self.se_status
 
+    def cache_parameters(self):
+        # The description is free text and does not have to name the expected status
+        return [self.name, self.se_status]
+
     def fail(self):
         if self.rc != 0:
             err_msg = "Could not execute {command} on {host}".format(
@@ -11,15 +11,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import six
 from infra_validation_engine.core import InfraTest, InfraTestType
 from infra_validation_engine.utils.constants import Constants
 from infra_validation_engine.core.exceptions import DirectoryNotFoundError, PackageNotFoundError, \
     FileNotFoundError, FileContentsMismatchError
 
 
+@six.add_metaclass(InfraTestType)
 class ConfigMasterSiteLevelConfigFileTest(InfraTest):
-    __metaclass__ = InfraTestType
-
     def __init__(self, host, fqdn):
         InfraTest.__init__(self,
                            "Config Master - Site Level Config File Test",
@@ -37,9 +37,8 @@ class ConfigMasterSiteLevelConfigFileTest(InfraTest):
         raise FileNotFoundError(err_msg)
 
 
+@six.add_metaclass(InfraTestType)
 class ConfigMasterSSHHostKeyFileTest(InfraTest):
-    __metaclass__ = InfraTestType
-
     def __init__(self, host, fqdn):
         InfraTest.__init__(self,
                            "Config Master - FileServer Config File Test",
@@ -56,9 +55,8 @@ class ConfigMasterSSHHostKeyFileTest(InfraTest):
         raise FileNotFoundError(err_msg)
 
 
+@six.add_metaclass(InfraTestType)
 class ConfigMasterConfigStageSetTest(InfraTest):
-    __metaclass__ = InfraTestType
-
     def __init__(self, host, fqdn):
         InfraTest.__init__(self,
                            "Config Master - Stage changed to CONFIG Test",
@@ -11,14 +11,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import six
 from infra_validation_engine.core import InfraTest, InfraTestType
 from infra_validation_engine.utils.constants import Constants
 from infra_validation_engine.core.exceptions import FileContentsMismatchError
 
 
+@six.add_metaclass(InfraTestType)
 class LightweightComponentHostkeyTest(InfraTest):
-    __metaclass__ = InfraTestType
-
     def __init__(self, host, fqdn, cm_host):
         InfraTest.__init__(self,
                            "Lightweight Component - Hostkey is copied Test",
@@ -11,23 +11,37 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import atexit
+from collections import OrderedDict
+import os
 import sys
-import yaml
 import click
-from infra_validation_engine.core import Pool
+from infra_validation_engine.core import Pool, Stage
+from infra_validation_engine.core.concurrency import configure_scheduler, IS_PY2
+from infra_validation_engine.core.transport import ManagedHost, warm_up
+from infra_validation_engine.core.bolt_transport import configure_bolt_fan_out
+from infra_validation_engine.core.multiplexing import configure_multiplexer
+from infra_validation_engine.core.result_cache import configure_result_cache
+from infra_validation_engine.core.rerun import RerunSelection
+from infra_validation_engine.core.events import configure_event_sink
 from infra_validation_engine.stages.config import Config
 from infra_validation_engine.stages.deploy import Deploy
 from infra_validation_engine.stages.pre_deploy import Pre_Deploy
-from stages.pre_install import Pre_Install
-from stages.install import Install
-from stages.test import Test
-from utils import get_lightweight_component_hosts, get_host_representation, add_testinfra_host
+from infra_validation_engine.stages.pre_install import Pre_Install, ClusterWideDNSChecker
+from infra_validation_engine.stages.install import Install
+from infra_validation_engine.stages.test import Test
+from infra_validation_engine.utils.hosts import HostRef, HostRegistry
+from infra_validation_engine.utils.site_config import load_site_config
+from infra_validation_engine.utils import get_lightweight_component_hosts, get_host_representation, \
+    add_testinfra_host
 import logging
-from utils import config_root_logger
-from __version__ import __version__
+from infra_validation_engine.utils import config_root_logger
+from infra_validation_engine.__version__ import __version__
 
 logger = logging.getLogger(__name__)
 
+RESULT_CACHE_FILE = "results.sqlite"
+
 
 class Session:
     def __init__(self):
@@ -42,6 +56,28 @@ class Session:
 pass_session = click.make_pass_decorator(Session)
 
 
+def get_stage_executor(engine, num_threads, max_per_host, stage_timeout=None, test_timeout=None):
+    """
+    Returns a function that executes a stage with the selected engine. The timeouts are set on the stage, which
+    propagates them to its pipeline
+    """
+    if engine == 'asyncio':
+        if IS_PY2:
+            raise click.BadParameter("The asyncio engine requires Python 3", param_hint="--engine")
+        from infra_validation_engine.core.async_executor import AsyncExecutor
+        execute = AsyncExecutor(num_threads, max_per_host=max_per_host).execute
+    else:
+        configure_scheduler(num_threads, max_per_host)
+        execute = lambda stage: stage.execute()
+
+    def execute_stage(stage):
+        stage.timeout = stage_timeout
+        stage.test_timeout = test_timeout
+        execute(stage)
+
+    return execute_stage
+
+
 @click.group()
 @click.version_option(__version__)
 @click.pass_context
@@ -70,12 +106,103 @@ def cli(ctx):
               type=click.INT,
               default=10,
               required=False,
-              help="Number of threads to spawn per element in the test pipeline"
+              help="Maximum number of worker threads shared by all the elements of the test pipeline"
               )
+@click.option('--max-per-host',
+              type=click.IntRange(min=1),
+              default=5,
+              required=False,
+              help="Maximum number of tests executing commands on the same host at a time. Keep it below the "
+                   "MaxSessions and MaxStartups settings of sshd on the hosts. Default is 5"
+              )
+@click.option('--test-timeout',
+              type=click.FloatRange(min=0),
+              default=0,
+              required=False,
+              help="Seconds after which the commands of a test that did not finish are killed and the test is reported "
+                   "as timeout, unless the test class sets a timeout of its own. Commands of tests with a timeout are "
+                   "run through timeout(1), which the hosts must provide. 0 disables the timeout. Default is 0"
+              )
+@click.option('--stage-timeout',
+              type=click.FloatRange(min=0),
+              default=0,
+              required=False,
+              help="Seconds after which the tests of a stage that did not finish are cancelled and reported as "
+                   "timeout. 0 disables the timeout. Default is 0"
+              )
+@click.option('--max-connection-failures',
+              type=click.IntRange(min=1),
+              default=3,
+              required=False,
+              help="Number of consecutive connection failures after which a host is considered unreachable. The "
+                   "remaining tests of an unreachable host fail right away. Default is 3"
+              )
+@click.option('--ssh-multiplexing/--no-ssh-multiplexing',
+              default=True,
+              help="Multiplex the commands to a host over a persistent ssh connection. Default is enabled")
+@click.option('--ssh-control-dir',
+              type=click.STRING,
+              required=False,
+              help="Directory for the ssh control sockets. Connections are kept open there for "
+                   "--ssh-control-persist seconds after their last command and reused by subsequent runs, so they "
+                   "outlive the run. By default, a temporary directory is used and the connections are closed at the "
+                   "end of the run")
+@click.option('--ssh-control-persist',
+              type=click.IntRange(min=1),
+              default=60,
+              required=False,
+              help="Seconds an idle multiplexed ssh connection is kept open, at least 1. Default is 60")
+@click.option('--warm-up/--no-warm-up', 'warm_up_hosts',
+              default=True,
+              help="Connect to all hosts concurrently before executing the stages. Hosts that cannot be connected to "
+                   "are marked unreachable and their tests fail right away. The connect latency and error of every "
+                   "host is reported under warm_up by the first stage. Default is enabled")
+@click.option('--probe/--no-probe', 'remote_probe',
+              default=False,
+              help="Collect the state each stage checks on a host with a single probe script, which is uploaded once "
+                   "and cached on the host, instead of one command per test. Default is disabled")
+@click.option('--bolt-fan-out/--no-bolt-fan-out',
+              default=False,
+              help="Execute the checks that are the same on several Lightweight Component hosts with a single bolt "
+                   "command from the config master instead of one ssh session per host. Default is disabled")
+@click.option('--mesh-sample',
+              type=click.IntRange(min=1),
+              required=False,
+              help="Number of random peers each node checks the connectivity to. By default, every node checks all "
+                   "other nodes")
+@click.option('--max-age',
+              type=click.IntRange(min=0),
+              required=False,
+              help="Reuse the passes of earlier runs that are at most this many seconds old, if the test allows it. "
+                   "Other tests, and tests that failed, are executed. The results are stored in --state-dir. By "
+                   "default, every test is executed and no results are stored")
+@click.option('--state-dir',
+              type=click.STRING,
+              default='~/.simple_grid/infra_validation_engine',
+              required=False,
+              help="Directory for the state kept between runs, e.g. the results reused by --max-age. "
+                   "Default is ~/.simple_grid/infra_validation_engine")
+@click.option('--rerun-failed',
+              type=click.Path(exists=True, dir_okay=False),
+              required=False,
+              help="The API mode output of a previous run. Only the tests that did not pass in it are executed, "
+                   "together with the pre conditions of their stages and executors. If no stages are given, the "
+                   "stages with such tests are executed")
+@click.option('--engine', '-e',
+              type=click.Choice(['threads', 'asyncio'], case_sensitive=False),
+              default='threads',
+              help="Execution engine for the test pipeline. The asyncio engine requires Python 3. The shipped tests "
+                   "still call testinfra and run on its thread pool, only AsyncInfraTests run on the event loop. "
+                   "Default is threads")
 @click.option('--mode', '-m',
               type=click.Choice(['api', 'standalone'], case_sensitive=False),
               help="In API mode, output is JSON encoded. Default is standalone",
               default='standalone')
+@click.option('--api-output',
+              type=click.Choice(['report', 'events'], case_sensitive=False),
+              default='report',
+              help="In API mode, output the report of each stage once it finished, or stream one compact JSON event "
+                   "per line whenever a test starts or finishes and an executor or stage finishes. Default is report")
 @click.option('--verbose', '-v',
               count=True,
               help="Set verbosity level. Select between -v, -vv or -vvv.")
@@ -87,23 +214,46 @@ def cli(ctx):
                 nargs=-1,
                 type=click.Choice([x.lower() for x in Pool.get_all_stages()]),
                 )
-def validate(file, config_master, identity_file, num_threads, mode, verbose, targets, stages):
+def validate(file, config_master, identity_file, num_threads, max_per_host, test_timeout, stage_timeout,
+             max_connection_failures, ssh_multiplexing, ssh_control_dir, ssh_control_persist, warm_up_hosts,
+             remote_probe, bolt_fan_out, mesh_sample, max_age, state_dir, rerun_failed, engine, mode, api_output,
+             verbose, targets, stages):
     """
     Execute the infra validation engine for the SIMPLE Framework and validate the configuration of CM and LC hosts stage
     by stage.
     """
     config_root_logger(verbose, mode)
+    if mode == 'api' and api_output == 'events':
+        configure_event_sink()
+    # Test classes with a timeout attribute of their own keep it
+    execute_stage = get_stage_executor(engine, num_threads, max_per_host, stage_timeout if stage_timeout else None,
+                                       test_timeout if test_timeout else None)
+    ManagedHost.failure_threshold = max_connection_failures
+    Stage.remote_probe = remote_probe
+    Stage.probe_fan_out = num_threads
+    ClusterWideDNSChecker.sample_size = mesh_sample
+    if max_age is not None:
+        result_cache = configure_result_cache(os.path.join(os.path.expanduser(state_dir), RESULT_CACHE_FILE), max_age)
+        atexit.register(result_cache.close)
+    if rerun_failed is not None:
+        try:
+            Stage.rerun_selection = RerunSelection.load(rerun_failed)
+        except (IOError, ValueError) as ex:
+            raise click.BadParameter("Could not load the report: {error}".format(error=ex),
+                                     param_hint="--rerun-failed")
+        if len(stages) == 0:
+            stages = Stage.rerun_selection.stages
 
     logger.debug("config_master: {cm}".format(cm=config_master))
     logger.debug("verbosity: {val}".format(val=verbose))
+    logger.debug("engine: {val}".format(val=engine))
     logger.debug("mode: {val}".format(val=mode))
     logger.debug("targets: {val}".format(val=targets))
     logger.debug("stages: {val}".format(val=stages))
 
-    cm_host_rep = get_host_representation(config_master, '0.0.0.0')
+    cm_host_rep = get_host_representation(config_master, '0.0.0.0', role=HostRef.CONFIG_MASTER)
     lc_hosts_rep = []
-    all_hosts_rep = [cm_host_rep]
-    augmented_site_level_config = None
+    site_config = load_site_config(file)
     exit_code = 1
 
     if targets is not None:
@@ -112,57 +262,62 @@ def validate(file, config_master, identity_file, num_threads, mode, verbose, tar
     else:
         logger.debug("No targets were explicitly specified to execute the tests. Using augmented_site_level_config "
                      "instead!")
-        try:
-            with open(file, 'r') as augmented_site_level_config_file:
-                augmented_site_level_config = yaml.safe_load(augmented_site_level_config_file)
-        except IOError:
-            logger.info("Could not read augmented site level config file")
-            logger.debug("Exception:", exc_info=True)
-
-        if augmented_site_level_config is not None:
-            lc_hosts_rep = get_lightweight_component_hosts(augmented_site_level_config)
+        if site_config is not None:
+            lc_hosts_rep = get_lightweight_component_hosts(site_config)
 
     if len(lc_hosts_rep) == 0:
         logger.info("No LC hosts specified through --targets or --file")
-    else:
-        all_hosts_rep.extend(lc_hosts_rep)
+    hosts = HostRegistry(cm_host_rep, lc_hosts_rep,
+                         main_lc_fqdn=site_config.main_lc_fqdn if site_config is not None else None)
 
     logger.info("Infra Validation Tests will be executed on the following hosts:")
-    map(lambda x: logger.info(x['fqdn']), all_hosts_rep)
+    for host_rep in hosts:
+        logger.info(host_rep.fqdn)
+
+    ssh_config = None
+    if ssh_multiplexing:
+        multiplexer = configure_multiplexer(ssh_control_dir, ssh_control_persist)
+        atexit.register(multiplexer.stop)
+        ssh_config = multiplexer.ssh_config
 
-    add_testinfra_host(cm_host_rep, ssh_key=identity_file)
-    for host_rep in all_hosts_rep[1:]:
-        add_testinfra_host(host_rep, ssh_key=identity_file)
+    hosts.update([add_testinfra_host(host_rep, ssh_key=identity_file, ssh_config=ssh_config) for host_rep in hosts])
+    if bolt_fan_out:
+        configure_bolt_fan_out(hosts.config_master.host,
+                               OrderedDict((host_rep.fqdn, host_rep.host) for host_rep in hosts.lightweight_components))
+    if warm_up_hosts:
+        Stage.warm_up_statuses = warm_up([host_rep.host for host_rep in hosts], num_threads)
     exit_codes = []
 
     if 'test' in stages:
-        test_stage = Test(cm_host_rep, lc_hosts_rep)
-        exit_code = test_stage.execute()
-        exit(exit_code)
+        test_stage = Test(hosts)
+        execute_stage(test_stage)
+        exit(test_stage.exit_code)
     if 'pre_install' in stages:
-        pre_install_stage = Pre_Install(cm_host_rep, lc_hosts_rep, identity_file, num_threads)
-        pre_install_stage.execute()
+        pre_install_stage = Pre_Install(hosts, identity_file, num_threads)
+        execute_stage(pre_install_stage)
         exit_codes.append(pre_install_stage.exit_code)
     if 'install' in stages:
-        install_stage = Install(cm_host_rep, lc_hosts_rep, file, num_threads)
-        install_stage.execute()
+        install_stage = Install(hosts, site_config, num_threads)
+        execute_stage(install_stage)
         exit_codes.append(install_stage.exit_code)
     if 'config' in stages:
-        config_stage = Config(cm_host_rep, lc_hosts_rep, num_threads)
-        config_stage.execute()
+        config_stage = Config(hosts, num_threads)
+        execute_stage(config_stage)
         exit_codes.append(config_stage.exit_code)
     if 'pre_deploy' in stages:
-        pre_deploy_stage = Pre_Deploy(cm_host_rep, lc_hosts_rep, file, num_threads)
-        pre_deploy_stage.execute()
+        pre_deploy_stage = Pre_Deploy(hosts, site_config, num_threads)
+        execute_stage(pre_deploy_stage)
         exit_codes.append(pre_deploy_stage.exit_code)
     if 'deploy' in stages:
-        deploy_stage = Deploy(cm_host_rep, lc_hosts_rep, file, num_threads)
-        deploy_stage.execute()
+        deploy_stage = Deploy(hosts, site_config, num_threads)
+        execute_stage(deploy_stage)
         exit_codes.append(deploy_stage.exit_code)
 
     unique_exit_codes = set(exit_codes)
     if 1 in unique_exit_codes:
         exit(1)
+    elif 2 in unique_exit_codes:
+        exit(2)
     elif 3 in unique_exit_codes:
         exit(3)
     else:
@@ -10,6 +10,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import six
 from infra_validation_engine.core import Stage, StageType
 from infra_validation_engine.core.executors import ParallelExecutor
 from infra_validation_engine.core.standard_tests import FileIsPresentTest
@@ -57,14 +58,15 @@ class PuppetValidator(ParallelExecutor):
             self.append_to_pipeline(PuppetCertTest(lc['fqdn'], self.host, self.fqdn))
 
 
+@six.add_metaclass(StageType)
 class Config(Stage):
     """ Validate config right after signing of certificates """
-    __metaclass__ = StageType
 
-    def __init__(self, cm_rep, lc_rep, num_threads):
+    def __init__(self, hosts, num_threads):
         Stage.__init__(self, "Config")
-        self.cm_rep = cm_rep
-        self.lc_rep = lc_rep
+        self.hosts = hosts
+        self.cm_rep = hosts.config_master
+        self.lc_rep = hosts.lightweight_components
         self.num_threads = num_threads
         self.create_pipeline()
 
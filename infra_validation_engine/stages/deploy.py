@@ -10,7 +10,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-import yaml
+import six
 
 from infra_validation_engine.core import StageType, Stage, PreConditionNotSatisfiedError
 from infra_validation_engine.core.executors import ParallelExecutor
@@ -36,25 +36,20 @@ class DeployStageParallelExecutor(ParallelExecutor):
             self.append_to_pipeline(DockerContainerStatusTest(host_rep['host'], host_rep['fqdn'], container_name))
 
 
+@six.add_metaclass(StageType)
 class Deploy(Stage):
-    __metaclass__ = StageType
-
-    def __init__(self, cm_rep, lc_rep, augmented_site_level_config_file, num_threads):
+    def __init__(self, hosts, site_config, num_threads):
         Stage.__init__(self, "Deploy")
-        self.cm_rep = cm_rep
-        self.lc_rep = lc_rep
+        self.hosts = hosts
+        self.cm_rep = hosts.config_master
+        self.lc_rep = hosts.lightweight_components
         self.num_threads = num_threads
-        self.augmented_site_level_config_file = augmented_site_level_config_file
-        self.augmented_site_level_config = None
+        self.site_config = site_config
         self.container_host_reps = []
 
     def pre_condition(self):
-        try:
-            with open(self.augmented_site_level_config_file, 'r') as augmented_site_level_config_file:
-                self.augmented_site_level_config = yaml.safe_load(augmented_site_level_config_file)
-        except Exception:
-            raise PreConditionNotSatisfiedError("Could not read augmented site level config file from {path}"
-                                                .format(path=self.augmented_site_level_config_file))
+        if self.site_config is None:
+            raise PreConditionNotSatisfiedError("Could not read augmented site level config file")
         self.create_pipeline()
 
     def create_pipeline(self):
@@ -64,11 +59,10 @@ class Deploy(Stage):
         ])
 
     def parse_augmented_site_config(self):
-        if not 'dns' in self.augmented_site_level_config:
+        if self.site_config.dns_entries is None:
             raise PreConditionNotSatisfiedError("DNS information is missing in {file}".format(
-                file=self.augmented_site_level_config_file))
-        dns_info = self.augmented_site_level_config['dns']
-        for dns in dns_info:
+                file=self.site_config.path))
+        for dns in self.site_config.dns_entries:
             container_fqdn = dns['container_fqdn']
             host_fqdn = dns['host_fqdn']
             host = self.get_host_rep(host_fqdn)
@@ -78,5 +72,7 @@ class Deploy(Stage):
             })
 
     def get_host_rep(self, fqdn):
-        host_rep = [x for x in self.lc_rep if x['fqdn'] == fqdn]
-        return host_rep[0]
+        host_rep = self.hosts.get(fqdn)
+        if host_rep is None:
+            raise PreConditionNotSatisfiedError("TestInfra host for {fqdn} was not found".format(fqdn=fqdn))
+        return host_rep
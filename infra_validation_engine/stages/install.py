@@ -10,7 +10,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-import yaml
+import six
 
 from infra_validation_engine.core import Stage, StageType, PreConditionNotSatisfiedError
 from infra_validation_engine.core.executors import ParallelExecutor
@@ -20,8 +20,8 @@ from infra_validation_engine.infra_tests.components.bolt import BoltInstallation
 from infra_validation_engine.infra_tests.components.docker import DockerInstallationTest
 from infra_validation_engine.infra_tests.components.puppet import PuppetServerInstallationTest, PuppetFirewallPortTest, \
     SimplePuppetEnvTest, PuppetConfTest, PuppetServerServiceTest, PuppetFileServerConfTest, PuppetCertTest, \
-    PuppetServiceTest
-from infra_validation_engine.utils.constants import Constants, ComponentRepositoryConstants
+    PuppetServiceTest, PuppetAgentInstallationTest
+from infra_validation_engine.utils.constants import Constants
 
 
 class BoltValidator(ParallelExecutor):
@@ -73,9 +73,10 @@ class InstallStageParallelExecutor(ParallelExecutor):
         self.create_pipeline()
 
     def create_pipeline(self):
+        puppet_server_installation_test = PuppetServerInstallationTest(self.host, self.fqdn)
         self.extend_pipeline([
-            PuppetServerInstallationTest(self.host, self.fqdn),
-            PuppetServerServiceTest(self.host, self.fqdn),
+            puppet_server_installation_test,
+            PuppetServerServiceTest(self.host, self.fqdn).depends_on(puppet_server_installation_test),
             PuppetFileServerConfTest(self.host, self.fqdn),
             GitAndDockerInstallationValidator(self.all_hosts, self.num_threads),
             SimplePuppetEnvTest(self.host, self.fqdn),
@@ -83,14 +84,16 @@ class InstallStageParallelExecutor(ParallelExecutor):
             BoltValidator(self.cm_rep, self.num_threads)
         ])
         for node in self.all_hosts:
+            puppet_agent_installation_test = PuppetAgentInstallationTest(node['host'], node['fqdn'])
             self.extend_pipeline([
                 FileIsPresentTest("SIMPLE node_type file test for {fqdn}".format(fqdn=node['fqdn']),
                                   Constants.NODE_TYPE_FILE,
                                   node['host'],
                                   node['fqdn']
                                   ),
-                PuppetConfTest(self.host, node['host'], node['fqdn']),
-                PuppetServiceTest(node['host'], node['fqdn']),
+                puppet_agent_installation_test,
+                PuppetConfTest(self.host, node['host'], node['fqdn']).depends_on(puppet_agent_installation_test),
+                PuppetServiceTest(node['host'], node['fqdn']).depends_on(puppet_agent_installation_test),
             ])
 
         for lc in self.lc_rep:
@@ -119,58 +122,25 @@ class InstallStageParallelExecutor(ParallelExecutor):
             )
 
 
+@six.add_metaclass(StageType)
 class Install(Stage):
     """ Everything until signing of certificates """
-    __metaclass__ = StageType
 
-    def __init__(self, cm_rep, lc_rep, augmented_site_level_config_file, num_threads):
+    def __init__(self, hosts, site_config, num_threads):
         Stage.__init__(self, "Install")
-        self.cm_rep = cm_rep
-        self.lc_rep = lc_rep
+        self.hosts = hosts
+        self.cm_rep = hosts.config_master
+        self.lc_rep = hosts.lightweight_components
         self.num_threads = num_threads
-        self.augmented_site_level_config_file = augmented_site_level_config_file
-        self.augmented_site_level_config = None
-        self.host_cert_dirs = []
-        self.hooks = []
+        self.site_config = site_config
 
     def pre_condition(self):
-        try:
-            with open(self.augmented_site_level_config_file, 'r') as augmented_site_level_config_file:
-                self.augmented_site_level_config = yaml.safe_load(augmented_site_level_config_file)
-        except Exception:
-            raise PreConditionNotSatisfiedError("Could not read augmented site level config file from {path}"
-                                                .format(path=self.augmented_site_level_config_file))
+        if self.site_config is None:
+            raise PreConditionNotSatisfiedError("Could not read augmented site level config file")
         self.create_pipeline()
 
     def create_pipeline(self):
-        self.parse_augmented_site_config()
         self.extend_pipeline([
-            InstallStageParallelExecutor(self.cm_rep, self.lc_rep, self.host_cert_dirs, self.hooks, self.num_threads)
+            InstallStageParallelExecutor(self.cm_rep, self.lc_rep, self.site_config.host_cert_dirs,
+                                         self.site_config.lifecycle_hooks, self.num_threads)
         ])
-
-    def parse_augmented_site_config(self):
-        lcs = self.augmented_site_level_config['lightweight_components']
-        for lc in lcs:
-            name = lc['name'].lower()
-            fqdn = lc['deploy']['node']
-            meta_info_header = "{prefix}{name}".format(
-                prefix=ComponentRepositoryConstants.META_INFO_PREFIX,
-                name=name
-            )
-            if meta_info_header in self.augmented_site_level_config:
-                meta_info = self.augmented_site_level_config[meta_info_header]
-                if "host_requirements" in meta_info:
-                    host_requirements = meta_info["host_requirements"]
-                    if "host_certificates" in host_requirements:
-                        if host_requirements['host_certificates'] is True:
-                            self.host_cert_dirs.append("{host_cert_dir}/{fqdn}"
-                                                       .format(host_cert_dir=ComponentRepositoryConstants.HOST_CERT_DIR,
-                                                               fqdn=fqdn))
-            if "lifecycle_hooks" in lc:
-                hooks = lc['lifecycle_hooks']
-                if "pre_config" in hooks:
-                    self.hooks.extend(hooks['pre_config'])
-                if "pre_init" in hooks:
-                    self.hooks.extend(hooks['pre_init'])
-                if "post_init" in hooks:
-                    self.hooks.extend(hooks['post_init'])
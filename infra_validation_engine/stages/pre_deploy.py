@@ -10,7 +10,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-import yaml
+import six
 
 from infra_validation_engine.core import StageType, Stage, PreConditionNotSatisfiedError
 from infra_validation_engine.core.executors import ParallelExecutor
@@ -20,7 +20,7 @@ from infra_validation_engine.infra_tests.nodes import AugmentedSiteLevelConfigFi
 
 
 class SwarmValidator(ParallelExecutor):
-    def __init__(self, cm_rep, lc_rep, main_lc, nodes, num_threads):
+    def __init__(self, cm_rep, lc_rep, main_lc, nodes, num_threads, docker_service_test=None):
         ParallelExecutor.__init__(self, "Docker Swarm Validator", num_threads)
         self.cm_rep = cm_rep
         self.lc_rep = lc_rep
@@ -29,11 +29,16 @@ class SwarmValidator(ParallelExecutor):
         self.fqdn = main_lc['fqdn']
         self.nodes = nodes
         self.num_threads = num_threads
+        self.docker_service_test = docker_service_test
         self.create_pipeline()
 
     def create_pipeline(self):
+        swarm_membership_test = SwarmMembershipTest(self.host, self.fqdn, self.nodes)
+        if self.docker_service_test is not None:
+            # docker node ls is executed on the main LC
+            swarm_membership_test.depends_on(self.docker_service_test)
         self.extend_pipeline([
-            SwarmMembershipTest(self.host, self.fqdn, self.nodes),
+            swarm_membership_test,
 
         ])
 
@@ -61,6 +66,7 @@ class PreDeployStageParallelExecutor(ParallelExecutor):
         self.host = cm_rep['host']
         self.fqdn = cm_rep['fqdn']
         self.num_threads = num_threads
+        self.docker_service_tests = {}
         self.create_pipeline()
 
     def create_pipeline(self):
@@ -69,54 +75,50 @@ class PreDeployStageParallelExecutor(ParallelExecutor):
         ])
 
         for node in self.all_hosts:
+            self.docker_service_tests[node['fqdn']] = DockerServiceTest(node['host'], node['fqdn'])
             self.extend_pipeline([
-                DockerServiceTest(node['host'], node['fqdn']),
+                self.docker_service_tests[node['fqdn']],
                 AugmentedSiteLevelConfigFileTest(node['host'], node['fqdn'])
             ])
 
 
+@six.add_metaclass(StageType)
 class Pre_Deploy(Stage):
-    __metaclass__ = StageType
-
-    def __init__(self, cm_rep, lc_rep, augmented_site_level_config_file, num_threads):
+    def __init__(self, hosts, site_config, num_threads):
         Stage.__init__(self, "Pre_Deploy")
-        self.cm_rep = cm_rep
-        self.lc_rep = lc_rep
+        self.hosts = hosts
+        self.cm_rep = hosts.config_master
+        self.lc_rep = hosts.lightweight_components
         self.num_threads = num_threads
-        self.augmented_site_level_config_file = augmented_site_level_config_file
-        self.augmented_site_level_config = None
+        self.site_config = site_config
         self.nodes = []
         self.main_lc_rep = None
 
     def pre_condition(self):
-        try:
-            with open(self.augmented_site_level_config_file, 'r') as augmented_site_level_config_file:
-                self.augmented_site_level_config = yaml.safe_load(augmented_site_level_config_file)
-        except Exception:
-            raise PreConditionNotSatisfiedError("Could not read augmented site level config file from {path}"
-                                                .format(path=self.augmented_site_level_config_file))
+        if self.site_config is None:
+            raise PreConditionNotSatisfiedError("Could not read augmented site level config file")
         self.create_pipeline()
 
     def create_pipeline(self):
         self.parse_augmented_site_config()
+        pre_deploy_stage_parallel_executor = PreDeployStageParallelExecutor(self.cm_rep, self.lc_rep, self.num_threads)
         self.extend_pipeline([
-            PreDeployStageParallelExecutor(self.cm_rep, self.lc_rep, self.num_threads),
-            SwarmValidator(self.cm_rep, self.lc_rep, self.main_lc_rep, self.nodes, self.num_threads)
+            pre_deploy_stage_parallel_executor,
+            SwarmValidator(self.cm_rep, self.lc_rep, self.main_lc_rep, self.nodes, self.num_threads,
+                           pre_deploy_stage_parallel_executor.docker_service_tests[self.main_lc_rep['fqdn']])
         ])
 
     def parse_augmented_site_config(self):
-        site_infra = self.augmented_site_level_config['site_infrastructure']
-        self.nodes = [node['fqdn'] for node in site_infra]
-        exec_0_lc = [lc for lc in self.augmented_site_level_config['lightweight_components'] if lc['execution_id'] == 0]
+        self.nodes = [fqdn for fqdn, _ in self.site_config.lc_hosts]
+        exec_0_lc = self.site_config.main_lcs
         if len(exec_0_lc) >1:
             raise PreConditionNotSatisfiedError("More than 1 lightweight component with execution_id 0 detected in "
                                                 "the site level config file: {lc}".format(lc=exec_0_lc))
-        else:
-            main_lc_fqdn = exec_0_lc[0]['deploy']['node']
-            main_lc_rep = [lc for lc in self.lc_rep if lc['fqdn'] == main_lc_fqdn]
-            if len(main_lc_rep) == 0:
-                raise PreConditionNotSatisfiedError("TestInfra host for {fqdn} was not found".format(
-                    fqdn=main_lc_fqdn
-                ))
-            else:
-                self.main_lc_rep = main_lc_rep[0]
\ No newline at end of file
+        elif len(exec_0_lc) == 0:
+            raise PreConditionNotSatisfiedError("No lightweight component with execution_id 0 was found in the site "
+                                                "level config file")
+        self.main_lc_rep = self.hosts.main_lc
+        if self.main_lc_rep is None:
+            raise PreConditionNotSatisfiedError("TestInfra host for {fqdn} was not found".format(
+                fqdn=self.site_config.main_lc_fqdn
+            ))
\ No newline at end of file
@@ -10,18 +10,29 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-import itertools
+import random
 import socket
+from collections import OrderedDict
+
+import six
 
 from infra_validation_engine.core import Stage, StageType
 from infra_validation_engine.core.executors import ParallelExecutor, SerialExecutor
-from infra_validation_engine.core.standard_tests import PingTest, SSHTest, FileIsPresentTest
+from infra_validation_engine.core.standard_tests import MeshConnectivityTest, SSHTest, FileIsPresentTest
 from infra_validation_engine.infra_tests.components.puppet import PuppetAgentInstallationTest, PuppetServiceTest, \
     PuppetServerInstallationTest, PuppetModuleTest
 from infra_validation_engine.infra_tests.nodes import SELinuxTest
 from infra_validation_engine.utils.constants import ComponentRepositoryConstants
 
 
+def with_resolved_fqdn(cm_rep):
+    """
+    :return: A copy of the HostRef of the config master with the FQDN of this machine, since the config master is
+    usually referred to as local://
+    """
+    return cm_rep.replace(fqdn=socket.getfqdn())
+
+
 class PasswordlessSSHChecker(ParallelExecutor):
     """ Check if CM can SSH as root to all LCs (passwordless)"""
 
@@ -45,35 +56,61 @@ class PasswordlessSSHChecker(ParallelExecutor):
 
 
 class ClusterWideDNSChecker(ParallelExecutor):
+    """
+    Check if every node can resolve and reach the other nodes, with one MeshConnectivityTest per node. If sample_size
+    is set, every node checks sample_size random peers instead of all of them, for very large sites. The report
+    contains the connectivity matrix, see post_process()
+    """
+    sample_size = None
+    MATRIX_SYMBOLS = {MeshConnectivityTest.OK: '.', MeshConnectivityTest.UNRESOLVED: 'R',
+                      MeshConnectivityTest.UNREACHABLE: 'X'}
 
     def __init__(self, cm_rep, lc_rep, num_threads):
         ParallelExecutor.__init__(self, "DNS Config Validator", num_threads)
-        self.cm_rep = cm_rep
-        self.cm_rep['fqdn'] = socket.getfqdn()
+        self.cm_rep = with_resolved_fqdn(cm_rep)
         self.lc_rep = lc_rep
-        self.node_rep = [cm_rep] + lc_rep
-        self.node_permutation = itertools.permutations(self.node_rep, 2)
+        self.node_rep = [self.cm_rep] + lc_rep
+        self.mesh_tests = []
         self.create_pipeline()
 
     def create_pipeline(self):
-        for node_pair in self.node_permutation:
-            self.append_to_pipeline(
-                PingTest("Ping {dest} from {src}".format(dest=node_pair[1]['fqdn'], src=node_pair[0]['fqdn']),
-                         node_pair[1]['fqdn'],
-                         "Ping test for {dest} from {src}".format(dest=node_pair[1]['fqdn'], src=node_pair[0]['fqdn']),
-                         node_pair[0]['host'],
-                         node_pair[0]['fqdn']
-                         )
+        fqdns = [node['fqdn'] for node in self.node_rep]
+        for node in self.node_rep:
+            peers = [fqdn for fqdn in fqdns if fqdn != node['fqdn']]
+            if self.sample_size is not None and self.sample_size < len(peers):
+                peers = random.sample(peers, self.sample_size)
+            if not peers:
+                continue
+            self.mesh_tests.append(
+                MeshConnectivityTest("Mesh connectivity from {src}".format(src=node['fqdn']),
+                                     peers,
+                                     "Check if {src} can resolve and reach {count} nodes".format(
+                                         src=node['fqdn'], count=len(peers)),
+                                     node['host'],
+                                     node['fqdn']
+                                     )
             )
+        self.extend_pipeline(self.mesh_tests)
+
+    def post_process(self):
+        """
+        The matrix has a row for every source node with one symbol per node, in the order of nodes: '.' if the node
+        could be reached, 'R' if it could not be resolved, 'X' if it could not be reached and '-' if it was not checked
+        """
+        super(ClusterWideDNSChecker, self).post_process()
+        fqdns = [node['fqdn'] for node in self.node_rep]
+        rows = OrderedDict()
+        for test in self.mesh_tests:
+            rows[test.fqdn] = ''.join(self.MATRIX_SYMBOLS.get(test.connectivity.get(fqdn), '-') for fqdn in fqdns)
+        self.report['connectivity_matrix'] = OrderedDict([('nodes', fqdns), ('rows', rows)])
 
 
 class SELinuxValidator(ParallelExecutor):
     def __init__(self, cm_rep, lc_rep, num_threads):
         ParallelExecutor.__init__(self, "SELinux Validator", num_threads)
-        self.cm_rep = cm_rep
-        self.cm_rep['fqdn'] = socket.getfqdn()
+        self.cm_rep = with_resolved_fqdn(cm_rep)
         self.lc_rep = lc_rep
-        self.node_reps = [cm_rep] + lc_rep
+        self.node_reps = [self.cm_rep] + lc_rep
         self.create_pipeline()
 
     def create_pipeline(self):
@@ -89,7 +126,6 @@ class SELinuxValidator(ParallelExecutor):
 
 
 class NetworkValidator(SerialExecutor):
-
     def __init__(self, cm_rep, lc_rep, key, num_threads):
         SerialExecutor.__init__(self, "Network Validator")
         self.cm_rep = cm_rep
@@ -106,7 +142,6 @@ class NetworkValidator(SerialExecutor):
 
 
 class PuppetValidator(ParallelExecutor):
-
     def __init__(self, cm_rep, lc_rep, num_threads):
         ParallelExecutor.__init__(self, "Puppet and Puppet Module Validator", num_threads)
         self.all_hosts = [cm_rep] + lc_rep
@@ -115,9 +150,10 @@ class PuppetValidator(ParallelExecutor):
 
     def create_pipeline(self):
         for node in self.all_hosts:
+            puppet_agent_installation_test = PuppetAgentInstallationTest(node['host'], node['fqdn'])
             self.extend_pipeline([
-                PuppetAgentInstallationTest(node['host'], node['fqdn']),
-                PuppetModuleTest(node['host'], node['fqdn'])
+                puppet_agent_installation_test,
+                PuppetModuleTest(node['host'], node['fqdn']).depends_on(puppet_agent_installation_test)
             ])
 
 
@@ -150,13 +186,13 @@ class PreInstallParallelExecutor(ParallelExecutor):
         ])
 
 
+@six.add_metaclass(StageType)
 class Pre_Install(Stage):
-    __metaclass__ = StageType
-
-    def __init__(self, cm_rep, lc_rep, key, num_threads):
+    def __init__(self, hosts, key, num_threads):
         Stage.__init__(self, "Pre_Install")
-        self.cm_rep = cm_rep
-        self.lc_rep = lc_rep
+        self.hosts = hosts
+        self.cm_rep = hosts.config_master
+        self.lc_rep = hosts.lightweight_components
         self.key = key
         self.num_threads = num_threads
         self.create_pipeline()
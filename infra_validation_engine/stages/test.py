@@ -10,6 +10,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import six
 from infra_validation_engine.infra_tests.components.swarm import *
 
 from infra_validation_engine.infra_tests.components.puppet import *
@@ -37,13 +38,12 @@ class TestExecutor(ParallelExecutor):
             self.append_to_pipeline(TestHorizontalExecutor(lc))
 
 
+@six.add_metaclass(StageType)
 class Test(Stage):
-    __metaclass__ = StageType
-
-    def __init__(self, config_master_host, lightweight_component_hosts):
+    def __init__(self, hosts):
         Stage.__init__(self, "Test")
-        self.config_master_host = config_master_host
-        self.lightweight_component_hosts = lightweight_component_hosts
+        self.config_master_host = hosts.config_master
+        self.lightweight_component_hosts = hosts.lightweight_components
         self.create_pipeline()
 
     def pre_condition(self):
@@ -13,7 +13,8 @@
 
 import infra_validation_engine
 import logging
-import testinfra
+from infra_validation_engine.core import transport
+from infra_validation_engine.utils.hosts import HostRef
 
 
 class APIFilter(logging.Filter):
@@ -24,39 +25,32 @@ class APIFilter(logging.Filter):
         return record.levelno == logging.API
 
 
-def get_lightweight_component_hosts(augmented_site_level_config):
+def get_lightweight_component_hosts(site_config):
     """
     Prepares a list of host_representation objects for all LCs in site level config file
-    :param augmented_site_level_config:
+    :param site_config: The SiteConfig of the augmented site level config file
     :return: A list of testinfra_hosts for LC-hosts described in site level config file.
     """
-    site_infrastructure = augmented_site_level_config['site_infrastructure']
-    output = [get_host_representation(x['fqdn'], x['ip_address']) for x in site_infrastructure]
+    output = [get_host_representation(fqdn, ip_address) for fqdn, ip_address in site_config.lc_hosts]
     return output
 
 
-def add_testinfra_host(host_rep, ssh_key):
-    host_rep['host'] = testinfra.get_host(host_rep['host_str'], ssh_identity_file=ssh_key)
+def add_testinfra_host(host_rep, ssh_key, ssh_config=None):
+    """ :return: A copy of the HostRef host_rep with the testinfra connection for the machine as host """
+    return host_rep.replace(host=transport.get_host(host_rep.host_str, ssh_identity_file=ssh_key,
+                                                    ssh_config=ssh_config))
 
 
-def get_host_representation(fqdn, ip_address=None):
+def get_host_representation(fqdn, ip_address=None, role=HostRef.LIGHTWEIGHT_COMPONENT):
     """
     Creates an object that contains information of the host on which tests will be run.
     :param fqdn: The fqdn of the machine. localhost in case of config master
     :param ip_address: The ip address of the machine. 127.0.0.1 in case of config master
-    :return: A python dict
-    {
-        "fqdn": fqdn
-        "ip_address": ip_address,
-        "host": The testinfra connection for the machine
-    }
+    :param role: HostRef.CONFIG_MASTER or HostRef.LIGHTWEIGHT_COMPONENT
+    :return: A HostRef without testinfra connection, see add_testinfra_host()
     """
     host_str = fqdn if fqdn == "local://" else "ssh://{fqdn}".format(fqdn=fqdn)
-    return {
-        "fqdn": fqdn,
-        "host_str": host_str,
-        "ip_address": ip_address
-    }
+    return HostRef(fqdn, ip_address, host_str, role)
 
 
 def config_root_logger(verbosity, mode):
@@ -0,0 +1,117 @@
+# coding: utf-8
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+The hosts under test and the registry the stages look them up in
+"""
+
+
+class HostRef(object):
+    """
+    Immutable reference to a host under test. Use replace() to derive a reference with other values. The fields can be
+    read as attributes or, like the host representation dicts they replace, as items: host_ref['fqdn']
+    """
+    __slots__ = ('fqdn', 'ip_address', 'host_str', 'role', 'host')
+    CONFIG_MASTER = 'config_master'
+    LIGHTWEIGHT_COMPONENT = 'lightweight_component'
+
+    def __init__(self, fqdn, ip_address=None, host_str=None, role=LIGHTWEIGHT_COMPONENT, host=None):
+        object.__setattr__(self, 'fqdn', fqdn)
+        object.__setattr__(self, 'ip_address', ip_address)
+        object.__setattr__(self, 'host_str', host_str)
+        object.__setattr__(self, 'role', role)
+        object.__setattr__(self, 'host', host)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("HostRef is immutable, use replace() to change {name}".format(name=name))
+
+    def __delattr__(self, name):
+        raise AttributeError("HostRef is immutable")
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        raise TypeError("HostRef is immutable, use replace() to change {key}".format(key=key))
+
+    def replace(self, **kwargs):
+        """ :return: A HostRef with the values of this one, except for the given ones """
+        values = dict((name, getattr(self, name)) for name in self.__slots__)
+        values.update(kwargs)
+        return HostRef(**values)
+
+    @property
+    def is_config_master(self):
+        return self.role == HostRef.CONFIG_MASTER
+
+    def __repr__(self):
+        return "HostRef({fqdn!r}, role={role!r})".format(fqdn=self.fqdn, role=self.role)
+
+
+class HostRegistry:
+    """
+    The hosts of a run indexed by FQDN, IP address and role, see config_master, lightweight_components and main_lc.
+    The main LC is the Lightweight Component host of the component with execution_id 0, if it is known.
+    """
+
+    def __init__(self, config_master, lightweight_components=(), main_lc_fqdn=None):
+        self.config_master = None
+        self.lightweight_components = []
+        self.by_fqdn = {}
+        self.by_ip_address = {}
+        self.main_lc_fqdn = main_lc_fqdn
+        self.update([config_master] + list(lightweight_components))
+
+    def update(self, host_refs):
+        """ Index host_refs, replacing the references with the same FQDN and role """
+        config_master = self.config_master
+        lightweight_components = list(self.lightweight_components)
+        positions = dict((host_ref.fqdn, i) for i, host_ref in enumerate(lightweight_components))
+        for host_ref in host_refs:
+            if host_ref.is_config_master:
+                config_master = host_ref
+            elif host_ref.fqdn in positions:
+                lightweight_components[positions[host_ref.fqdn]] = host_ref
+            else:
+                positions[host_ref.fqdn] = len(lightweight_components)
+                lightweight_components.append(host_ref)
+        self.config_master = config_master
+        self.lightweight_components = lightweight_components
+        self.by_fqdn = dict((host_ref.fqdn, host_ref) for host_ref in lightweight_components)
+        self.by_fqdn.setdefault(config_master.fqdn, config_master)
+        self.by_ip_address = dict((host_ref.ip_address, host_ref) for host_ref in self
+                                  if host_ref.ip_address is not None)
+
+    def get(self, fqdn):
+        """ :return: The HostRef with the FQDN or None. Lightweight Components take precedence over the config master """
+        return self.by_fqdn.get(fqdn)
+
+    def get_by_ip_address(self, ip_address):
+        return self.by_ip_address.get(ip_address)
+
+    @property
+    def main_lc(self):
+        """ :return: The HostRef of the main LC or None if it is not known or not under test """
+        return self.get(self.main_lc_fqdn) if self.main_lc_fqdn is not None else None
+
+    @property
+    def all_hosts(self):
+        """ :return: The config master followed by the Lightweight Components """
+        return [self.config_master] + self.lightweight_components
+
+    def __iter__(self):
+        return iter(self.all_hosts)
+
+    def __len__(self):
+        return 1 + len(self.lightweight_components)
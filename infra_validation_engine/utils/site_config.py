@@ -0,0 +1,84 @@
+# coding: utf-8
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Model of the augmented site level config file, loaded once per run and shared by the stages
+"""
+import logging
+
+import yaml
+
+from infra_validation_engine.utils.constants import ComponentRepositoryConstants
+
+logger = logging.getLogger(__name__)
+
+# libyaml is an optional dependency of PyYAML, the pure Python loader is an order of magnitude slower
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+LIFECYCLE_HOOKS = ('pre_config', 'pre_init', 'post_init')
+
+
+class SiteConfig:
+    """
+    The augmented site level config and the views of it that the stages need, computed once when it is loaded.
+    """
+
+    def __init__(self, config, path=None):
+        self.config = config
+        self.path = path
+        self.site_infrastructure = config.get('site_infrastructure') or []
+        self.lightweight_components = config.get('lightweight_components') or []
+        # (fqdn, ip_address) of the Lightweight Component hosts
+        self.lc_hosts = [(node['fqdn'], node.get('ip_address')) for node in self.site_infrastructure]
+        # None if the config has no dns section
+        self.dns_entries = config.get('dns')
+        self.lifecycle_hooks = []
+        self.host_cert_dirs = []
+        self.host_requirements = {}
+        for lc in self.lightweight_components:
+            name = lc['name'].lower()
+            meta_info = config.get("{prefix}{name}".format(prefix=ComponentRepositoryConstants.META_INFO_PREFIX,
+                                                           name=name)) or {}
+            host_requirements = meta_info.get('host_requirements') or {}
+            self.host_requirements[name] = host_requirements
+            if host_requirements.get('host_certificates') is True:
+                self.host_cert_dirs.append("{host_cert_dir}/{fqdn}".format(
+                    host_cert_dir=ComponentRepositoryConstants.HOST_CERT_DIR, fqdn=lc['deploy']['node']))
+            hooks = lc.get('lifecycle_hooks') or {}
+            for hook in LIFECYCLE_HOOKS:
+                self.lifecycle_hooks.extend(hooks.get(hook) or [])
+        self.main_lcs = [lc for lc in self.lightweight_components if lc.get('execution_id') == 0]
+
+    @property
+    def main_lc_fqdn(self):
+        """ :return: The node of the component with execution_id 0, or None unless there is exactly one """
+        if len(self.main_lcs) != 1:
+            return None
+        return self.main_lcs[0]['deploy']['node']
+
+    @classmethod
+    def load(cls, path):
+        """ Load the augmented site level config file at path. Raises IOError or yaml.YAMLError """
+        with open(path, 'r') as augmented_site_level_config_file:
+            config = yaml.load(augmented_site_level_config_file, Loader=YamlLoader)
+        logger.debug("Loaded {path} with {loader}".format(path=path, loader=YamlLoader.__name__))
+        return cls(config or {}, path)
+
+
+def load_site_config(path):
+    """ :return: The SiteConfig at path or None if it cannot be read """
+    try:
+        return SiteConfig.load(path)
+    except (IOError, yaml.YAMLError, KeyError, TypeError, AttributeError):
+        logger.info("Could not read augmented site level config file")
+        logger.debug("Exception:", exc_info=True)
+        return None
@@ -0,0 +1,22 @@
+"""
+Coroutine based InfraTests used by test_async_executor. Kept apart since they cannot be compiled by Python 2
+"""
+import testinfra
+
+from infra_validation_engine.core.async_executor import AsyncInfraTest
+
+
+class AsyncEchoTest(AsyncInfraTest):
+    def __init__(self, name, text, sleep=0):
+        AsyncInfraTest.__init__(self, name, "Echo {text}".format(text=text), testinfra.get_host("local://"),
+                                "localhost")
+        self.text = text
+        self.sleep = sleep
+
+    async def run(self):
+        cmd = await self.async_host.run("sleep %s && echo %s", self.sleep, self.text)
+        self.out = cmd.stdout.strip()
+        return self.out == self.text
+
+    def fail(self):
+        raise Exception("Unexpected output {out}".format(out=self.out))
@@ -0,0 +1,32 @@
+"""
+Hosts shared by the test modules
+"""
+import testinfra
+
+from infra_validation_engine.core.commands import CommandOutput
+
+
+class CountingHost:
+    """ Counts the commands executed on the local host """
+
+    def __init__(self):
+        self.host = testinfra.get_host("local://")
+        self.commands = []
+
+    def run(self, command, *args):
+        self.commands.append(command)
+        return self.host.run(command, *args)
+
+
+class CannedOutputHost(CountingHost):
+    """ Answers every command with out and exit code rc, without executing it """
+
+    def __init__(self, out, rc=0, err=""):
+        CountingHost.__init__(self)
+        self.out = out
+        self.rc = rc
+        self.err = err
+
+    def run(self, command, *args):
+        self.commands.append(command)
+        return CommandOutput(command, self.rc, self.out, self.err)
@@ -0,0 +1,66 @@
+import time
+import unittest
+
+from infra_validation_engine.core.concurrency import IS_PY2
+from infra_validation_engine.core.executors import ParallelExecutor, SerialExecutor
+from infra_validation_engine.core.transport import CircuitBreaker
+
+from tests.test_executors import SleepTest
+
+if not IS_PY2:
+    import asyncio
+
+    from infra_validation_engine.core.async_executor import AsyncExecutor, AsyncHost
+    from tests.async_helpers import AsyncEchoTest
+
+
+@unittest.skipIf(IS_PY2, "The asyncio engine requires Python 3")
+class TestAsyncExecutor(unittest.TestCase):
+    def test_coroutine_tests_run_concurrently(self):
+        executor = ParallelExecutor("Parallel", 2)
+        executor.extend_pipeline([AsyncEchoTest("Echo {i}".format(i=i), "hello {i}".format(i=i), 0.5)
+                                  for i in range(20)])
+        start = time.time()
+        AsyncExecutor(num_threads=2).execute(executor)
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(executor.report['result'], 'all tests passed')
+
+    def test_legacy_tests_run_through_adapter(self):
+        serial = SerialExecutor("Serial")
+        serial.extend_pipeline([SleepTest("Passing", 0), SleepTest("Failing", 0, passes=False),
+                                AsyncEchoTest("Echo", "hello")])
+        AsyncExecutor(num_threads=2).execute(serial)
+        self.assertEqual([element.report['result'] for element in serial.pipeline_elements],
+                         ['pass', 'fail', 'pass'])
+        self.assertEqual(serial.exit_code, 1)
+
+    def test_coroutine_tests_run_in_thread_executors(self):
+        test = AsyncEchoTest("Echo", "hello")
+        executor = ParallelExecutor("Parallel", 2)
+        executor.append_to_pipeline(test)
+        executor.execute()
+        self.assertEqual(test.report['result'], 'pass')
+
+    def test_dependencies(self):
+        installed = SleepTest("Installed", 0.05, passes=False)
+        running = AsyncEchoTest("Echo", "hello").depends_on(installed)
+        executor = ParallelExecutor("Parallel", 2)
+        executor.extend_pipeline([running, installed])
+        AsyncExecutor(num_threads=2).execute(executor)
+        self.assertEqual(running.report['result'], 'skipped')
+
+    def test_coroutine_is_cancelled_at_the_deadline(self):
+        straggler = AsyncEchoTest("Echo", "hello", 5)
+        straggler.timeout = 0.2
+        start = time.time()
+        AsyncExecutor(num_threads=2).execute(straggler)
+        self.assertLess(time.time() - start, 2)
+        self.assertEqual(straggler.report['result'], 'timeout')
+
+    def test_cancelled_probe_does_not_lock_out_the_host(self):
+        circuit_breaker = CircuitBreaker("local", failure_threshold=1, reset_timeout=0)
+        circuit_breaker.record_failure("Connection refused")
+        host = AsyncHost(circuit_breaker=circuit_breaker)
+        self.assertRaises(asyncio.TimeoutError, asyncio.run, asyncio.wait_for(host.run("sleep 5"), 0.1))
+        self.assertEqual(asyncio.run(host.run("echo %s", "hello")).stdout, "hello\n")
+        self.assertFalse(circuit_breaker.is_open)
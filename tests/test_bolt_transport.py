@@ -0,0 +1,77 @@
+import json
+import shutil
+import tempfile
+import unittest
+
+from infra_validation_engine.core.bolt_transport import BoltFanOut
+from infra_validation_engine.core.commands import CommandOutput
+from infra_validation_engine.core.standard_tests import DirectoryIsPresentTest
+from infra_validation_engine.infra_tests.nodes import SELinuxTest
+
+from tests.helpers import CountingHost
+
+
+class BoltHost(CountingHost):
+    """ Answers bolt command run by executing the command locally for every target """
+
+    def __init__(self, unreachable=()):
+        CountingHost.__init__(self)
+        self.unreachable = unreachable
+
+    def run(self, command, *args):
+        self.commands.append(command)
+        bolt_command, targets = args
+        items = []
+        for target in targets.split(','):
+            if target in self.unreachable:
+                value = {"_error": {"kind": "puppetlabs.tasks/connect-error", "msg": "Connection refused"}}
+            else:
+                cmd = self.host.run(bolt_command)
+                value = {"stdout": cmd.stdout, "stderr": cmd.stderr, "exit_code": cmd.rc}
+            items.append(json.dumps({"target": target, "action": "command", "object": bolt_command, "value": value}))
+        out = '{ "items": [\n' + ',\n'.join(items) + '\n],\n"target_count": 1, "elapsed_time": 0 }\n'
+        return CommandOutput(command, 2 if self.unreachable else 0, out, "")
+
+
+class TestBoltFanOut(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def create_tests(self, hosts):
+        tests = []
+        for fqdn, host in hosts.items():
+            tests.extend([
+                DirectoryIsPresentTest("Directory", self.root, host, fqdn),
+                SELinuxTest("SELinux", "disabled", "SELinux is disabled", host, fqdn),
+            ])
+        return tests
+
+    def test_checks_of_all_targets_are_collected_with_one_command_each(self):
+        hosts = dict(("lc{i}.cern.ch".format(i=i), CountingHost()) for i in range(3))
+        tests = self.create_tests(hosts)
+        cm_host = BoltHost()
+        report = BoltFanOut(cm_host, hosts).run()
+        self.assertEqual(report['invocations'], 2)
+        self.assertEqual(report['results'], 6)
+        self.assertEqual(len(cm_host.commands), 2)
+        for test in tests:
+            test.execute()
+        self.assertEqual([test.report['result'] for test in tests[::2]], ['pass'] * 3)
+        self.assertEqual(sum(len(host.commands) for host in hosts.values()), 0)
+
+    def test_unreachable_targets_query_the_host_themselves(self):
+        hosts = dict(("lc{i}.cern.ch".format(i=i), CountingHost()) for i in range(2))
+        tests = self.create_tests(hosts)
+        report = BoltFanOut(BoltHost(unreachable=["lc1.cern.ch"]), hosts).run()
+        self.assertEqual(report['unreachable'], ["lc1.cern.ch"])
+        for test in tests:
+            test.execute()
+        self.assertEqual(len(hosts["lc0.cern.ch"].commands), 0)
+        self.assertEqual(len(hosts["lc1.cern.ch"].commands), 2)
+
+    def test_items_of_output_that_was_cut_short_are_parsed(self):
+        out = '{ "items": [\n{"target": "lc0", "value": {"exit_code": 0}},\n{"target": "lc1", "val'
+        self.assertEqual([item['target'] for item in BoltFanOut.parse_items(out)], ["lc0"])
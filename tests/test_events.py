@@ -0,0 +1,53 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from infra_validation_engine.core.events import configure_event_sink, disable_event_sink
+from infra_validation_engine.core.rerun import RerunSelection
+
+from tests.test_rerun import RerunStage
+
+
+class TestEventSink(unittest.TestCase):
+    def setUp(self):
+        self.lines = []
+        configure_event_sink(self.lines.append)
+
+    def tearDown(self):
+        disable_event_sink()
+
+    def test_events_are_streamed_one_per_line(self):
+        stage = RerunStage(["0/1"])
+        stage.execute()
+        self.assertTrue(all("\n" not in line for line in self.lines))
+        events = [json.loads(line) for line in self.lines]
+        names = [event['event'] for event in events]
+        # Sleep 2 of Executor 0 is skipped without being started
+        self.assertEqual(names.count('test_start'), 5)
+        self.assertEqual(names.count('test_finish'), 6)
+        self.assertEqual(names.count('executor_summary'), 2)
+        self.assertEqual(names[-2:], ['executor_summary', 'stage_summary'])
+        failed = [event for event in events if event['event'] == 'test_finish' and event['exit_code'] == 1]
+        self.assertEqual([event['path'] for event in failed], [["Rerun", "Executor 0", "Sleep 1"]])
+        self.assertNotIn('element_reports', events[-1]['report'])
+        self.assertNotIn('element_reports', stage.report)
+        self.assertEqual(stage.report['total_elements'], 2)
+        self.assertEqual(events[-1]['results'], {"some or all tests fail": 1, "all tests passed": 1})
+
+    def test_failed_tests_can_be_rerun_from_events(self):
+        RerunStage(["1/0"]).execute()
+        root = tempfile.mkdtemp()
+        try:
+            path = os.path.join(root, "events.ndjson")
+            with open(path, 'w') as events_file:
+                events_file.write("\n".join(self.lines) + "\n")
+            selection = RerunSelection.load(path)
+        finally:
+            shutil.rmtree(root)
+        stage = RerunStage()
+        stage.rerun_selection = selection
+        stage.execute()
+        self.assertEqual([element.path for element in stage.pipeline_elements[0].pipeline_elements],
+                         [["Rerun", "Executor 1", "Sleep 0"]])
@@ -0,0 +1,241 @@
+import threading
+import time
+import unittest
+
+from infra_validation_engine.core import InfraTest
+from infra_validation_engine.core.concurrency import configure_scheduler
+from infra_validation_engine.core.executors import ParallelExecutor, SerialExecutor
+from infra_validation_engine.core.standard_tests import CommandExecutionTest
+from infra_validation_engine.core.transport import get_host
+
+
+class SleepTest(InfraTest):
+    def __init__(self, name, duration=0.05, passes=True, fqdn="localhost", tracker=None):
+        InfraTest.__init__(self, name, "Sleep for {duration}s".format(duration=duration), None, fqdn)
+        self.duration = duration
+        self.passes = passes
+        self.tracker = tracker
+
+    def run(self):
+        if self.tracker is not None:
+            self.tracker.start(self.fqdn)
+        time.sleep(self.duration)
+        if self.tracker is not None:
+            self.tracker.stop(self.fqdn)
+        return self.passes
+
+    def fail(self):
+        raise Exception("{name} failed".format(name=self.name))
+
+
+class ConcurrencyTracker:
+    """ Records the maximum number of tests in flight per host """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.max_in_flight = {}
+        self.order = []
+
+    def start(self, fqdn):
+        with self.lock:
+            self.in_flight[fqdn] = self.in_flight.get(fqdn, 0) + 1
+            self.max_in_flight[fqdn] = max(self.max_in_flight.get(fqdn, 0), self.in_flight[fqdn])
+            self.order.append(fqdn)
+
+    def stop(self, fqdn):
+        with self.lock:
+            self.in_flight[fqdn] -= 1
+
+
+class TestParallelExecutor(unittest.TestCase):
+    def test_all_elements_executed(self):
+        executor = ParallelExecutor("Parallel", 4)
+        executor.extend_pipeline([SleepTest("Sleep {i}".format(i=i)) for i in range(10)])
+        executor.execute()
+        self.assertEqual([element.report['result'] for element in executor.pipeline_elements], ['pass'] * 10)
+        self.assertEqual(executor.exit_code, 0)
+
+    def test_completes_without_polling_delay(self):
+        inner = ParallelExecutor("Inner", 2)
+        inner.extend_pipeline([SleepTest("Inner Sleep {i}".format(i=i), 0.01) for i in range(2)])
+        outer = ParallelExecutor("Outer", 2)
+        outer.extend_pipeline([inner, SleepTest("Outer Sleep", 0.01)])
+        start = time.time()
+        outer.execute()
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(outer.report['result'], 'all tests passed')
+
+    def test_progress_callback(self):
+        progress = []
+        executor = ParallelExecutor("Parallel", 2,
+                                    progress_callback=lambda element, completed, total: progress.append(
+                                        (completed, total)))
+        executor.extend_pipeline([SleepTest("Sleep {i}".format(i=i), 0.01) for i in range(3)])
+        executor.execute()
+        self.assertEqual(sorted(progress), [(1, 3), (2, 3), (3, 3)])
+
+    def test_failures_are_reported(self):
+        executor = SerialExecutor("Serial")
+        executor.extend_pipeline([SleepTest("Passing", 0), SleepTest("Failing", 0, passes=False)])
+        executor.execute()
+        self.assertEqual(executor.exit_code, 1)
+        self.assertEqual(executor.pipeline_elements[1].report['result'], 'fail')
+
+
+class TestScheduler(unittest.TestCase):
+    def test_nested_executors_share_a_bounded_pool(self):
+        scheduler = configure_scheduler(2)
+        outer = ParallelExecutor("Outer", 4)
+        for i in range(4):
+            inner = ParallelExecutor("Inner {i}".format(i=i), 4)
+            inner.extend_pipeline([SleepTest("Sleep {i}.{j}".format(i=i, j=j), 0.01) for j in range(4)])
+            outer.append_to_pipeline(inner)
+        outer.execute()
+        self.assertEqual(outer.report['result'], 'all tests passed')
+        self.assertLessEqual(len(scheduler.workers), 2)
+
+    def test_threads_are_created_on_demand(self):
+        scheduler = configure_scheduler(8)
+        self.assertEqual(len(scheduler.workers), 0)
+        executor = ParallelExecutor("Parallel", 8)
+        executor.extend_pipeline([SleepTest("Sleep {i}".format(i=i), 0.01) for i in range(2)])
+        self.assertEqual(len(scheduler.workers), 0)
+        executor.execute()
+        self.assertLessEqual(len(scheduler.workers), 2)
+
+    def test_per_host_limit(self):
+        configure_scheduler(8, max_per_host=2)
+        tracker = ConcurrencyTracker()
+        executor = ParallelExecutor("Parallel", 16)
+        for fqdn in ["cm.cern.ch", "lc1.cern.ch"]:
+            executor.extend_pipeline([SleepTest("Sleep {i}".format(i=i), 0.02, fqdn=fqdn, tracker=tracker)
+                                      for i in range(6)])
+        executor.execute()
+        self.assertEqual(tracker.max_in_flight, {"cm.cern.ch": 2, "lc1.cern.ch": 2})
+
+    def test_executors_with_a_host_do_not_take_its_slots(self):
+        configure_scheduler(4, max_per_host=1)
+        inner = ParallelExecutor("Inner", 2)
+        inner.fqdn = "cm.cern.ch"
+        inner.extend_pipeline([SleepTest("Sleep {i}".format(i=i), 0, fqdn="cm.cern.ch") for i in range(2)])
+        outer = ParallelExecutor("Outer", 2)
+        outer.extend_pipeline([inner, SleepTest("Sleep", 0, fqdn="cm.cern.ch")])
+        thread = threading.Thread(target=outer.execute)
+        thread.daemon = True
+        thread.start()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(outer.exit_code, 0)
+
+    def test_hosts_are_balanced(self):
+        configure_scheduler(1, max_per_host=1)
+        tracker = ConcurrencyTracker()
+        executor = ParallelExecutor("Parallel", 20)
+        executor.extend_pipeline([SleepTest("Sleep {i}".format(i=i), 0, fqdn="cm.cern.ch", tracker=tracker)
+                                  for i in range(10)])
+        executor.extend_pipeline([SleepTest("Sleep {i}".format(i=i), 0, fqdn="lc1.cern.ch", tracker=tracker)
+                                  for i in range(2)])
+        executor.execute()
+        # lc1 does not have to wait for all the checks of cm
+        self.assertLess(tracker.order.index("lc1.cern.ch"), 5)
+
+
+class TestDependencies(unittest.TestCase):
+    def test_dependents_run_after_their_dependencies(self):
+        configure_scheduler(4)
+        tracker = ConcurrencyTracker()
+        installed = SleepTest("Installed", 0.05, fqdn="installed", tracker=tracker)
+        running = SleepTest("Running", 0, fqdn="running", tracker=tracker).depends_on(installed)
+        executor = ParallelExecutor("Parallel", 4)
+        executor.extend_pipeline([running, installed])
+        executor.execute()
+        self.assertEqual(tracker.order, ["installed", "running"])
+        self.assertEqual(executor.exit_code, 0)
+
+    def test_failed_dependency_skips_dependents(self):
+        installed = SleepTest("Installed", 0, passes=False)
+        running = SleepTest("Running", 0).depends_on(installed)
+        configured = SleepTest("Configured", 0).depends_on(running)
+        executor = ParallelExecutor("Parallel", 4)
+        executor.extend_pipeline([configured, running, installed])
+        executor.execute()
+        self.assertEqual(running.report['result'], 'skipped')
+        self.assertEqual(running.exit_code, 2)
+        self.assertIn("Installed on localhost", running.report['skip_reason'])
+        self.assertEqual(configured.report['result'], 'skipped')
+        self.assertEqual(executor.exit_code, 1)
+
+    def test_skipped_executor_skips_its_pipeline(self):
+        installed = SleepTest("Installed", 0, passes=False)
+        inner = SerialExecutor("Inner").depends_on(installed)
+        inner.extend_pipeline([SleepTest("Sleep {i}".format(i=i), 0) for i in range(2)])
+        executor = SerialExecutor("Serial")
+        executor.extend_pipeline([installed, inner])
+        executor.execute()
+        self.assertEqual([element.report['result'] for element in inner.pipeline_elements], ['skipped'] * 2)
+        self.assertTrue(all(element.finished for element in inner.pipeline_elements))
+
+
+class TestTimeouts(unittest.TestCase):
+    def test_straggler_is_reported_as_timeout(self):
+        straggler = CommandExecutionTest("Straggler", "sleep 5", "Sleep for 5s", get_host("local://"), "localhost")
+        straggler.timeout = 0.1
+        executor = ParallelExecutor("Parallel", 2)
+        executor.extend_pipeline([straggler, SleepTest("Sleep", 0)])
+        start = time.time()
+        executor.execute()
+        self.assertLess(time.time() - start, 2)
+        self.assertEqual(straggler.report['result'], 'timeout')
+        self.assertEqual(executor.pipeline_elements[1].report['result'], 'pass')
+        self.assertEqual(executor.exit_code, 1)
+
+    def test_deadline_is_propagated(self):
+        executor = SerialExecutor("Serial")
+        executor.timeout = 0.1
+        executor.extend_pipeline([CommandExecutionTest("Sleep {i}".format(i=i), "sleep 0.5", "Sleep for 0.5s",
+                                                       get_host("local://"), "localhost") for i in range(3)])
+        start = time.time()
+        executor.execute()
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual([element.report['result'] for element in executor.pipeline_elements], ['timeout'] * 3)
+
+    def test_exceptions_are_raised_in_the_executing_thread(self):
+        test = SleepTest("Sleep", 0)
+        test.timeout = 1
+        test.run = lambda: 1 / 0
+        test.execute()
+        self.assertEqual(test.report['result'], 'exec_fail')
+        self.assertIn("ZeroDivisionError", test.report['trace'])
+
+    def test_tests_run_on_the_worker_thread(self):
+        test = SleepTest("Sleep", 0)
+        test.timeout = 1
+        threads = []
+        test.run = lambda: threads.append(threading.current_thread()) or True
+        test.execute()
+        self.assertEqual(threads, [threading.current_thread()])
+        self.assertEqual(test.report['result'], 'pass')
+
+    def test_commands_are_only_wrapped_with_a_deadline(self):
+        host = get_host("local://")
+        parents = []
+
+        def run():
+            parents.append(host.check_output("cat /proc/$PPID/comm"))
+            return True
+
+        tests = [SleepTest("Sleep {i}".format(i=i), 0) for i in range(2)]
+        for test in tests:
+            test.run = run
+        executor = SerialExecutor("Serial")
+        executor.append_to_pipeline(tests[0])
+        executor.execute()
+        # The test timeout of the run is propagated from the executor
+        executor = SerialExecutor("Serial")
+        executor.test_timeout = 10
+        executor.append_to_pipeline(tests[1])
+        executor.execute()
+        self.assertNotEqual(parents[0], "timeout")
+        self.assertEqual(parents[1], "timeout")
+        self.assertIsNone(SleepTest.timeout)
@@ -0,0 +1,54 @@
+import threading
+import time
+import unittest
+
+from infra_validation_engine.core.facts import FactCache
+from infra_validation_engine.core.executors import ParallelExecutor
+
+from tests.helpers import CountingHost
+from tests.test_executors import SleepTest
+
+
+class HostnameTest(SleepTest):
+    def __init__(self, name, host):
+        SleepTest.__init__(self, name, 0)
+        self.host = host
+
+    def run(self):
+        self.out = self.fact_output("sleep 0.2 && echo %s", "cm.cern.ch")
+        return self.out == "cm.cern.ch"
+
+
+class TestFactCache(unittest.TestCase):
+    def test_concurrent_requests_share_one_execution(self):
+        host = CountingHost()
+        cache = FactCache()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.run(host, "sleep 0.2 && hostname")))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(host.commands), 1)
+        self.assertEqual(sorted(hit for result, hit in results), [False, True, True, True])
+        self.assertEqual(cache.stats()['hits'], 3)
+
+    def test_failed_executions_are_not_cached(self):
+        cache = FactCache()
+        host = CountingHost()
+        host.run = lambda command, *args: 1 / 0
+        self.assertRaises(ZeroDivisionError, cache.run, host, "hostname")
+        self.assertRaises(ZeroDivisionError, cache.run, host, "hostname")
+        self.assertEqual(cache.stats()['misses'], 2)
+
+    def test_report_shows_cache_hits(self):
+        host = CountingHost()
+        executor = ParallelExecutor("Parallel", 4)
+        executor.extend_pipeline([HostnameTest("Hostname {i}".format(i=i), host) for i in range(4)])
+        start = time.time()
+        executor.execute()
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual(len(host.commands), 1)
+        self.assertEqual(sum(test.report.get('fact_cache_hits', 0) for test in executor.pipeline_elements), 3)
+        self.assertEqual(executor.exit_code, 0)
@@ -0,0 +1,35 @@
+import unittest
+
+from infra_validation_engine.utils import get_host_representation
+from infra_validation_engine.utils.hosts import HostRef, HostRegistry
+
+
+class TestHostRef(unittest.TestCase):
+    def test_host_refs_are_immutable(self):
+        host_ref = get_host_representation("lc1.cern.ch", "188.184.1.1")
+        self.assertEqual(host_ref['fqdn'], host_ref.fqdn)
+        self.assertEqual(host_ref.host_str, "ssh://lc1.cern.ch")
+        self.assertRaises(TypeError, host_ref.__setitem__, 'fqdn', "cm.cern.ch")
+        self.assertRaises(AttributeError, setattr, host_ref, 'fqdn', "cm.cern.ch")
+        self.assertRaises(AttributeError, setattr, host_ref, 'other', 1)
+        copy = host_ref.replace(fqdn="lc2.cern.ch")
+        self.assertEqual((host_ref.fqdn, copy.fqdn, copy.ip_address), ("lc1.cern.ch", "lc2.cern.ch", "188.184.1.1"))
+
+
+class TestHostRegistry(unittest.TestCase):
+    def test_lookups(self):
+        config_master = get_host_representation("local://", "0.0.0.0", role=HostRef.CONFIG_MASTER)
+        lcs = [get_host_representation("lc{i}.cern.ch".format(i=i), "188.184.1.{i}".format(i=i)) for i in range(3)]
+        hosts = HostRegistry(config_master, lcs, main_lc_fqdn="lc1.cern.ch")
+        self.assertIs(hosts.get("lc2.cern.ch"), lcs[2])
+        self.assertIs(hosts.get_by_ip_address("188.184.1.0"), lcs[0])
+        self.assertIs(hosts.main_lc, lcs[1])
+        self.assertIs(hosts.config_master, config_master)
+        self.assertEqual(len(hosts), 4)
+        self.assertIsNone(hosts.get("missing.cern.ch"))
+
+    def test_update_replaces_references(self):
+        hosts = HostRegistry(HostRef("local://", role=HostRef.CONFIG_MASTER), [HostRef("lc0.cern.ch")])
+        hosts.update([host_ref.replace(host=host_ref.fqdn) for host_ref in hosts])
+        self.assertEqual([host_ref.host for host_ref in hosts], ["local://", "lc0.cern.ch"])
+        self.assertEqual(hosts.get("lc0.cern.ch").host, "lc0.cern.ch")
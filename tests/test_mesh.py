@@ -0,0 +1,50 @@
+import unittest
+
+import testinfra
+
+from infra_validation_engine.core.standard_tests import MeshConnectivityTest
+from infra_validation_engine.stages.pre_install import ClusterWideDNSChecker
+from infra_validation_engine.utils.hosts import HostRef
+
+from tests.helpers import CountingHost
+
+
+class TestMeshConnectivity(unittest.TestCase):
+    def setUp(self):
+        # ping is not available everywhere, every node that resolves is considered reachable
+        self.reachability_command = MeshConnectivityTest.reachability_command
+        MeshConnectivityTest.reachability_command = "true"
+
+    def tearDown(self):
+        MeshConnectivityTest.reachability_command = self.reachability_command
+        ClusterWideDNSChecker.sample_size = None
+
+    def test_all_destinations_are_checked_with_one_command(self):
+        host = CountingHost()
+        test = MeshConnectivityTest("Mesh", ["localhost", "unresolvable.invalid"], "Mesh", host, "localhost")
+        test.execute()
+        self.assertEqual(test.report['result'], 'fail')
+        self.assertEqual(test.connectivity, {"localhost": MeshConnectivityTest.OK,
+                                             "unresolvable.invalid": MeshConnectivityTest.UNRESOLVED})
+        self.assertEqual(len(host.commands), 1)
+
+    def test_report_contains_the_connectivity_matrix(self):
+        host = testinfra.get_host("local://")
+        lc_rep = [HostRef("127.0.0.1", host=host), HostRef("unresolvable.invalid", host=host)]
+        cm_rep = HostRef("local://", role=HostRef.CONFIG_MASTER, host=host)
+        checker = ClusterWideDNSChecker(cm_rep, lc_rep, 4)
+        self.assertEqual(cm_rep.fqdn, "local://")
+        checker.execute()
+        matrix = checker.report['connectivity_matrix']
+        self.assertEqual(matrix['nodes'][1:], ["127.0.0.1", "unresolvable.invalid"])
+        self.assertEqual(len(matrix['rows']), 3)
+        self.assertEqual(matrix['rows']["127.0.0.1"][1:], "-R")
+        self.assertEqual(matrix['rows']["unresolvable.invalid"][1:], ".-")
+
+    def test_sampled_mode_checks_k_peers_per_node(self):
+        ClusterWideDNSChecker.sample_size = 2
+        host = testinfra.get_host("local://")
+        lc_rep = [HostRef("lc{i}.invalid".format(i=i), host=host) for i in range(5)]
+        checker = ClusterWideDNSChecker(HostRef("local://", role=HostRef.CONFIG_MASTER, host=host), lc_rep, 4)
+        self.assertEqual(len(checker.mesh_tests), 6)
+        self.assertTrue(all(len(test.destinations) == 2 for test in checker.mesh_tests))
@@ -0,0 +1,43 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from infra_validation_engine.core.multiplexing import ConnectionMultiplexer
+
+
+class TestConnectionMultiplexer(unittest.TestCase):
+    def test_temporary_control_dir_is_removed(self):
+        multiplexer = ConnectionMultiplexer(control_persist=10)
+        multiplexer.start()
+        with open(multiplexer.ssh_config) as ssh_config:
+            config = ssh_config.read()
+        self.assertIn("ControlPath {dir}/%C".format(dir=multiplexer.control_dir), config)
+        self.assertIn("ControlPersist 10", config)
+        multiplexer.stop()
+        self.assertFalse(os.path.exists(multiplexer.control_dir))
+
+    def test_handshakes_saved(self):
+        control_dir = tempfile.mkdtemp()
+        try:
+            # A master of a previous run is reused
+            open(os.path.join(control_dir, "reused"), 'w').close()
+            multiplexer = ConnectionMultiplexer(control_dir)
+            multiplexer.start()
+            for _ in range(5):
+                multiplexer.record_command("lc1.cern.ch")
+            for _ in range(3):
+                multiplexer.record_command("lc2.cern.ch")
+            open(os.path.join(control_dir, "opened"), 'w').close()
+            stats = multiplexer.stats()
+            self.assertEqual(stats['ssh_commands'], 8)
+            self.assertEqual(stats['ssh_handshakes'], 1)
+            self.assertEqual(stats['ssh_handshakes_saved'], 7)
+            multiplexer.stop()
+            # persistent sockets are kept
+            self.assertTrue(os.path.exists(os.path.join(control_dir, "opened")))
+        finally:
+            shutil.rmtree(control_dir)
+
+    def test_masters_do_not_persist_indefinitely(self):
+        self.assertRaises(ValueError, ConnectionMultiplexer, control_persist=0)
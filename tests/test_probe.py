@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from infra_validation_engine.core import Stage
+from infra_validation_engine.core.executors import ParallelExecutor
+from infra_validation_engine.core.probe import PendingChecks, RemoteProbe
+from infra_validation_engine.core.snapshots import PathSnapshot
+from infra_validation_engine.core.standard_tests import FileIsPresentTest, DirectoryIsPresentTest
+from infra_validation_engine.infra_tests.nodes import SELinuxTest
+
+from tests.helpers import CountingHost
+
+
+class ProbeStage(Stage):
+    remote_probe = True
+
+    def __init__(self, tests):
+        Stage.__init__(self, "Probe")
+        self.tests = tests
+        self.create_pipeline()
+
+    def create_pipeline(self):
+        executor = ParallelExecutor("Parallel", 4)
+        executor.extend_pipeline(self.tests)
+        self.append_to_pipeline(executor)
+
+
+class TestRemoteProbe(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.remote_dir = RemoteProbe.REMOTE_DIR
+        RemoteProbe.REMOTE_DIR = os.path.join(self.root, "probe")
+
+    def tearDown(self):
+        RemoteProbe.REMOTE_DIR = self.remote_dir
+        shutil.rmtree(self.root)
+
+    def create_tests(self, host):
+        return [
+            FileIsPresentTest("File", os.path.join(self.root, "missing"), host, "localhost"),
+            DirectoryIsPresentTest("Directory", self.root, host, "localhost"),
+            SELinuxTest("SELinux", "disabled", "SELinux is disabled", host, "localhost"),
+        ]
+
+    def test_checks_are_collected_with_one_command(self):
+        host = CountingHost()
+        tests = self.create_tests(host)
+        report = RemoteProbe(host).run()
+        self.assertEqual(report['commands'], 2)
+        self.assertTrue(report['uploaded'])
+        self.assertIsNone(report['error'])
+        # Uploading and executing the script is a single command as well
+        self.assertEqual(len(host.commands), 2)
+        for test in tests:
+            test.execute()
+        self.assertEqual([test.report['result'] for test in tests[:2]], ['fail', 'pass'])
+        self.assertEqual(len(host.commands), 2)
+
+    def test_snapshots_are_not_locked_while_the_commands_execute(self):
+        host = CountingHost()
+        self.create_tests(host)
+        snapshot = PathSnapshot.for_host(host)
+        probe = RemoteProbe(host)
+        execute = probe.execute
+        locked = []
+
+        def execute_and_check_lock(commands):
+            acquired = snapshot.lock.acquire(False)
+            if acquired:
+                snapshot.lock.release()
+            locked.append(not acquired)
+            return execute(commands)
+
+        probe.execute = execute_and_check_lock
+        self.assertIsNone(probe.run()['error'])
+        self.assertEqual(locked, [False])
+        # The results are loaded into the snapshot once the commands returned
+        self.assertTrue(snapshot.is_directory(self.root))
+        self.assertEqual(len(host.commands), 2)
+
+    def test_stored_script_is_reused(self):
+        host = CountingHost()
+        self.create_tests(host)
+        self.assertTrue(RemoteProbe(host).run()['uploaded'])
+        host = CountingHost()
+        self.create_tests(host)
+        report = RemoteProbe(host).run()
+        self.assertFalse(report['uploaded'])
+        self.assertEqual(len(host.commands), 1)
+
+    def test_tests_query_the_host_if_the_probe_fails(self):
+        host = CountingHost()
+        tests = self.create_tests(host)
+        probe = RemoteProbe(host)
+        probe.execute = lambda commands: 1 / 0
+        self.assertIsNotNone(probe.run()['error'])
+        for test in tests:
+            test.execute()
+        self.assertEqual([test.report['result'] for test in tests[:2]], ['fail', 'pass'])
+        self.assertEqual(len(host.commands), 2)
+
+    def test_stage_probes_its_hosts(self):
+        host = CountingHost()
+        host.backend = host.host.backend
+        stage = ProbeStage(self.create_tests(host))
+        stage.execute()
+        self.assertEqual(stage.report['remote_probe']['local']['commands'], 2)
+        self.assertEqual(len(host.commands), 2)
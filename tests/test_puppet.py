@@ -0,0 +1,40 @@
+import unittest
+
+from infra_validation_engine.infra_tests.components.puppet import PuppetCertTest
+
+from tests.helpers import CannedOutputHost
+
+CERT_LIST = """+ "cm.cern.ch"  (SHA256) 7A:1B:3C (alt names: "DNS:cm.cern.ch", "DNS:puppet")
+  "lc1.cern.ch" (SHA256) 12:AB:CD
+- "lc2.cern.ch" (SHA256) 99:88:77 (certificate revoked)
++ "lc3.cern.ch" (SHA256) 45:67:89
+"""
+
+CA_LIST = """Requested Certificates:
+    lc1.cern.ch       (SHA256)  12:AB:CD
+Signed Certificates:
+    cm.cern.ch        (SHA256)  7A:1B:3C\talt names: ["DNS:cm.cern.ch", "DNS:puppet"]
+    lc3.cern.ch       (SHA256)  45:67:89
+Revoked Certificates:
+    lc2.cern.ch       (SHA256)  99:88:77
+"""
+
+
+class TestPuppetCASnapshot(unittest.TestCase):
+    def assert_certificates_are_resolved_from_one_listing(self, out):
+        host = CannedOutputHost(out)
+        tests = [PuppetCertTest(node, host, "cm.cern.ch")
+                 for node in ["lc1.cern.ch", "lc2.cern.ch", "lc3.cern.ch", "lc4.cern.ch"]]
+        for test in tests:
+            test.execute()
+        self.assertEqual([test.report['result'] for test in tests], ['pass', 'fail', 'pass', 'fail'])
+        self.assertEqual([test.exit_code for test in tests], [3, 1, 0, 1])
+        self.assertIn("12:AB:CD", tests[0].report['message'])
+        self.assertIn("revoked", tests[1].report['error'])
+        self.assertEqual(len(host.commands), 1)
+
+    def test_puppet_cert_list(self):
+        self.assert_certificates_are_resolved_from_one_listing(CERT_LIST)
+
+    def test_puppetserver_ca_list(self):
+        self.assert_certificates_are_resolved_from_one_listing(CA_LIST)
@@ -0,0 +1,83 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from infra_validation_engine.core import Stage
+from infra_validation_engine.core.executors import ParallelExecutor
+from infra_validation_engine.core.rerun import RerunSelection
+
+from tests.test_executors import SleepTest
+
+
+class RerunStage(Stage):
+    def __init__(self, failing=()):
+        Stage.__init__(self, "Rerun")
+        self.failing = failing
+        self.create_pipeline()
+
+    def create_pipeline(self):
+        for i in range(2):
+            executor = ParallelExecutor("Executor {i}".format(i=i), 2)
+            tests = [SleepTest("Sleep {i}".format(i=j), 0, passes="{i}/{j}".format(i=i, j=j) not in self.failing)
+                     for j in range(3)]
+            # Sleep 1 is a prerequisite of Sleep 2
+            tests[2].depends_on(tests[1])
+            executor.extend_pipeline(tests)
+            self.append_to_pipeline(executor)
+
+
+class MultiHostStage(Stage):
+    """ Runs a test of the same name on every host """
+
+    def __init__(self, failing=()):
+        Stage.__init__(self, "Rerun")
+        self.failing = failing
+        self.create_pipeline()
+
+    def create_pipeline(self):
+        executor = ParallelExecutor("Executor", 2)
+        executor.extend_pipeline([SleepTest("Sleep", 0, passes=fqdn not in self.failing, fqdn=fqdn)
+                                  for fqdn in ["lc1.cern.ch", "lc2.cern.ch"]])
+        self.append_to_pipeline(executor)
+
+
+class TestRerunSelection(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def rerun(self, failing, stage_class=RerunStage):
+        previous = stage_class(failing)
+        previous.execute()
+        path = os.path.join(self.root, "report.json")
+        with open(path, 'w') as report_file:
+            report_file.write("Not a report {\n" + json.dumps(previous.report, indent=4) + "\n")
+        selection = RerunSelection.load(path)
+        self.assertEqual(selection.stages, ["rerun"])
+        stage = stage_class()
+        stage.rerun_selection = selection
+        stage.execute()
+        return stage
+
+    def test_only_the_elements_that_did_not_pass_are_executed(self):
+        stage = self.rerun(["0/1"])
+        self.assertEqual([executor.name for executor in stage.pipeline_elements], ["Executor 0"])
+        # Sleep 2 was skipped as its prerequisite failed
+        self.assertEqual([test.name for test in stage.pipeline_elements[0].pipeline_elements], ["Sleep 1", "Sleep 2"])
+        self.assertEqual(stage.report['rerun']['selected_tests'], 2)
+        self.assertEqual(stage.exit_code, 0)
+
+    def test_dependencies_on_elements_that_passed_are_dropped(self):
+        stage = self.rerun(["1/2"])
+        test = stage.pipeline_elements[0].pipeline_elements[0]
+        self.assertEqual((test.name, test.dependencies, test.report['result']), ("Sleep 2", [], 'pass'))
+
+    def test_tests_of_the_same_name_are_told_apart_by_host(self):
+        stage = self.rerun(["lc2.cern.ch"], MultiHostStage)
+        tests = stage.pipeline_elements[0].pipeline_elements
+        self.assertEqual([(test.name, test.fqdn) for test in tests], [("Sleep", "lc2.cern.ch")])
+        self.assertEqual(stage.report['rerun']['selected_tests'], 1)
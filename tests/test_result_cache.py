@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from infra_validation_engine.core.result_cache import configure_result_cache, get_result_cache
+from infra_validation_engine.core.standard_tests import DirectoryIsPresentTest, FileIsPresentTest
+
+from tests.helpers import CountingHost
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.clock = Clock()
+        configure_result_cache(os.path.join(self.root, "state", "results.sqlite"), 3600, clock=self.clock)
+
+    def tearDown(self):
+        configure_result_cache(None, None)
+        shutil.rmtree(self.root)
+
+    def execute(self, test_class, path):
+        host = CountingHost()
+        test = test_class("Presence", path, host, "lc.cern.ch")
+        test.execute()
+        return test, host
+
+    def test_fresh_passes_are_reused_with_their_age(self):
+        self.execute(DirectoryIsPresentTest, self.root)
+        self.clock.now += 60
+        test, host = self.execute(DirectoryIsPresentTest, self.root)
+        self.assertEqual(len(host.commands), 0)
+        self.assertEqual(test.report['result'], 'pass')
+        self.assertEqual(test.report['cached']['age'], 60)
+        self.assertEqual(get_result_cache().stats()['hits'], 1)
+        # The key contains the parameters of the test
+        test, host = self.execute(DirectoryIsPresentTest, os.path.join(self.root, "state"))
+        self.assertNotIn('cached', test.report)
+        self.assertEqual(len(host.commands), 1)
+
+    def test_expired_and_failed_results_are_checked_again(self):
+        self.execute(DirectoryIsPresentTest, self.root)
+        # The TTL of the test class is shorter than --max-age
+        get_result_cache().max_age = DirectoryIsPresentTest.cache_ttl * 2
+        self.clock.now += DirectoryIsPresentTest.cache_ttl + 1
+        test, host = self.execute(DirectoryIsPresentTest, self.root)
+        self.assertEqual(len(host.commands), 1)
+        self.assertNotIn('cached', test.report)
+        missing = os.path.join(self.root, "missing")
+        self.assertEqual(self.execute(FileIsPresentTest, missing)[0].report['result'], 'fail')
+        test, host = self.execute(FileIsPresentTest, missing)
+        self.assertEqual((test.report['result'], len(host.commands)), ('fail', 1))
+        self.assertEqual(get_result_cache().stats()['stored'], 2)
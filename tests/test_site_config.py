@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from infra_validation_engine.stages.deploy import Deploy
+from infra_validation_engine.stages.install import Install
+from infra_validation_engine.stages.pre_deploy import Pre_Deploy
+from infra_validation_engine.utils import get_lightweight_component_hosts
+from infra_validation_engine.utils.hosts import HostRef, HostRegistry
+from infra_validation_engine.utils.site_config import SiteConfig, load_site_config
+
+SITE_CONFIG = """
+site_infrastructure:
+  - fqdn: lc1.cern.ch
+    ip_address: 188.184.1.1
+  - fqdn: lc2.cern.ch
+    ip_address: 188.184.1.2
+lightweight_components:
+  - name: Cream-CE
+    execution_id: 0
+    deploy:
+      node: lc1.cern.ch
+    lifecycle_hooks:
+      pre_config:
+        - /etc/simple_grid/lifecycle/ce_pre_config.sh
+      post_init:
+        - /etc/simple_grid/lifecycle/ce_post_init.sh
+  - name: WN
+    execution_id: 1
+    deploy:
+      node: lc2.cern.ch
+meta_info_cream-ce:
+  host_requirements:
+    host_certificates: true
+dns:
+  - container_fqdn: cream.cern.ch
+    host_fqdn: lc1.cern.ch
+"""
+
+
+class TestSiteConfig(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, "augmented_site_level_config_file.yaml")
+        with open(self.path, 'w') as f:
+            f.write(SITE_CONFIG)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_views(self):
+        site_config = SiteConfig.load(self.path)
+        self.assertEqual(site_config.lc_hosts, [("lc1.cern.ch", "188.184.1.1"), ("lc2.cern.ch", "188.184.1.2")])
+        self.assertEqual(site_config.lifecycle_hooks, ["/etc/simple_grid/lifecycle/ce_pre_config.sh",
+                                                       "/etc/simple_grid/lifecycle/ce_post_init.sh"])
+        self.assertEqual(len(site_config.host_cert_dirs), 1)
+        self.assertTrue(site_config.host_cert_dirs[0].endswith("/lc1.cern.ch"))
+        self.assertEqual([lc['name'] for lc in site_config.main_lcs], ["Cream-CE"])
+        self.assertEqual(site_config.dns_entries, [{'container_fqdn': "cream.cern.ch", 'host_fqdn': "lc1.cern.ch"}])
+        self.assertEqual([host_rep['fqdn'] for host_rep in get_lightweight_component_hosts(site_config)],
+                         ["lc1.cern.ch", "lc2.cern.ch"])
+
+    def test_missing_file(self):
+        self.assertIsNone(load_site_config(os.path.join(self.root, "missing.yaml")))
+
+    def test_stages_share_the_site_config(self):
+        site_config = load_site_config(self.path)
+        hosts = HostRegistry(HostRef("cm.cern.ch", role=HostRef.CONFIG_MASTER),
+                             [HostRef(fqdn, ip_address) for fqdn, ip_address in site_config.lc_hosts],
+                             main_lc_fqdn=site_config.main_lc_fqdn)
+        stages = [Install(hosts, site_config, 2), Pre_Deploy(hosts, site_config, 2), Deploy(hosts, site_config, 2)]
+        for stage in stages:
+            self.assertTrue(stage.pre_condition_handler())
+            self.assertEqual(len(stage.pipeline_elements), 1 if stage.name != "Pre_Deploy" else 2)
+        self.assertFalse(Install(hosts, None, 2).pre_condition_handler())
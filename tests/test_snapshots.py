@@ -0,0 +1,180 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from infra_validation_engine.core.snapshots import HostSnapshot, PathSnapshot, PackageSnapshot
+from infra_validation_engine.core.standard_tests import FileIsPresentTest, DirectoryIsPresentTest, \
+    PackageIsInstalledTest, SystemdServiceIsActiveTest
+from infra_validation_engine.infra_tests.components.docker import DockerContainerStatusTest, DockerImageTest
+from infra_validation_engine.infra_tests.components.swarm import SwarmSimpleOverlayNetworkTest, \
+    SwarmIngressNetworkTest
+
+from tests.helpers import CannedOutputHost, CountingHost
+
+
+class SystemctlHost(CountingHost):
+    """ Answers systemctl show with the state of the units, on hosts that do not run systemd """
+
+    def __init__(self, states):
+        CountingHost.__init__(self)
+        self.states = states
+
+    def run(self, command, *args):
+        units = args[1:]
+        out = "\n\n".join("LoadState={load}\nActiveState={active}\nUnitFileState={enabled}".format(
+            load=self.states[unit][0], active=self.states[unit][1], enabled=self.states[unit][2]) for unit in units)
+        return CountingHost.run(self, "printf '%%s\\n' %s", out)
+
+
+class IncompleteSnapshot(HostSnapshot):
+    def get_query(self):
+        return "true", []
+
+
+class TestHostSnapshot(unittest.TestCase):
+    def test_incomplete_snapshots_cannot_be_created(self):
+        self.assertRaises(TypeError, IncompleteSnapshot.for_host, CountingHost())
+
+
+class TestPathSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.file = os.path.join(self.root, "file: with spaces")
+        with open(self.file, 'w') as f:
+            f.write("test")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_registered_paths_are_checked_with_one_command(self):
+        host = CountingHost()
+        tests = [
+            FileIsPresentTest("File", self.file, host, "localhost"),
+            FileIsPresentTest("Missing", os.path.join(self.root, "missing"), host, "localhost"),
+            DirectoryIsPresentTest("Directory", self.root, host, "localhost"),
+            DirectoryIsPresentTest("Not a directory", self.file, host, "localhost"),
+        ]
+        for test in tests:
+            test.execute()
+        self.assertEqual([test.report['result'] for test in tests], ['pass', 'fail', 'pass', 'fail'])
+        self.assertEqual(len(host.commands), 1)
+
+    def test_unregistered_paths_are_collected_on_demand(self):
+        host = CountingHost()
+        snapshot = PathSnapshot.for_host(host)
+        self.assertTrue(snapshot.is_directory(self.root))
+        self.assertTrue(snapshot.exists(self.file))
+        self.assertFalse(snapshot.is_directory(self.file))
+        self.assertEqual(len(host.commands), 2)
+
+
+class TestPackageSnapshot(unittest.TestCase):
+    def test_packages_are_resolved_from_one_inventory(self):
+        host = CountingHost()
+        tests = [
+            PackageIsInstalledTest("Bash", "bash", host, "localhost"),
+            PackageIsInstalledTest("Missing", "simple-missing-package", host, "localhost"),
+        ]
+        for test in tests:
+            test.execute()
+        self.assertEqual([test.report['result'] for test in tests], ['pass', 'fail'])
+        self.assertTrue(tests[0].report['version'])
+        self.assertIn('release', tests[0].report)
+        self.assertEqual(len(host.commands), 1)
+
+    def test_a_failed_query_is_an_execution_failure(self):
+        # rpm exits with 1 if it cannot read its database, which must not look like a host without packages
+        host = CannedOutputHost("", rc=1, err="error: cannot open Packages database")
+        test = PackageIsInstalledTest("Bash", "bash", host, "localhost")
+        test.execute()
+        self.assertEqual(test.report['result'], 'exec_fail')
+        self.assertIn("exited with code 1", test.report['error'])
+
+    def test_packages_on_hold_are_installed(self):
+        host = CannedOutputHost("dpkg\tpuppet-agent\t6.4.2-1\thi \n"
+                                "dpkg\tdocker-ce:amd64\t18.09\tii \n"
+                                "dpkg\tpuppet\t5.5.10\trc \n"
+                                "dpkg\tbroken\t1.0\tiiR\n")
+        snapshot = PackageSnapshot.for_host(host)
+        self.assertEqual(snapshot.get("puppet-agent"), ("6.4.2-1", None))
+        self.assertTrue(snapshot.is_installed("docker-ce"))
+        self.assertFalse(snapshot.is_installed("puppet"))
+        self.assertFalse(snapshot.is_installed("broken"))
+
+
+class TestSystemdSnapshot(unittest.TestCase):
+    def test_units_are_resolved_from_one_query(self):
+        host = SystemctlHost({
+            "puppet": ("loaded", "active", "enabled"),
+            "puppetserver": ("loaded", "active", "disabled"),
+            "docker": ("loaded", "failed", "enabled"),
+            "missing": ("not-found", "inactive", ""),
+        })
+        tests = [
+            SystemdServiceIsActiveTest("Puppet", "puppet", host, "localhost", check_enabled=True),
+            SystemdServiceIsActiveTest("Puppet Server", "puppetserver", host, "localhost", check_enabled=True),
+            SystemdServiceIsActiveTest("Docker", "docker", host, "localhost"),
+            SystemdServiceIsActiveTest("Missing", "missing", host, "localhost"),
+        ]
+        for test in tests:
+            test.execute()
+        self.assertEqual([test.report['result'] for test in tests], ['pass', 'pass', 'fail', 'fail'])
+        self.assertEqual([test.exit_code for test in tests], [0, 3, 1, 1])
+        self.assertIn("not active", tests[2].report['error'])
+        self.assertIn("not found", tests[3].report['error'])
+        self.assertEqual(len(host.commands), 1)
+
+
+def docker_listings(containers, images, networks, exit_codes=(0, 0, 0)):
+    """ The output of the docker listings of a DockerSnapshot with the given containers, images and networks """
+    return "".join("".join(json.dumps(entry) + "\n" for entry in entries) + "-- {rc}\n".format(rc=rc)
+                   for entries, rc in zip((containers, images, networks), exit_codes))
+
+
+class TestDockerSnapshot(unittest.TestCase):
+    def test_docker_tests_are_resolved_from_one_snapshot(self):
+        host = CannedOutputHost(docker_listings(
+            containers=[{"ID": "4f1e" * 16, "Names": "simple_dns,dns", "State": "running", "Status": "Up 2 hours"},
+                        {"ID": "9a0c" * 16, "Names": "cream", "State": "exited", "Status": "Exited (1)"}],
+            images=[{"ID": "sha256:1", "Repository": "maany/simple", "Tag": "latest"},
+                    {"ID": "sha256:2", "Repository": "maany/cream", "Tag": "1.0"}],
+            networks=[{"ID": "n1", "Name": "simple", "Driver": "overlay"}],
+        ))
+        tests = [
+            DockerContainerStatusTest(host, "localhost", "dns"),
+            DockerContainerStatusTest(host, "localhost", "4f1e4f1e4f1e"),
+            DockerContainerStatusTest(host, "localhost", "4f1e4f1e4f1e4f"),
+            DockerContainerStatusTest(host, "localhost", "cream"),
+            DockerContainerStatusTest(host, "localhost", "missing"),
+            DockerImageTest(host, "localhost", "maany/simple:latest"),
+            DockerImageTest(host, "localhost", "maany/*"),
+            DockerImageTest(host, "localhost", "other/*"),
+            SwarmSimpleOverlayNetworkTest(host, "localhost"),
+            SwarmIngressNetworkTest(host, "localhost"),
+        ]
+        for test in tests:
+            test.execute()
+        self.assertEqual([test.report['result'] for test in tests],
+                         ['pass', 'pass', 'pass', 'fail', 'fail', 'pass', 'pass', 'fail', 'pass', 'fail'])
+        self.assertIn("not running", tests[3].report['error'])
+        self.assertIn("could not be found", tests[4].report['error'])
+        self.assertEqual(tests[6].exit_code, 3)
+        self.assertEqual(len(host.commands), 1)
+
+    def test_a_failed_listing_only_fails_its_tests(self):
+        host = CannedOutputHost(docker_listings(
+            containers=[{"ID": "4f1e" * 16, "Names": "dns", "State": "running", "Status": "Up 2 hours"},
+                        {"ID": "4f2a" * 16, "Names": "cream", "State": "running", "Status": "Up 2 hours"}],
+            images=[], networks=[], exit_codes=(0, 0, 1)), err="unknown flag: --no-trunc")
+        tests = [
+            DockerContainerStatusTest(host, "localhost", "4f1e"),
+            # The prefix is ambiguous
+            DockerContainerStatusTest(host, "localhost", "4f"),
+            SwarmSimpleOverlayNetworkTest(host, "localhost"),
+        ]
+        for test in tests:
+            test.execute()
+        self.assertEqual([test.report['result'] for test in tests], ['pass', 'fail', 'exec_fail'])
+        self.assertIn("unknown flag", tests[2].report['error'])
@@ -0,0 +1,52 @@
+import json
+import unittest
+
+from infra_validation_engine.infra_tests.components.swarm import SwarmMembershipTest
+
+from tests.helpers import CannedOutputHost
+
+
+def node_listing(nodes):
+    """ The output of docker node ls with the given nodes """
+    return "".join(json.dumps(node) + "\n" for node in nodes)
+
+
+def node(hostname, status="Ready", availability="Active", manager_status=""):
+    return {"ID": hostname, "Hostname": hostname, "Status": status, "Availability": availability,
+            "ManagerStatus": manager_status, "EngineVersion": "19.03.5"}
+
+
+class TestSwarmMembership(unittest.TestCase):
+    def test_nodes_are_matched_by_fqdn_or_short_hostname(self):
+        host = CannedOutputHost(node_listing([node("LC1.cern.ch.", manager_status="Leader"), node("lc2")]))
+        test = SwarmMembershipTest(host, "lc1.cern.ch", ["lc1.cern.ch", "lc2.cern.ch"])
+        test.execute()
+        self.assertEqual(test.report['result'], 'pass')
+        self.assertEqual(test.report['managers'], {"lc1.cern.ch": "Leader"})
+
+    def test_lines_that_are_not_json_are_skipped(self):
+        out = "WARNING: Error loading config file: permission denied\n" + node_listing([node("lc1.cern.ch")]) + "{\n"
+        test = SwarmMembershipTest(CannedOutputHost(out), "lc1.cern.ch", ["lc1.cern.ch"])
+        test.execute()
+        self.assertEqual(test.report['result'], 'pass')
+
+    def test_missing_and_unexpected_nodes_are_reported(self):
+        host = CannedOutputHost(node_listing([node("lc1.cern.ch"), node("lc3.cern.ch")]))
+        test = SwarmMembershipTest(host, "lc1.cern.ch", ["lc1.cern.ch", "lc2.cern.ch"])
+        test.execute()
+        self.assertEqual(test.report['result'], 'fail')
+        self.assertEqual(test.report['missing_nodes'], ["lc2.cern.ch"])
+        self.assertEqual(test.report['unexpected_nodes'], ["lc3.cern.ch"])
+
+    def test_nodes_that_are_down_fail_and_drained_nodes_warn(self):
+        host = CannedOutputHost(node_listing([node("lc1.cern.ch", availability="Drain"),
+                                              node("lc2.cern.ch", status="Down")]))
+        test = SwarmMembershipTest(host, "lc1.cern.ch", ["lc1.cern.ch", "lc2.cern.ch"])
+        test.execute()
+        self.assertEqual(test.report['result'], 'fail')
+        self.assertEqual(test.report['down_nodes'], ["lc2.cern.ch"])
+        host = CannedOutputHost(node_listing([node("lc1.cern.ch", availability="Drain")]))
+        test = SwarmMembershipTest(host, "lc1.cern.ch", ["lc1.cern.ch"])
+        test.execute()
+        self.assertEqual(test.report['result'], 'pass')
+        self.assertEqual(test.exit_code, 3)
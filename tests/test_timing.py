@@ -0,0 +1,55 @@
+import unittest
+
+from infra_validation_engine.core.concurrency import configure_scheduler
+from infra_validation_engine.core.executors import ParallelExecutor
+from infra_validation_engine.core.standard_tests import CommandExecutionTest
+from infra_validation_engine.core.timing import deadline_element, shared_command_context, timing_context
+from infra_validation_engine.core.transport import get_host
+
+from tests.test_executors import SleepTest
+
+
+class TestTiming(unittest.TestCase):
+    def setUp(self):
+        configure_scheduler(2)
+
+    def test_reports_are_rolled_up_with_the_critical_path(self):
+        first = SleepTest("First", 0.05, fqdn="lc0.cern.ch")
+        second = SleepTest("Second", 0.1, fqdn="lc0.cern.ch").depends_on(first)
+        short = SleepTest("Short", 0.01, fqdn="lc1.cern.ch")
+        executor = ParallelExecutor("Parallel", 2)
+        executor.extend_pipeline([first, second, short])
+        executor.execute()
+        timing = second.report['timing']
+        self.assertGreaterEqual(timing['duration'], 0.1)
+        self.assertGreaterEqual(timing['start'], first.report['timing']['end'])
+        self.assertGreaterEqual(timing['queue_wait'], 0)
+        rollup = executor.report['timing_rollup']
+        self.assertEqual(rollup['tests'], 3)
+        self.assertEqual(list(rollup['by_host']), ["lc0.cern.ch", "lc1.cern.ch"])
+        self.assertEqual(rollup['by_host']["lc0.cern.ch"]['tests'], 2)
+        self.assertEqual(rollup['by_test_class']["SleepTest"]['tests'], 3)
+        self.assertEqual([test['name'] for test in rollup['critical_path']], ["First", "Second"])
+        self.assertGreaterEqual(executor.report['timing']['duration'], 0.15)
+
+    def test_remote_commands_are_attributed_to_their_test(self):
+        host = get_host("local://")
+        test = CommandExecutionTest("Command", "true && true", "Run true twice", host, "localhost")
+        other = CommandExecutionTest("Other", "true", "Run true", host, "localhost")
+        executor = ParallelExecutor("Parallel", 2)
+        executor.extend_pipeline([test, other])
+        # With a timeout, the commands are bounded by the deadline of their test
+        executor.test_timeout = 10
+        executor.execute()
+        self.assertEqual(test.report['timing']['remote_commands'], 1)
+        self.assertGreater(test.report['timing']['remote_latency'], 0)
+        self.assertEqual(executor.report['timing_rollup']['remote_commands'], 2)
+
+    def test_shared_commands_are_bound_by_the_stage(self):
+        test = SleepTest("Sleep", 0)
+        executor = ParallelExecutor("Parallel", 2)
+        executor.append_to_pipeline(test)
+        with timing_context(test):
+            self.assertIs(deadline_element(), test)
+            with shared_command_context():
+                self.assertIs(deadline_element(), executor)
@@ -0,0 +1,80 @@
+import unittest
+
+from infra_validation_engine.core import Stage
+from infra_validation_engine.core.exceptions import HostUnreachableError
+from infra_validation_engine.core.transport import CircuitBreaker, ManagedHost, get_host, warm_up
+
+
+class EmptyStage(Stage):
+    def __init__(self):
+        Stage.__init__(self, "Empty")
+
+    def create_pipeline(self):
+        pass
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_after_consecutive_failures(self):
+        circuit_breaker = CircuitBreaker("lc1.cern.ch", failure_threshold=2, reset_timeout=60)
+        circuit_breaker.record_failure("Connection refused")
+        circuit_breaker.record_success()
+        circuit_breaker.record_failure("Connection refused")
+        circuit_breaker.before_call()
+        circuit_breaker.record_failure("Connection timed out")
+        with self.assertRaises(HostUnreachableError) as context:
+            circuit_breaker.before_call()
+        self.assertIn("Connection timed out", str(context.exception))
+
+    def test_half_open_probe(self):
+        circuit_breaker = CircuitBreaker("lc1.cern.ch", failure_threshold=1, reset_timeout=0)
+        circuit_breaker.record_failure("Connection refused")
+        # Only one call probes the host, the others fail while it is in flight
+        circuit_breaker.before_call()
+        self.assertRaises(HostUnreachableError, circuit_breaker.before_call)
+        circuit_breaker.record_failure("Connection refused")
+        circuit_breaker.before_call()
+        circuit_breaker.record_success()
+        self.assertFalse(circuit_breaker.is_open)
+        circuit_breaker.before_call()
+        circuit_breaker.before_call()
+
+
+class TestManagedHost(unittest.TestCase):
+    def test_commands_pass_through_circuit_breaker(self):
+        host = get_host("local://")
+        self.assertIsInstance(host, ManagedHost)
+        self.assertEqual(host.run("echo %s", "hello").stdout.strip(), "hello")
+        self.assertTrue(host.file("/").is_directory)
+        self.assertFalse(host.circuit_breaker.is_open)
+
+    def test_probe_that_raises_does_not_lock_out_the_host(self):
+        host = get_host("local://")
+        # The host is cached, its own circuit breaker is restored afterwards
+        self.addCleanup(setattr, host, 'circuit_breaker', host.circuit_breaker)
+        circuit_breaker = host.circuit_breaker = CircuitBreaker("localhost", failure_threshold=1, reset_timeout=0)
+        circuit_breaker.record_failure("Connection refused")
+        # Argument substitution fails after the circuit breaker let the probe through
+        self.assertRaises(TypeError, host.run, "echo %s %s", "too few")
+        self.assertEqual(host.run("true").rc, 0)
+        self.assertFalse(circuit_breaker.is_open)
+
+
+class TestWarmUp(unittest.TestCase):
+    def test_unreachable_hosts_are_marked(self):
+        reachable = get_host("local://")
+        unreachable = get_host("ssh://unreachable.invalid", ssh_config="/dev/null")
+        statuses = warm_up([reachable, unreachable], 2)
+        self.assertTrue(statuses[reachable].connected)
+        self.assertIsNotNone(statuses[reachable].latency)
+        self.assertFalse(statuses[unreachable].connected)
+        self.assertTrue(unreachable.circuit_breaker.is_open)
+        self.assertRaises(HostUnreachableError, unreachable.run, "true")
+
+    def test_statuses_are_reported_by_the_first_stage(self):
+        self.addCleanup(setattr, Stage, 'warm_up_statuses', None)
+        Stage.warm_up_statuses = warm_up([get_host("local://")], 1)
+        first, second = EmptyStage(), EmptyStage()
+        self.assertEqual([(status['host'], status['connected'], status['error']) for status in first.report['warm_up']],
+                         [("local", True, None)])
+        self.assertIsNotNone(first.report['warm_up'][0]['latency'])
+        self.assertNotIn('warm_up', second.report)